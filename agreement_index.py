@@ -0,0 +1,285 @@
+"""Local SQLite index of generated agreements.
+
+Every generated agreement is recorded with its lease record (as JSON), the
+template and render engine version it was rendered with, its render key
+(see render_cache.cache_key) and the SHA-256 of the document, which is kept
+under the index directory:
+
+    agreement_index/agreements.sqlite3
+    agreement_index/documents/ab/ab12...docx
+
+so it can be found and downloaded again without re-entering the lease or
+rendering it. Generating the same agreement again, same fields, template
+and engine, updates its entry instead of adding one.
+
+The names and property fields are in an FTS5 table, searched by prefix, and
+lease_end and rent_amount have B-tree indexes, so searches and the list of
+leases expiring in the next N days take milliseconds over 100k agreements.
+The database is in WAL mode, so the app and batch runs can share it. The
+app keeps an index only when RENT_AGREEMENT_INDEX_DIR names its directory,
+like the render cache; batch runs take one with --index.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+from datetime import date, datetime, timedelta
+
+ENV_DIR = "RENT_AGREEMENT_INDEX_DIR"
+DATABASE_NAME = "agreements.sqlite3"
+DOCUMENTS_DIR = "documents"
+SUFFIX = ".docx"
+
+# Record fields in the full-text index, in column order
+SEARCH_FIELDS = (
+    "lessor_name", "lessee_name", "property_name", "property_sector", "property_location",
+    "tower_no", "apartment_unit_no",
+)
+
+# Columns returned by search() and expiring(), everything but the record
+SUMMARY_COLUMNS = (
+    "id", "generated_at", "generations", *SEARCH_FIELDS, "lease_start", "lease_end", "rent_amount",
+    "template", "output", "size",
+)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS agreements (
+    id INTEGER PRIMARY KEY,
+    render_key TEXT NOT NULL UNIQUE,
+    content_hash TEXT NOT NULL,
+    output TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    template TEXT NOT NULL,
+    template_digest TEXT NOT NULL,
+    engine_version TEXT NOT NULL,
+    record TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    generated_at TEXT NOT NULL,
+    generations INTEGER NOT NULL DEFAULT 1,
+    {", ".join(f"{name} TEXT" for name in SEARCH_FIELDS)},
+    lease_start TEXT,
+    lease_end TEXT,
+    rent_amount INTEGER
+);
+CREATE INDEX IF NOT EXISTS agreements_lease_end ON agreements (lease_end);
+CREATE INDEX IF NOT EXISTS agreements_rent_amount ON agreements (rent_amount);
+CREATE VIRTUAL TABLE IF NOT EXISTS agreements_fts USING fts5(
+    {", ".join(SEARCH_FIELDS)},
+    content='agreements', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS agreements_fts_insert AFTER INSERT ON agreements BEGIN
+    INSERT INTO agreements_fts (rowid, {", ".join(SEARCH_FIELDS)})
+    VALUES (new.id, {", ".join(f"new.{name}" for name in SEARCH_FIELDS)});
+END;
+CREATE TRIGGER IF NOT EXISTS agreements_fts_delete AFTER DELETE ON agreements BEGIN
+    INSERT INTO agreements_fts (agreements_fts, rowid, {", ".join(SEARCH_FIELDS)})
+    VALUES ('delete', old.id, {", ".join(f"old.{name}" for name in SEARCH_FIELDS)});
+END;
+"""
+
+_INSERT = f"""
+INSERT INTO agreements (
+    render_key, content_hash, output, size, template, template_digest, engine_version, record,
+    created_at, generated_at, {", ".join(SEARCH_FIELDS)}, lease_start, lease_end, rent_amount
+) VALUES ({", ".join("?" * (13 + len(SEARCH_FIELDS)))})
+ON CONFLICT (render_key) DO UPDATE SET
+    generated_at = excluded.generated_at, generations = generations + 1
+RETURNING id
+"""
+
+_SUMMARY = ", ".join(f"a.{name}" for name in SUMMARY_COLUMNS)
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        # Photos are in the stored document, not the record
+        return None
+    return str(value)
+
+
+def _iso_date(value):
+    if value is None or isinstance(value, str):
+        return value
+    return value.isoformat()
+
+
+def match_expression(text):
+    """Return the FTS5 query for text typed by staff, or None when it has no words
+
+    Every word must match the start of a word of some indexed field, so
+    "rah sha 62" finds Rahul Sharma in Sector 62. Quoting each word keeps
+    FTS5 syntax out of user input.
+    """
+    words = re.findall(r"\w+", text or "")
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+class AgreementIndex:
+    """The index in directory, created on first use; safe to share between threads"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.documents = os.path.join(directory, DOCUMENTS_DIR)
+        os.makedirs(self.documents, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            os.path.join(directory, DATABASE_NAME), timeout=10, check_same_thread=False,
+        )
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._connection:
+            self._connection.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def path(self, content_hash):
+        return os.path.join(self.documents, content_hash[:2], content_hash + SUFFIX)
+
+    def _store(self, data):
+        """Write data under its SHA-256 unless it is there already; return the hash and relative path"""
+        content_hash = hashlib.sha256(data).hexdigest()
+        path = self.path(content_hash)
+        if not os.path.exists(path):
+            directory = os.path.dirname(path)
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except BaseException:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(tmp_path)
+                raise
+        return content_hash, os.path.relpath(path, self.directory)
+
+    def add(self, render_key, record, data, template, template_digest, engine_version):
+        """Record an agreement and store its document; return its id
+
+        record is the lease record as a dict of inputs (LeaseRecord.to_dict()).
+        An agreement already indexed under render_key keeps its document and
+        gets a new generated_at and generation count.
+        """
+        return self.add_many([(render_key, record, data, template, template_digest, engine_version)])[0]
+
+    def add_many(self, agreements):
+        """add() for (render_key, record, data, template, template_digest, engine_version) tuples, in one transaction"""
+        agreements = list(agreements)
+        now = datetime.now().isoformat(timespec="seconds")
+        keys = [agreement[0] for agreement in agreements]
+        with self._lock:
+            known = {row[0] for row in self._connection.execute(
+                f"SELECT render_key FROM agreements WHERE render_key IN ({', '.join('?' * len(keys))})", keys
+            )}
+        rows = []
+        for render_key, record, data, template, template_digest, engine_version in agreements:
+            # An indexed agreement keeps the document stored when it was first generated
+            content_hash, output = ("", "") if render_key in known else self._store(data)
+            rows.append((
+                render_key, content_hash, output, len(data), template or "", template_digest, engine_version,
+                json.dumps(record, sort_keys=True, default=_json_default, ensure_ascii=False), now, now,
+                *(None if record.get(name) is None else str(record[name]) for name in SEARCH_FIELDS),
+                _iso_date(record.get("lease_start")), _iso_date(record.get("lease_end")), record.get("rent_amount"),
+            ))
+        with self._lock, self._connection:
+            return [self._connection.execute(_INSERT, row).fetchone()[0] for row in rows]
+
+    def _summaries(self, sql, parameters):
+        with self._lock:
+            return [dict(row) for row in self._connection.execute(sql, parameters)]
+
+    def search(self, text=None, min_rent=None, max_rent=None, limit=50):
+        """Return summaries of the agreements matching text and the rent range, newest first
+
+        Staff look for a particular lease, so every word has to match and
+        the order is by recency rather than FTS5 relevance, which would rank
+        every match of a common name before returning the first.
+        """
+        conditions, parameters = [], []
+        expression = match_expression(text)
+        if expression is not None:
+            conditions.append("agreements_fts MATCH ?")
+            parameters.append(expression)
+        if min_rent is not None:
+            conditions.append("a.rent_amount >= ?")
+            parameters.append(min_rent)
+        if max_rent is not None:
+            conditions.append("a.rent_amount <= ?")
+            parameters.append(max_rent)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        if expression is not None:
+            sql = (f"SELECT {_SUMMARY} FROM agreements_fts JOIN agreements a ON a.id = agreements_fts.rowid "
+                   f"{where} ORDER BY agreements_fts.rowid DESC LIMIT ?")
+        else:
+            sql = f"SELECT {_SUMMARY} FROM agreements a {where} ORDER BY a.id DESC LIMIT ?"
+        return self._summaries(sql, (*parameters, limit))
+
+    def expiring(self, days, today=None, limit=100):
+        """Return summaries of the leases ending within days of today, soonest first"""
+        today = today or date.today()
+        return self._summaries(
+            f"SELECT {_SUMMARY} FROM agreements a WHERE a.lease_end BETWEEN ? AND ? "
+            f"ORDER BY a.lease_end, a.id LIMIT ?",
+            (today.isoformat(), (today + timedelta(days=days)).isoformat(), limit),
+        )
+
+    def get(self, agreement_id):
+        """Return every column of an agreement, its record decoded, or None"""
+        with self._lock:
+            row = self._connection.execute("SELECT * FROM agreements WHERE id = ?", (agreement_id,)).fetchone()
+        if row is None:
+            return None
+        entry = dict(row)
+        entry["record"] = json.loads(entry["record"])
+        return entry
+
+    def read(self, agreement_id):
+        """Return the stored document of an agreement, or None when it is missing or damaged"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT content_hash, output FROM agreements WHERE id = ?", (agreement_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            with open(os.path.join(self.directory, row["output"]), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        if hashlib.sha256(data).hexdigest() != row["content_hash"]:
+            return None
+        return data
+
+    def stats(self):
+        """Return the number of agreements and the bytes of the database"""
+        with self._lock:
+            count = self._connection.execute("SELECT count(*) FROM agreements").fetchone()[0]
+        database = os.path.join(self.directory, DATABASE_NAME)
+        return {"agreements": count, "database_bytes": os.path.getsize(database)}
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def from_env():
+    """Return the index in RENT_AGREEMENT_INDEX_DIR, or None when it is not set"""
+    directory = os.environ.get(ENV_DIR)
+    if not directory:
+        return None
+    with _indexes_lock:
+        index = _indexes.get(directory)
+        if index is None:
+            index = _indexes[directory] = AgreementIndex(directory)
+        return index
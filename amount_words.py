@@ -0,0 +1,74 @@
+"""Rupee amounts in words, using the Indian numbering system.
+
+Amounts are grouped as crore, lakh, thousand and hundred, so 430000 reads
+"Rupees Four Lakh Thirty Thousand only". Below one lakh the wording is the
+same as inflect's, including the "And" before the last two digits.
+"""
+from functools import lru_cache
+
+_ONES = [
+    "", "One", "Two", "Three", "Four", "Five", "Six", "Seven", "Eight", "Nine",
+    "Ten", "Eleven", "Twelve", "Thirteen", "Fourteen", "Fifteen", "Sixteen",
+    "Seventeen", "Eighteen", "Nineteen",
+]
+_TENS = ["", "", "Twenty", "Thirty", "Forty", "Fifty", "Sixty", "Seventy", "Eighty", "Ninety"]
+
+
+def _below_hundred(n):
+    if n < 20:
+        return _ONES[n]
+    tens, ones = divmod(n, 10)
+    return f"{_TENS[tens]} {_ONES[ones]}" if ones else _TENS[tens]
+
+
+def indian_number_words(n):
+    """Spell out a positive whole number in crore/lakh/thousand groups"""
+    crore, rest = divmod(n, 10_000_000)
+    lakh, rest = divmod(rest, 100_000)
+    thousand, rest = divmod(rest, 1000)
+    hundred, units = divmod(rest, 100)
+
+    words = []
+    if crore:
+        words.append(f"{indian_number_words(crore)} Crore")
+    if lakh:
+        words.append(f"{_below_hundred(lakh)} Lakh")
+    if thousand:
+        words.append(f"{_below_hundred(thousand)} Thousand")
+    if hundred:
+        words.append(f"{_ONES[hundred]} Hundred")
+    if units:
+        if words:
+            words.append("And")
+        words.append(_below_hundred(units))
+    return " ".join(words)
+
+
+@lru_cache(maxsize=4096)
+def rupees_in_words(amount):
+    """Return the amount as "Rupees ... only"
+
+    Results are cached, so repeated amounts (the same rent on every record of
+    a batch, every rerun of the app) are only spelled out once.
+    """
+    number = int(amount)
+    if number != amount:
+        raise ValueError(f"Amount must be a whole number of rupees, got {amount!r}")
+    if number == 0:
+        return "Rupees Zero only"
+    if number < 0:
+        return f"Rupees Minus {indian_number_words(-number)} only"
+    return f"Rupees {indian_number_words(number)} only"
+
+
+def rupees_in_words_batch(amounts):
+    """Return rupees_in_words for each amount in a sequence or NumPy array"""
+    if hasattr(amounts, "tolist"):
+        amounts = amounts.tolist()
+    seen = {}
+    words = []
+    for amount in amounts:
+        if amount not in seen:
+            seen[amount] = rupees_in_words(amount)
+        words.append(seen[amount])
+    return words
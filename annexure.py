@@ -0,0 +1,141 @@
+"""The annexure's list of furniture & fixtures, built from the lease record.
+
+The rows come from the record itself: one per fixture field of the form
+(ceiling_fans, geyser, keys, ...) that has a value, then one per item of the
+record's inventory, a list of dicts with "item", "description" and optional
+"notes" and "photo" (a path or image bytes). A NOTES or PHOTO column is
+added when any row has one.
+
+table_xml() writes the whole table as WordprocessingML in one pass, a string
+per row joined once, instead of creating and then styling every cell through
+python-docx, whose cell accessors walk the table grid on each access. The
+string is parsed into a python-docx document or streamed as is by
+ooxml_renderer.
+"""
+from collections import namedtuple
+from xml.sax.saxutils import quoteattr
+
+from ooxml_renderer import run_xml
+
+TWIPS_PER_INCH = 1440
+
+# One row of the annexure
+InventoryItem = namedtuple("InventoryItem", "item description notes photo")
+
+# Fixture rows: the item, the record field describing it (None for rows every
+# agreement has) and the format of its value
+FIXTURES = [
+    ("Prepaid Metering System", None, ""),
+    ("Ceiling Fans", "ceiling_fans", "{} Nos."),
+    ("Tube lights/ Wall Lights/Ceiling Lights", "tube_lights", "{}"),
+    ("Fan Regulators", "fan_regulators", "{}"),
+    ("Electric Bell", "electric_bell", "{} Nos."),
+    ("Geyser", "geyser", "{}"),
+    ("Electric Auto Clean Chimney", "chimney", "{}"),
+    ("Mirror", "mirrors", "{}"),
+    ("Modular Wood Work cabinet", "modular_woodwork", "{}"),
+    ("Fixed Almirah", "fixed_almirah", "{}"),
+    ("Keys", "keys", "{}"),
+]
+# Rows after the inventory items
+CLOSING_ROWS = [
+    ("Other Facilities", None, "Club Facilities provided by builder. Usage on chargeable basis"),
+]
+
+# Fields the annexure is built from, for incremental re-renders
+ANNEXURE_FIELDS = {field for _, field, _ in FIXTURES + CLOSING_ROWS if field} | {"inventory"}
+
+# Column headers and widths in inches
+COLUMNS = [("S.NO.", 0.5), ("ITEM", 2.0), ("DESCRIPTION", 3.0)]
+NOTES_COLUMN = ("NOTES", 1.5)
+PHOTO_COLUMN = ("PHOTO", 1.25)
+PHOTO_WIDTH_INCHES = 1.1
+
+
+class RawXml(str):
+    """Cell content that is already run XML, such as a picture, rather than text"""
+
+
+def _fixture_rows(rows, field_values):
+    for item, field, value_format in rows:
+        if field is None:
+            yield InventoryItem(item, value_format, None, None)
+            continue
+        value = field_values.get(field)
+        if value not in (None, "", 0):
+            yield InventoryItem(item, value_format.format(value), None, None)
+
+
+def inventory_items(field_values):
+    """Return the annexure rows for field_values as InventoryItems"""
+    items = list(_fixture_rows(FIXTURES, field_values))
+    for entry in field_values.get("inventory") or ():
+        if not isinstance(entry, dict):
+            entry = dict(zip(InventoryItem._fields, entry))
+        if entry.get("item"):
+            items.append(InventoryItem(
+                str(entry["item"]), str(entry.get("description") or ""),
+                entry.get("notes") or None, entry.get("photo") or None,
+            ))
+    items.extend(_fixture_rows(CLOSING_ROWS, field_values))
+    return items
+
+
+def has_photos(field_values):
+    """Return whether any inventory item of field_values has a photo"""
+    return any(item.photo for item in inventory_items(field_values))
+
+
+def _cell_xml(width, content, bold=False):
+    run = content if isinstance(content, RawXml) else run_xml(content, bold=bold)
+    return f'<w:tc><w:tcPr><w:tcW w:type="dxa" w:w="{width}"/></w:tcPr><w:p>{run}</w:p></w:tc>'
+
+
+def table_xml(columns, rows, style="TableGrid"):
+    """Return the w:tbl XML of a table with a bold header row
+
+    columns is a list of (header, width in inches) and rows a list of cell
+    contents per row: text, or RawXml for a run already in XML.
+    """
+    widths = [round(width * TWIPS_PER_INCH) for _, width in columns]
+    parts = [
+        f"<w:tbl><w:tblPr><w:tblStyle w:val={quoteattr(style)}/>"
+        '<w:tblW w:type="auto" w:w="0"/>'
+        '<w:tblLook w:firstColumn="1" w:firstRow="1" w:lastColumn="0" w:lastRow="0" '
+        'w:noHBand="0" w:noVBand="1" w:val="04A0"/></w:tblPr><w:tblGrid>',
+        "".join(f'<w:gridCol w:w="{width}"/>' for width in widths),
+        "</w:tblGrid><w:tr>",
+        "".join(_cell_xml(width, header, bold=True) for width, (header, _) in zip(widths, columns)),
+        "</w:tr>",
+    ]
+    for row in rows:
+        parts.append("<w:tr>" + "".join(_cell_xml(width, cell) for width, cell in zip(widths, row)) + "</w:tr>")
+    parts.append("</w:tbl>")
+    return "".join(parts)
+
+
+def annexure_table_xml(field_values, photo_run=None):
+    """Return the w:tbl XML of the furniture & fixtures table
+
+    photo_run(photo) returns the run XML of a picture; without it photos are
+    left out.
+    """
+    items = inventory_items(field_values)
+    with_notes = any(item.notes for item in items)
+    with_photos = photo_run is not None and any(item.photo for item in items)
+
+    columns = list(COLUMNS)
+    if with_notes:
+        columns.append(NOTES_COLUMN)
+    if with_photos:
+        columns.append(PHOTO_COLUMN)
+
+    rows = []
+    for n, item in enumerate(items, 1):
+        row = [str(n), item.item, item.description]
+        if with_notes:
+            row.append(str(item.notes or ""))
+        if with_photos:
+            row.append(RawXml(photo_run(item.photo)) if item.photo else "")
+        rows.append(row)
+    return table_xml(columns, rows)
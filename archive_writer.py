@@ -0,0 +1,196 @@
+"""Write the documents of a batch to a zip archive as they are rendered.
+
+Each document is compressed and written as soon as it is added and is not
+held afterwards: only its central directory record (name, CRC, sizes and
+offset, under a hundred bytes) is kept until the archive is closed, so memory
+stays flat however many documents a batch writes. Every entry is compressed
+before its local header is written, so the archive can go to any writable
+file object, seekable or not, such as a socket or sys.stdout.buffer.
+write_compressed() takes an entry compressed ahead of time with
+compress_entry(), which is how ooxml_renderer writes the package parts it
+keeps deflated between renders; this is the one zip writer in the project.
+
+level 0 stores entries as they are, which costs no CPU and loses little for
+.docx and .pdf files, themselves compressed; 1-9 are deflate levels. With
+threads > 0 entries are deflated on a thread pool (zlib releases the GIL)
+and at most 2 * threads entries wait to be written at a time. Archives past
+4 GB or 65535 entries are written in ZIP64 format.
+"""
+import os
+import struct
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+STORED = 0
+DEFLATED = 8
+DEFAULT_LEVEL = 6
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP64_COUNT_LIMIT = 0xFFFF
+# Placeholders in the classic fields whose real value is in a ZIP64 field
+_ZIP64_MARKER = 0xFFFFFFFF
+_ZIP64_COUNT_MARKER = 0xFFFF
+_UTF8_NAMES = 0x800
+
+
+def _dos_timestamp():
+    t = time.localtime()
+    return ((t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+            ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday)
+
+
+def compress_entry(data, level):
+    """Return (method, crc, compressed data) of an entry's bytes"""
+    crc = zlib.crc32(data)
+    if level == 0:
+        return STORED, crc, data
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return DEFLATED, crc, compressor.compress(data) + compressor.flush()
+
+
+class ArchiveWriter:
+    """A zip archive written entry by entry to a path or a binary file object"""
+
+    def __init__(self, target, level=DEFAULT_LEVEL, threads=0):
+        if not 0 <= level <= 9:
+            raise ValueError(f"Compression level must be 0 (store) to 9, got {level}")
+        self.level = level
+        self.entries = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        if hasattr(target, "write"):
+            self._file = target
+            self._owns_file = False
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+            self._file = open(target, "wb")
+            self._owns_file = True
+        self._offset = 0
+        self._central = []
+        self._pending = deque()
+        self._executor = ThreadPoolExecutor(threads, thread_name_prefix="archive-compress") if threads else None
+        self._max_pending = 2 * threads
+        self._dos_time, self._dos_date = _dos_timestamp()
+        self._closed = False
+
+    def write(self, name, data):
+        """Add a file with these bytes to the archive"""
+        if self._closed:
+            raise ValueError("Archive is closed")
+        if self._executor is None:
+            self._write_entry(name, len(data), *compress_entry(data, self.level))
+            return
+        self._pending.append((name, len(data), self._executor.submit(compress_entry, data, self.level)))
+        while len(self._pending) > self._max_pending:
+            self._write_pending()
+
+    def write_compressed(self, name, size, method, crc, data):
+        """Add a file from compress_entry()'s result and its uncompressed size"""
+        if self._closed:
+            raise ValueError("Archive is closed")
+        while self._pending:
+            self._write_pending()
+        self._write_entry(name, size, method, crc, data)
+
+    def close(self):
+        """Write the remaining entries and the central directory"""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            while self._pending:
+                self._write_pending()
+            self._write_central_directory()
+            self._file.flush()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+            if self._owns_file:
+                self._file.close()
+
+    def stats(self):
+        """Return the entry count and the bytes before and after compression"""
+        return {"entries": self.entries, "bytes_in": self.bytes_in, "bytes_out": self.bytes_out}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write_pending(self):
+        name, size, future = self._pending.popleft()
+        self._write_entry(name, size, *future.result())
+
+    def _write_entry(self, name, size, method, crc, data):
+        encoded = name.encode("utf-8")
+        if size >= ZIP64_LIMIT or len(data) >= ZIP64_LIMIT:
+            raise ValueError(f"{name} is too large for the archive")
+        header = struct.pack(
+            "<4s5H3L2H", b"PK\x03\x04", 20, _UTF8_NAMES, method, self._dos_time, self._dos_date,
+            crc, len(data), size, len(encoded), 0,
+        )
+        self._file.write(header)
+        self._file.write(encoded)
+        self._file.write(data)
+
+        # Offsets past 4 GB go in a ZIP64 extra field
+        offset, extra, version = self._offset, b"", 20
+        if offset >= ZIP64_LIMIT:
+            offset, extra, version = _ZIP64_MARKER, struct.pack("<2HQ", 1, 8, self._offset), 45
+        self._central.append(struct.pack(
+            "<4s6H3L5H2L", b"PK\x01\x02", version, version, _UTF8_NAMES, method, self._dos_time, self._dos_date,
+            crc, len(data), size, len(encoded), len(extra), 0, 0, 0, 0, offset,
+        ) + encoded + extra)
+        self._offset += len(header) + len(encoded) + len(data)
+        self.entries += 1
+        self.bytes_in += size
+        self.bytes_out += len(data)
+
+    def _write_central_directory(self):
+        directory = b"".join(self._central)
+        self._central = []
+        self._file.write(directory)
+        count, start, size = self.entries, self._offset, len(directory)
+        if count >= ZIP64_COUNT_LIMIT or start >= ZIP64_LIMIT or size >= ZIP64_LIMIT:
+            self._file.write(struct.pack("<4sQ2H2L4Q", b"PK\x06\x06", 44, 45, 45, 0, 0, count, count, size, start))
+            self._file.write(struct.pack("<4sLQL", b"PK\x06\x07", 0, start + size, 1))
+            count = min(count, _ZIP64_COUNT_MARKER)
+            start, size = min(start, _ZIP64_MARKER), min(size, _ZIP64_MARKER)
+        self._file.write(struct.pack("<4s4H2LH", b"PK\x05\x06", 0, 0, count, count, size, start, 0))
+
+
+class DirectoryWriter:
+    """Writes each file straight into a directory, with ArchiveWriter's interface"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.entries = 0
+        self.bytes_in = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, name, data):
+        with open(os.path.join(self.directory, name), "wb") as f:
+            f.write(data)
+        self.entries += 1
+        self.bytes_in += len(data)
+
+    def close(self):
+        pass
+
+    def stats(self):
+        return {"entries": self.entries, "bytes_in": self.bytes_in, "bytes_out": self.bytes_in}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_output(output, level=DEFAULT_LEVEL, threads=0):
+    """Return a writer for a directory, a path ending in .zip or a binary file object"""
+    if hasattr(output, "write") or output.endswith(".zip"):
+        return ArchiveWriter(output, level, threads)
+    return DirectoryWriter(output)
@@ -0,0 +1,540 @@
+"""Generate agreements for many leases at once.
+
+Reads lease records from a CSV or JSONL file, derives the template fields the
+same way the Streamlit app does and renders the documents on a process pool.
+
+Usage:
+    python batch_generate.py leases.csv --output out/
+    python batch_generate.py leases.jsonl --output tower_b.zip --workers 8
+    python batch_generate.py leases.csv --output out/ --cache ~/.cache/rent_agreements
+    python batch_generate.py leases.csv --output out/ --templates templates/
+    python batch_generate.py leases.csv --output - --compression 0 > tower_b.zip
+    python batch_generate.py leases.csv --output out/ --payment-schedule --schedule-csv schedules.csv
+    python batch_generate.py leases.csv --output out/ --index agreement_index/
+    python batch_generate.py leases.csv --output out/ --compact --compact-report sizes.csv
+"""
+import argparse
+import csv
+import io
+import itertools
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from rent_agreement_generator import (
+    ENGINES,
+    build_field_values,
+    create_document_from_draft,
+    engine_version,
+    generate_agreement,
+    render_draft_bytes,
+    template_digest,
+    validate_record,
+)
+import compact_docx
+import metrics
+from agreement_index import AgreementIndex
+from archive_writer import DEFAULT_LEVEL, open_output
+from lease_record import LeaseRecord
+from payment_schedule import write_schedules
+from render_cache import RenderCache, cache_key
+from template_registry import TemplateRegistry
+from pdf_conversion import PdfConversionError, PdfConverterPool
+
+DATE_FIELDS = ("execution_date", "lease_start", "lease_end")
+INT_FIELDS = (
+    "rent_amount", "security_deposit", "payment_due_day", "rent_increase_percentage",
+    "rent_escalation_months", "lease_period_months", "car_parks", "ceiling_fans", "electric_bell",
+)
+BOOL_FIELDS = ("payment_schedule",)
+# Agreements recorded in an --index per transaction
+INDEX_BATCH = 256
+BOOL_VALUES = {"1": True, "true": True, "yes": True, "y": True, "0": False, "false": False, "no": False, "n": False}
+DATE_FORMATS = ("%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y")
+
+# Defaults used by the Streamlit form for fields that are optional in a batch
+RECORD_DEFAULTS = {
+    "payment_due_day": 5,
+    "rent_increase_percentage": 10,
+    "notice_period_months": "two",
+    "property_type": "3 BHK + Study",
+    "car_parks": 2,
+    "ceiling_fans": 6,
+    "tube_lights": "6 LED Tubelights",
+    "fan_regulators": "In all rooms",
+    "electric_bell": 1,
+    "geyser": "1 in master bed Toilet",
+    "chimney": "1 in the Kitchen",
+    "mirrors": "2 in the both Toilet",
+    "modular_woodwork": "In the Kitchen",
+    "fixed_almirah": "Both Bedrooms",
+    "keys": "Single key of every door",
+}
+
+
+class RecordError(ValueError):
+    """A lease record that cannot be turned into an agreement"""
+
+
+def read_records(path):
+    """Yield lease records from a CSV or JSONL file"""
+    if path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, newline="", encoding="utf-8") as f:
+            yield from csv.DictReader(f)
+
+
+def parse_date(value):
+    if hasattr(value, "strftime"):
+        return value
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            pass
+    raise RecordError(f"Invalid date: {value!r}")
+
+
+def normalize_record(raw):
+    """Coerce a raw CSV/JSONL row into a lease record with the form's defaults"""
+    record = dict(RECORD_DEFAULTS)
+    record.update({key: value for key, value in raw.items() if value not in ("", None)})
+
+    for field in ("execution_date", "lease_start"):
+        if field not in record:
+            raise RecordError(f"{field} is required")
+    if "rent_amount" not in record:
+        raise RecordError("rent_amount is required")
+
+    for field in DATE_FIELDS:
+        if field in record:
+            record[field] = parse_date(record[field])
+    for field in INT_FIELDS:
+        if field in record:
+            try:
+                record[field] = int(record[field])
+            except (TypeError, ValueError):
+                raise RecordError(f"{field} must be a whole number, got {record[field]!r}")
+    for field in BOOL_FIELDS:
+        if isinstance(record.get(field), str):
+            value = BOOL_VALUES.get(record[field].strip().lower())
+            if value is None:
+                raise RecordError(f"{field} must be yes or no, got {record[field]!r}")
+            record[field] = value
+
+    record.setdefault("security_deposit", record["rent_amount"] * 2)
+    record.setdefault("lease_end", record["lease_start"] + timedelta(days=11*30))
+    record.setdefault("lease_period_months", round((record["lease_end"] - record["lease_start"]).days / 30))
+
+    errors = validate_record(record)
+    if errors:
+        raise RecordError("; ".join(errors))
+    return record
+
+
+def with_payment_schedule(records):
+    """Yield raw records with payment_schedule turned on where a row does not set it
+
+    A row's own value wins, false and 0 included; an empty value counts as
+    not set, as in normalize_record().
+    """
+    for raw in records:
+        yield raw if raw.get("payment_schedule") not in ("", None) else {**raw, "payment_schedule": True}
+
+
+def write_payment_schedules(path, records):
+    """Write the payment schedule of every valid record to a CSV file
+
+    All schedules are computed in one vectorized pass. Returns the number of
+    installments written.
+    """
+    leases = []
+    for raw in records:
+        try:
+            leases.append(LeaseRecord.from_dict(normalize_record(raw)))
+        except RecordError:
+            leases.append(None)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        return write_schedules(f, leases)
+
+
+def output_name(index, record):
+    parts = [f"{index:05d}"]
+    for field in ("tower_no", "apartment_unit_no", "lessee_name"):
+        if record.get(field):
+            parts.append(re.sub(r"[^A-Za-z0-9]+", "_", str(record[field])).strip("_"))
+    return "-".join(parts) + ".docx"
+
+
+def render_job(job):
+    """Render one agreement in a worker process
+
+    Errors are returned rather than raised so a bad record never aborts the
+    rest of the batch.
+    """
+    index, name, template_path, field_values, engine = job
+    try:
+        if not template_path and engine == "ooxml":
+            return index, name, render_draft_bytes(field_values), None
+        if template_path:
+            doc = generate_agreement(template_path, field_values)
+        else:
+            doc = create_document_from_draft(field_values)
+        buffer = io.BytesIO()
+        with metrics.stage("save"):
+            doc.save(buffer)
+        return index, name, buffer.getvalue(), None
+    except Exception as e:
+        metrics.count("render_errors")
+        return index, name, None, f"{type(e).__name__}: {e}"
+    finally:
+        # Worker processes exit without cleanup, so export after every job
+        metrics.flush()
+
+
+def prepare_jobs(records, template_path, engine, errors, registry=None, indexed=None):
+    """Yield the render jobs of the valid records, appending the others to errors
+
+    With a dict as indexed, the normalized record, template and field values
+    of every job are kept in it by record number until its agreement is
+    indexed.
+    """
+    for index, raw in enumerate(records, 1):
+        try:
+            record = normalize_record(raw)
+        except RecordError as e:
+            errors.append((index, str(e)))
+            continue
+        record_template = template_path
+        if registry is not None:
+            record_template = registry.select(record.get("property_name"), record.get("property_type")) or template_path
+        field_values = build_field_values(record)
+        if indexed is not None:
+            indexed[index] = (record, record_template, field_values)
+        yield index, output_name(index, record), record_template, field_values, engine
+
+
+def lookup_cached(jobs, cache, version, emit_cached, cache_keys):
+    """Yield the jobs that are not in the cache
+
+    version is the engine_version() of the batch's documents. Cached
+    documents are passed to emit_cached(index, name, data) right away and
+    the cache key of every yielded job is recorded in cache_keys.
+    """
+    digests = {}
+    for job in jobs:
+        index, name, template_path, field_values, _ = job
+        if template_path not in digests:
+            digests[template_path] = template_digest(template_path) if template_path else "draft"
+        key = cache_key(field_values, digests[template_path], version)
+        data = cache.get(key)
+        if data is None:
+            cache_keys[index] = key
+            yield job
+        else:
+            emit_cached(index, name, data)
+
+
+def render_chunk(jobs, compact=None):
+    """Return the render_job() result of each job and the sizes before and after compacting it
+
+    With compact, compact_docx.compact() options, every document is compacted
+    in the worker; otherwise the sizes are None.
+    """
+    results = []
+    for job in jobs:
+        index, name, data, error = render_job(job)
+        sizes = None
+        if compact is not None and data is not None:
+            data, report = compact_docx.compact(data, **compact)
+            sizes = report["bytes_before"], report["bytes_after"]
+        results.append((index, name, data, error, sizes))
+    return results
+
+
+def render_in_order(executor, jobs, chunk_size, window, compact=None):
+    """Yield render_chunk() results in job order, with at most window chunks in flight
+
+    Unlike executor.map(), which submits every job up front and keeps
+    every finished document until it is consumed, this reads jobs only as
+    results are taken, so memory does not grow with the batch.
+    """
+    in_flight = deque()
+    for chunk in itertools.batched(jobs, chunk_size):
+        in_flight.append(executor.submit(render_chunk, chunk, compact))
+        while len(in_flight) >= window:
+            yield from in_flight.popleft().result()
+    while in_flight:
+        yield from in_flight.popleft().result()
+
+
+def run_batch(records, output, template_path=None, workers=None, chunk_size=16, engine="python-docx",
+              pdf_pool=None, cache=None, registry=None, compression=DEFAULT_LEVEL, compression_threads=0,
+              agreement_index=None, compact=None):
+    """Render every record and write the documents to a directory, a .zip or a file object
+
+    Documents are written as they are rendered and dropped, so memory use
+    does not depend on the number of records. A .zip path or a binary file
+    object gets a zip archive whose entries are stored (compression=0) or
+    deflated at level 1-9, on compression_threads threads when that is
+    above 0.
+
+    With a pdf_conversion.PdfConverterPool as pdf_pool, a PDF is written next
+    to every document as well. With a render_cache.RenderCache as cache,
+    records already rendered are taken from it instead of the worker pool,
+    and new renders are added to it. With a template_registry.TemplateRegistry
+    as registry, each record uses its society's template, falling back to
+    template_path. With an agreement_index.AgreementIndex as agreement_index,
+    every agreement written is recorded in it, INDEX_BATCH at a time. With
+    compact, compact_docx.compact() options, documents are compacted as they
+    are rendered and cached compacted.
+
+    Returns a summary dict with the counts, the per-record errors and the
+    throughput in documents per second, and with compact the size of every
+    document compacted before and after.
+    """
+    errors = []
+    written = 0
+    start = time.perf_counter()
+    pending_pdfs = deque()
+    cache_keys = {}
+    indexed = {} if agreement_index is not None else None
+    to_index = []
+    digests = {}
+    compacted = []
+    version = engine_version(engine, compact)
+    writer = open_output(output, compression, compression_threads)
+
+    def write_pdfs(wait):
+        while pending_pdfs and (wait or pending_pdfs[0][2].done()):
+            index, name, future = pending_pdfs.popleft()
+            try:
+                writer.write(name[:-len(".docx")] + ".pdf", future.result())
+            except Exception as e:
+                errors.append((index, f"PDF: {e}"))
+
+    def index_agreements():
+        try:
+            agreement_index.add_many(agreement for _, agreement in to_index)
+        except (sqlite3.Error, OSError) as e:
+            errors.extend((index, f"Index: {e}") for index, _ in to_index)
+        to_index.clear()
+
+    def emit(index, name, data):
+        nonlocal written
+        writer.write(name, data)
+        written += 1
+        if indexed is not None:
+            record, record_template, field_values = indexed.pop(index)
+            if record_template not in digests:
+                digests[record_template] = template_digest(record_template) if record_template else "draft"
+            digest = digests[record_template]
+            to_index.append(
+                (index, (cache_key(field_values, digest, version), record, data, record_template, digest, version))
+            )
+            if len(to_index) >= INDEX_BATCH:
+                index_agreements()
+        if pdf_pool is not None:
+            pending_pdfs.append((index, name, pdf_pool.submit(data, block=True)))
+            write_pdfs(wait=False)
+
+    jobs = prepare_jobs(records, template_path, engine, errors, registry, indexed)
+    if cache is not None:
+        jobs = lookup_cached(jobs, cache, version, emit, cache_keys)
+
+    try:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers, initializer=metrics.configure_from_env) as executor:
+            for index, name, data, error, sizes in render_in_order(executor, jobs, chunk_size, 2 * workers, compact):
+                if error:
+                    errors.append((index, error))
+                    if indexed is not None:
+                        del indexed[index]
+                    continue
+                if sizes is not None:
+                    compacted.append((index, name, *sizes))
+                if cache is not None:
+                    cache.put(cache_keys.pop(index), data)
+                emit(index, name, data)
+        write_pdfs(wait=True)
+        if to_index:
+            index_agreements()
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        "written": written,
+        "failed": len(errors),
+        "errors": sorted(errors),
+        "seconds": elapsed,
+        "docs_per_second": written / elapsed if elapsed else 0.0,
+        "output": writer.stats(),
+    }
+    if pdf_pool is not None:
+        summary["pdf"] = pdf_pool.stats()
+    if cache is not None:
+        summary["cache"] = cache.stats()
+    if agreement_index is not None:
+        summary["index"] = agreement_index.stats()
+    if compact is not None:
+        # Documents taken from the cache were compacted when first rendered
+        summary["compact"] = {
+            "documents": compacted,
+            "bytes_before": sum(before for _, _, before, _ in compacted),
+            "bytes_after": sum(after for _, _, _, after in compacted),
+        }
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate rent agreements in bulk")
+    parser.add_argument("input", help="CSV or JSONL file with one lease per row")
+    parser.add_argument("--output", "-o", required=True,
+                        help="output directory, a path ending in .zip, or - for a zip archive on stdout")
+    parser.add_argument("--template", default="agreement_template.docx",
+                        help="template to fill; the draft format is used when it does not exist")
+    parser.add_argument("--templates", metavar="DIR",
+                        help="directory of per-society templates (see template_registry); --template is the fallback")
+    parser.add_argument("--engine", choices=ENGINES, default="python-docx",
+                        help="render engine for the draft format")
+    parser.add_argument("--pdf", action="store_true", help="also convert every agreement to PDF with LibreOffice")
+    parser.add_argument("--pdf-workers", type=int, default=2, help="LibreOffice worker processes for --pdf")
+    parser.add_argument("--metrics", metavar="SPEC",
+                        help="export stage timings, e.g. prometheus:metrics_{pid}.prom or log (see metrics.py)")
+    parser.add_argument("--cache", metavar="DIR", help="reuse and store rendered agreements in this directory")
+    parser.add_argument("--cache-mb", type=float, default=512, help="size cap of the --cache directory in MB")
+    parser.add_argument("--compression", type=int, choices=range(10), default=DEFAULT_LEVEL, metavar="0-9",
+                        help="zip compression: 0 stores documents as they are, 1-9 are deflate levels")
+    parser.add_argument("--compression-threads", type=int, default=0,
+                        help="threads deflating zip entries in parallel (default: compress while writing)")
+    parser.add_argument("--payment-schedule", action="store_true",
+                        help="attach a payment schedule annexure to every agreement of the draft format "
+                             "unless its row says otherwise")
+    parser.add_argument("--schedule-csv", metavar="CSV",
+                        help="also write the month-by-month payment schedule of every lease to this file")
+    parser.add_argument("--index", metavar="DIR",
+                        help="record every agreement in the agreement index in this directory (see agreement_index)")
+    parser.add_argument("--compact", action="store_true",
+                        help="compact every document: unused styles, numbering and parts removed (see compact_docx)")
+    parser.add_argument("--compact-image-dpi", type=int, metavar="DPI",
+                        help="with --compact, also downsample pictures to this resolution at their printed size")
+    parser.add_argument("--compact-report", metavar="CSV",
+                        help="with --compact, write the size of every document before and after to this file")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=16, help="records sent to a worker at a time")
+    args = parser.parse_args(argv)
+
+    template_path = args.template if os.path.exists(args.template) else None
+    if template_path is None:
+        print(f"Template {args.template} not found, using the draft format", file=sys.stderr)
+
+    compact = None
+    if args.compact:
+        compact = {}
+        if args.compact_image_dpi:
+            if not compact_docx.downsampling_available():
+                parser.error("--compact-image-dpi needs Pillow")
+            compact["image_dpi"] = args.compact_image_dpi
+    elif args.compact_image_dpi or args.compact_report:
+        parser.error("--compact-image-dpi and --compact-report need --compact")
+
+    if args.metrics:
+        # Worker processes read the spec from the environment
+        os.environ[metrics.ENV_VAR] = args.metrics
+    try:
+        metrics.configure_from_env()
+    except ValueError as e:
+        parser.error(str(e))
+
+    registry = None
+    if args.templates:
+        registry = TemplateRegistry(args.templates)
+        registry.preload()
+        registry_stats = registry.stats()
+        for path, error in registry_stats["errors"].items():
+            print(f"{path}: {error}", file=sys.stderr)
+        print(f"{registry_stats['templates']} templates loaded in {registry_stats['load_seconds']:.2f}s, "
+              f"{registry_stats['shared_parts']} parts shared", file=sys.stderr)
+
+    cache = RenderCache(args.cache, int(args.cache_mb * 1024 * 1024)) if args.cache else None
+
+    pdf_pool = None
+    if args.pdf:
+        try:
+            pdf_pool = PdfConverterPool(workers=args.pdf_workers)
+        except PdfConversionError as e:
+            parser.error(str(e))
+
+    output = args.output
+    # The summary goes to stderr when stdout carries the archive
+    report = sys.stdout
+    if output == "-":
+        output, report = sys.stdout.buffer, sys.stderr
+
+    if args.schedule_csv:
+        start = time.perf_counter()
+        installments = write_payment_schedules(args.schedule_csv, read_records(args.input))
+        print(f"Payment schedules: {installments} installments written to {args.schedule_csv} "
+              f"in {time.perf_counter() - start:.2f}s", file=report)
+
+    records = read_records(args.input)
+    if args.payment_schedule:
+        records = with_payment_schedule(records)
+
+    try:
+        summary = run_batch(records, output, template_path,
+                            workers=args.workers, chunk_size=args.chunk_size, engine=args.engine,
+                            pdf_pool=pdf_pool, cache=cache, registry=registry,
+                            compression=args.compression, compression_threads=args.compression_threads,
+                            agreement_index=AgreementIndex(args.index) if args.index else None,
+                            compact=compact)
+    finally:
+        if pdf_pool is not None:
+            pdf_pool.shutdown()
+        metrics.flush()
+
+    for index, error in summary["errors"]:
+        print(f"record {index}: {error}", file=sys.stderr)
+    print(f"{summary['written']} written, {summary['failed']} failed in "
+          f"{summary['seconds']:.2f}s ({summary['docs_per_second']:.1f} docs/second)", file=report)
+    output_stats = summary["output"]
+    print(f"Output: {output_stats['entries']} files, {output_stats['bytes_in'] / 1024 / 1024:.1f} MB "
+          f"written as {output_stats['bytes_out'] / 1024 / 1024:.1f} MB", file=report)
+    if "pdf" in summary:
+        pdf = summary["pdf"]
+        print(f"PDF ({pdf['mode']} workers): {pdf['conversions']} converted, {pdf['failures']} failed, "
+              f"p50 {pdf['p50_ms']:.0f} ms, p90 {pdf['p90_ms']:.0f} ms, p99 {pdf['p99_ms']:.0f} ms "
+              f"(conversion alone p50 {pdf['convert_p50_ms']:.0f} ms, p90 {pdf['convert_p90_ms']:.0f} ms, "
+              f"p99 {pdf['convert_p99_ms']:.0f} ms)", file=report)
+    if "cache" in summary:
+        cache_stats = summary["cache"]
+        print(f"Cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+              f"{cache_stats['evictions']} evicted, {cache_stats['bytes'] / 1024 / 1024:.1f} MB", file=report)
+    if "index" in summary:
+        print(f"Index: {summary['index']['agreements']} agreements in {args.index}", file=report)
+    if "compact" in summary:
+        compact_stats = summary["compact"]
+        print(f"Compact: {len(compact_stats['documents'])} documents compacted from "
+              f"{compact_stats['bytes_before'] / 1024 / 1024:.1f} MB to "
+              f"{compact_stats['bytes_after'] / 1024 / 1024:.1f} MB", file=report)
+        if args.compact_report:
+            with open(args.compact_report, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(("record", "output", "bytes_before", "bytes_after"))
+                writer.writerows(compact_stats["documents"])
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""Benchmark: agreement index queries over a large number of agreements.
+
+Indexes --records synthetic agreements with agreement_index.AgreementIndex
+(a small stand-in document each), then times name/property searches through
+the FTS5 table against a LIKE scan of the same columns, the leases expiring
+in the next 30 and 90 days and a rent range through their B-tree indexes
+against full table scans, checks that each pair returns the same agreements,
+and times re-reading a stored document.
+
+Usage: python benchmarks/bench_agreement_index.py [--records N] [--repeat N]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from agreement_index import SEARCH_FIELDS, AgreementIndex, match_expression
+from bench_suite import synthetic_records
+
+TODAY = date(2026, 1, 1)
+QUERIES = ("rahul", "sharma resid", "kavita t5", "noida 62")
+
+
+def synthetic_agreements(count):
+    rng = random.Random(3)
+    records = synthetic_records(count)
+    for n, record in enumerate(records):
+        record["lease_start"] = TODAY + timedelta(days=rng.randrange(-700, 30))
+        record["lease_end"] = record["lease_start"] + timedelta(days=rng.choice((330, 335, 365, 730)))
+        record["property_sector"] = str(rng.randrange(1, 170))
+        yield (f"{n:064x}", record, f"document {n}".encode(), "", "draft", "bench")
+
+
+def timed(repeat, fn):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def like_scan(connection, text):
+    """The agreements whose fields contain a word starting with each word of text, without the FTS index"""
+    conditions, parameters = [], []
+    for word in text.split():
+        conditions.append("(" + " OR ".join(
+            f"(' ' || {name}) LIKE ?" for name in SEARCH_FIELDS
+        ) + ")")
+        parameters.extend([f"% {word}%"] * len(SEARCH_FIELDS))
+    rows = connection.execute(f"SELECT id FROM agreements WHERE {' AND '.join(conditions)}", parameters)
+    return {row[0] for row in rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = AgreementIndex(tmp)
+        start = time.perf_counter()
+        batch = []
+        for agreement in synthetic_agreements(args.records):
+            batch.append(agreement)
+            if len(batch) == 1000:
+                index.add_many(batch)
+                batch.clear()
+        index.add_many(batch)
+        stats = index.stats()
+        print(f"indexed {stats['agreements']} agreements in {time.perf_counter() - start:.1f} s, "
+              f"database {stats['database_bytes'] / 1024 / 1024:.0f} MB")
+
+        connection = index._connection
+        for text in QUERIES:
+            # Only the words' prefixes, as match_expression() matches them, so both sides agree
+            fts_time, fts = timed(args.repeat, lambda: {row[0] for row in connection.execute(
+                "SELECT rowid FROM agreements_fts WHERE agreements_fts MATCH ?", (match_expression(text),)
+            )})
+            scan_time, scan = timed(args.repeat, lambda: like_scan(connection, text))
+            if fts != scan:
+                sys.exit(f"search {text!r}: FTS found {len(fts)}, the scan {len(scan)}")
+            top_time, _ = timed(args.repeat, lambda: index.search(text, limit=20))
+            print(f"search {text!r:16} {len(fts):6d} matches: FTS {fts_time * 1000:7.2f} ms   "
+                  f"LIKE scan {scan_time * 1000:8.2f} ms   ({scan_time / fts_time:5.1f}x)   "
+                  f"top 20 {top_time * 1000:6.2f} ms")
+
+        def ids(sql, parameters):
+            return [row[0] for row in connection.execute(sql, parameters)]
+
+        for days in (30, 90):
+            between = (TODAY.isoformat(), (TODAY + timedelta(days=days)).isoformat())
+            indexed_time, indexed = timed(args.repeat, lambda: ids(
+                "SELECT id FROM agreements WHERE lease_end BETWEEN ? AND ? ORDER BY lease_end, id", between))
+            scan_time, scan = timed(args.repeat, lambda: ids(
+                "SELECT id FROM agreements NOT INDEXED WHERE lease_end BETWEEN ? AND ? ORDER BY lease_end, id",
+                between))
+            listed = [row["id"] for row in index.expiring(days, TODAY, limit=len(indexed))]
+            if indexed != scan or listed != indexed:
+                sys.exit(f"expiring in {days} days differ")
+            first_time, _ = timed(args.repeat, lambda: index.expiring(days, TODAY, limit=20))
+            print(f"expiring in {days:2d} days {len(indexed):6d} leases: index {indexed_time * 1000:7.2f} ms   "
+                  f"table scan {scan_time * 1000:8.2f} ms   ({scan_time / indexed_time:5.1f}x)   "
+                  f"first 20 {first_time * 1000:6.2f} ms")
+
+        rent_time, rents = timed(args.repeat, lambda: set(ids(
+            "SELECT id FROM agreements WHERE rent_amount BETWEEN 90000 AND 91000", ())))
+        scan_time, scan = timed(args.repeat, lambda: set(ids(
+            "SELECT id FROM agreements NOT INDEXED WHERE rent_amount BETWEEN 90000 AND 91000", ())))
+        listed = {row["id"] for row in index.search(min_rent=90_000, max_rent=91_000, limit=len(rents))}
+        if rents != scan or listed != rents:
+            sys.exit("rent range results differ")
+        first_time, _ = timed(args.repeat, lambda: index.search(min_rent=90_000, max_rent=91_000, limit=20))
+        print(f"rent 90,000-91,000 {len(rents):6d} leases: index {rent_time * 1000:7.2f} ms   "
+              f"table scan {scan_time * 1000:8.2f} ms   ({scan_time / rent_time:5.1f}x)   "
+              f"first 20 {first_time * 1000:6.2f} ms")
+
+        read_time, data = timed(args.repeat, lambda: index.read(args.records // 2))
+        if data != f"document {args.records // 2 - 1}".encode():
+            sys.exit("re-download returned another document")
+        print(f"re-download of a stored document: {read_time * 1000:.2f} ms")
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
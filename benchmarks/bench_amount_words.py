@@ -0,0 +1,76 @@
+"""Benchmark: Indian-numbering amount converter vs the inflect-based path.
+
+Before timing, every amount below --check-up-to is compared with the inflect
+wording, which the converter must match below one lakh.
+
+Usage: python benchmarks/bench_amount_words.py [--check-up-to N] [--records N]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import inflect
+
+from amount_words import rupees_in_words, rupees_in_words_batch
+
+_engine = inflect.engine()
+
+
+def inflect_rupees(number):
+    """The number_to_words_rupees implementation before amount_words"""
+    if number == 0:
+        return "Rupees Zero only"
+    words = _engine.number_to_words(number)
+    words = words.replace(',', '')
+    words = words.replace('-', ' ')
+    words = ' '.join(word.capitalize() for word in words.split())
+    return f"Rupees {words} only"
+
+
+def check_equivalence(limit):
+    for number in range(limit):
+        expected = inflect_rupees(number)
+        actual = rupees_in_words(number)
+        if actual != expected:
+            sys.exit(f"{number}: {actual!r} != inflect {expected!r}")
+    rupees_in_words.cache_clear()
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--check-up-to", type=int, default=100_000)
+    parser.add_argument("--records", type=int, default=10_000)
+    args = parser.parse_args()
+
+    check_equivalence(min(args.check_up_to, 100_000))
+    print(f"matches inflect for 0..{min(args.check_up_to, 100_000) - 1}")
+
+    rng = random.Random(42)
+    # A bulk run repeats a small set of rents and deposits
+    amounts = [rng.choice(range(15_000, 150_001, 500)) for _ in range(args.records)]
+    unique = sorted(set(amounts))
+
+    inflect_time = timed(lambda: [inflect_rupees(a) for a in amounts])
+    cold_time = timed(lambda: [rupees_in_words.__wrapped__(a) for a in unique])
+    rupees_in_words.cache_clear()
+    batch_time = timed(rupees_in_words_batch, amounts)
+
+    print(f"{args.records} amounts, {len(unique)} distinct")
+    print(f"inflect path:           {inflect_time * 1000:8.2f} ms")
+    print(f"converter, uncached:    {cold_time * 1000:8.2f} ms for the distinct amounts")
+    print(f"batch API (cached):     {batch_time * 1000:8.2f} ms")
+    print(f"speedup over inflect:   {inflect_time / batch_time:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Benchmark: the bulk annexure table writer vs building the table cell by cell.
+
+Builds the furniture & fixtures table for inventories of --items sizes with
+annexure.annexure_table_xml() and with python-docx cell by cell (sizing every
+column through table.columns[i].cells, as the hard-coded table was built),
+checks that both give the same table in canonical XML form, and times them.
+Also checks that the form's default fixtures give the rows of the old
+hard-coded table, and that both render engines still produce the same
+document for an agreement with a large inventory with notes.
+
+Usage: python benchmarks/bench_annexure.py [--items N [N ...]] [--repeat N]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import docx
+from lxml import etree
+
+from annexure import COLUMNS, NOTES_COLUMN, inventory_items
+from bench_draft_skeleton import RECORD
+from bench_render_engines import check_equivalence
+from rent_agreement_generator import _annexure_table_xml, _parse_block, build_field_values, render_draft_bytes
+
+# The fixture inputs the form starts with
+FORM_FIXTURES = {
+    "ceiling_fans": 6,
+    "tube_lights": "6 LED Tubelights",
+    "fan_regulators": "In all rooms",
+    "electric_bell": 1,
+    "geyser": "1 in master bed Toilet",
+    "chimney": "1 in the Kitchen",
+    "mirrors": "2 in the both Toilet",
+    "modular_woodwork": "In the Kitchen",
+    "fixed_almirah": "Both Bedrooms",
+    "keys": "Single key of every door",
+}
+
+# The rows of the table before it was built from the record
+HARD_CODED_ROWS = [
+    ["1", "Prepaid Metering System", ""],
+    ["2", "Ceiling Fans", "6 Nos."],
+    ["3", "Tube lights/ Wall Lights/Ceiling Lights", "6 LED Tubelights"],
+    ["4", "Fan Regulators", "In all rooms"],
+    ["5", "Electric Bell", "1 Nos."],
+    ["6", "Geyser", "1 in master bed Toilet"],
+    ["7", "Electric Auto Clean Chimney", "1 in the Kitchen"],
+    ["8", "Mirror", "2 in the both Toilet"],
+    ["9", "Modular Wood Work cabinet", "In the Kitchen"],
+    ["10", "Fixed Almirah", "Both Bedrooms"],
+    ["11", "Keys", "Single key of every door"],
+    ["12", "Other Facilities", "Club Facilities provided by builder. Usage on chargeable basis"],
+]
+
+
+def inventory(count):
+    return [
+        {"item": f"Item {n}", "description": f"{n % 4 + 1} in bedroom {n % 3 + 1}",
+         "notes": "Scratched" if n % 5 == 0 else ""}
+        for n in range(count)
+    ]
+
+
+def cell_by_cell_table(document, field_values):
+    """The table built through python-docx the way the hard-coded one was"""
+    items = inventory_items(field_values)
+    columns = list(COLUMNS)
+    if any(item.notes for item in items):
+        columns.append(NOTES_COLUMN)
+    table = document.add_table(rows=len(items) + 1, cols=len(columns))
+    table.style = "Table Grid"
+    for grid_col, (_, width) in zip(table._tbl.tblGrid.gridCol_lst, columns):
+        grid_col.w = docx.shared.Inches(width)
+    for i, (header, width) in enumerate(columns):
+        for cell in table.columns[i].cells:
+            cell.width = docx.shared.Inches(width)
+        cell = table.cell(0, i)
+        cell.text = header
+        for run in cell.paragraphs[0].runs:
+            run.bold = True
+    for n, item in enumerate(items, 1):
+        texts = [str(n), item.item, item.description, str(item.notes or "")]
+        for cell, text in zip(table.rows[n].cells, texts):
+            cell.text = text
+    return table._tbl
+
+
+def bulk_table(document, field_values):
+    tbl = _parse_block(_annexure_table_xml(field_values, document.part))
+    document.element.body.append(tbl)
+    return tbl
+
+
+def canonical(element):
+    return etree.tostring(etree.fromstring(etree.tostring(element)), method="c14n")
+
+
+def rows(tbl):
+    w = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+    return [["".join(t.text for t in tc.iter(w + "t")) for tc in tr.iter(w + "tc")] for tr in tbl.iter(w + "tr")]
+
+
+def best_of(repeat, fn, field_values):
+    best = float("inf")
+    for _ in range(repeat):
+        document = docx.Document()
+        start = time.perf_counter()
+        fn(document, field_values)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, nargs="+", default=[0, 100, 500])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    base = build_field_values(dict(RECORD, **FORM_FIXTURES))
+    if rows(bulk_table(docx.Document(), base))[1:] != HARD_CODED_ROWS:
+        sys.exit("the form's default fixtures do not give the hard-coded table")
+    print("default fixtures give the rows of the hard-coded table")
+
+    check_equivalence(dict(base, inventory=inventory(max(args.items))))
+    print(f"engines produce identical documents with {max(args.items)} inventory items")
+
+    for count in args.items:
+        field_values = dict(base, inventory=inventory(count))
+        if canonical(bulk_table(docx.Document(), field_values)) != canonical(
+            cell_by_cell_table(docx.Document(), field_values)
+        ):
+            sys.exit(f"tables differ for {count} inventory items")
+        cell_time = best_of(args.repeat, cell_by_cell_table, field_values)
+        bulk_time = best_of(args.repeat, bulk_table, field_values)
+        draft_size = len(render_draft_bytes(field_values))
+        print(f"{count + len(HARD_CODED_ROWS):4d} rows: cell by cell {cell_time * 1000:8.2f} ms   "
+              f"bulk writer {bulk_time * 1000:7.2f} ms   ({cell_time / bulk_time:5.1f}x)   "
+              f"agreement {draft_size / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Benchmark: peak memory of a batch written to a zip archive, by batch size.
+
+Runs batch_generate.run_batch() in a fresh process for a small and a large
+batch and fails when the parent's peak RSS grows by more than --tolerance-mb
+between them: documents must be written to the archive as they are rendered,
+not collected first. Then compares compression levels and parallel
+compression on the large batch, and checks the archives are valid.
+
+Usage: python benchmarks/bench_archive.py [--records N] [--workers N]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+
+def write_records(path, count):
+    from bench_suite import synthetic_records
+    with open(path, "w", encoding="utf-8") as f:
+        for record in synthetic_records(count):
+            f.write(json.dumps(record, default=str) + "\n")
+
+
+def child(records_path, output, workers, level, threads):
+    """Run the batch and print its summary and the peak RSS as JSON"""
+    from batch_generate import read_records, run_batch
+    summary = run_batch(read_records(records_path), output, workers=workers, engine="ooxml",
+                        compression=level, compression_threads=threads)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    print(json.dumps({"summary": summary, "peak_rss": peak}, default=str))
+
+
+def run_child(records_path, output, workers, level=6, threads=0):
+    result = subprocess.run(
+        [sys.executable, __file__, "--child", records_path, output,
+         "--workers", str(workers), "--level", str(level), "--threads", str(threads)],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def check_archive(path, count):
+    with zipfile.ZipFile(path) as archive:
+        if len(archive.namelist()) != count or archive.testzip() is not None:
+            sys.exit(f"{path} is not a valid archive of {count} documents")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=5000)
+    parser.add_argument("--small", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--tolerance-mb", type=float, default=16)
+    parser.add_argument("--child", nargs=2, metavar=("RECORDS", "OUTPUT"))
+    parser.add_argument("--level", type=int, default=6)
+    parser.add_argument("--threads", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child, args.workers, args.level, args.threads)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        small_records = os.path.join(tmp, "small.jsonl")
+        large_records = os.path.join(tmp, "large.jsonl")
+        write_records(small_records, args.small)
+        write_records(large_records, args.records)
+        output = os.path.join(tmp, "agreements.zip")
+
+        small = run_child(small_records, output, args.workers)
+        check_archive(output, args.small)
+        large = run_child(large_records, output, args.workers)
+        check_archive(output, args.records)
+        growth = (large["peak_rss"] - small["peak_rss"]) / 1024 / 1024
+        print(f"peak RSS: {args.small} documents {small['peak_rss'] / 1024 / 1024:.1f} MB, "
+              f"{args.records} documents {large['peak_rss'] / 1024 / 1024:.1f} MB ({growth:+.1f} MB)")
+        if growth > args.tolerance_mb:
+            sys.exit(f"peak RSS grew by {growth:.1f} MB, more than {args.tolerance_mb} MB")
+
+        print(f"{args.records} documents, {args.workers} workers:")
+        for label, level, threads in (("store", 0, 0), ("deflate 1", 1, 0), ("deflate 6", 6, 0),
+                                      ("deflate 9", 9, 0), ("deflate 6, 4 threads", 6, 4)):
+            result = run_child(large_records, output, args.workers, level, threads)
+            check_archive(output, args.records)
+            summary = result["summary"]
+            print(f"  {label:21} {summary['docs_per_second']:8.1f} docs/second   "
+                  f"{summary['output']['bytes_out'] / 1024 / 1024:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
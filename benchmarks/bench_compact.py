@@ -0,0 +1,139 @@
+"""Benchmark: compact output vs the .docx as rendered.
+
+Renders agreements of the draft format with both engines, the draft format
+with --photos inventory photos of 4000x3000 pixels, and a table-heavy
+template with a header, a footer, footnotes and text boxes, and compacts
+each with compact_docx.compact(), without and with image downsampling to
+--image-dpi. For every pair, checks that the compacted document opens with
+python-docx, that every story part has the same paragraphs with the same
+text, that every paragraph and run resolves to the same style, and that no
+style or numbering definition it refers to is missing. Reports the sizes
+before and after and the time compact() takes.
+
+Usage: python benchmarks/bench_compact.py [--photos N] [--image-dpi N] [--repeat N]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import docx
+from docx.oxml.ns import qn
+
+import compact_docx
+import template_cache
+from bench_story_walker import table_heavy_template
+from bench_suite import synthetic_records
+from lease_record import build_field_values
+from rent_agreement_generator import render_agreement_bytes
+
+
+def photo(seed):
+    """A 4000x3000 JPEG with some detail, the size of a phone camera picture"""
+    from PIL import Image, ImageDraw
+
+    image = Image.linear_gradient("L").resize((4000, 3000)).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for n in range(0, 4000, 40):
+        draw.line((n, 0, 4000 - n, 3000), fill=((n * 7 + seed) % 256, (n * 3) % 256, seed % 256), width=3)
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=92)
+    return buffer.getvalue()
+
+
+def documents(photos):
+    field_values = build_field_values(synthetic_records(1)[0])
+    yield "draft, python-docx", render_agreement_bytes("missing.docx", field_values, "python-docx")
+    yield "draft, ooxml", render_agreement_bytes("missing.docx", field_values, "ooxml")
+    if photos and compact_docx.downsampling_available():
+        inventory = [
+            {"item": f"Sofa {n + 1}", "description": "3 seater", "notes": "", "photo": photo(n)} for n in range(photos)
+        ]
+        yield f"draft, {photos} photos", render_agreement_bytes(
+            "missing.docx", build_field_values({**synthetic_records(1)[0], "inventory": inventory}), "python-docx"
+        )
+    template = template_cache.CompiledTemplate(
+        "bench", table_heavy_template(20, 20, sorted(field_values)), "bench", 0, 0
+    )
+    buffer = io.BytesIO()
+    template.render(field_values).save(buffer)
+    yield "template, 20 tables", buffer.getvalue()
+
+
+def story_contents(doc):
+    """The text, paragraph style and run styles of every paragraph of every story part, by part"""
+    styles = {style.style_id: style.name for style in doc.styles}
+    contents = {}
+    for part, root in template_cache.story_roots(doc).items():
+        contents[part] = [(
+            "".join(p.xpath(".//w:t/text()")),
+            styles.get(p.style, p.style) if p.style else None,
+            [styles.get(r.style, r.style) for r in p.iter(qn("w:r")) if r.style],
+        ) for p in root.iter(qn("w:p"))]
+    return contents
+
+
+def missing_definitions(doc):
+    """The style ids and numIds story parts refer to that the document does not define"""
+    style_ids = {style.style_id for style in doc.styles}
+    numbering = doc.part.numbering_part.element if _has_numbering(doc) else None
+    num_ids = {num.get(qn("w:numId")) for num in numbering.iter(qn("w:num"))} if numbering is not None else set()
+    missing = set()
+    for root in template_cache.story_roots(doc).values():
+        for reference in root.iter(qn("w:pStyle"), qn("w:rStyle"), qn("w:tblStyle")):
+            if reference.get(qn("w:val")) not in style_ids:
+                missing.add(("style", reference.get(qn("w:val"))))
+        for reference in root.iter(qn("w:numId")):
+            if reference.get(qn("w:val")) != "0" and reference.get(qn("w:val")) not in num_ids:
+                missing.add(("num", reference.get(qn("w:val"))))
+    return missing
+
+
+def _has_numbering(doc):
+    try:
+        doc.part.numbering_part
+    except NotImplementedError:
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--photos", type=int, default=4)
+    parser.add_argument("--image-dpi", type=int, default=150)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if not compact_docx.downsampling_available():
+        print("Pillow is not installed: images are not downsampled and the photo case is skipped")
+    for name, data in documents(args.photos):
+        original = docx.Document(io.BytesIO(data))
+        expected = story_contents(original)
+        for image_dpi in (None, args.image_dpi):
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                compacted, report = compact_docx.compact(data, image_dpi=image_dpi)
+                best = min(best, time.perf_counter() - start)
+            doc = docx.Document(io.BytesIO(compacted))
+            if story_contents(doc) != expected:
+                sys.exit(f"{name}: the compacted document has other text or styles")
+            missing = missing_definitions(doc)
+            if missing:
+                sys.exit(f"{name}: the compacted document lost {sorted(missing)}")
+            if len(doc.inline_shapes) != len(original.inline_shapes):
+                sys.exit(f"{name}: the compacted document has {len(doc.inline_shapes)} pictures, "
+                         f"expected {len(original.inline_shapes)}")
+            mode = f"{image_dpi} dpi" if image_dpi else "no images"
+            print(f"{name:22} {mode:10} {report['bytes_before'] / 1024:8.1f} KB -> "
+                  f"{report['bytes_after'] / 1024:7.1f} KB ({report['bytes_after'] / report['bytes_before']:4.0%})   "
+                  f"compact {best * 1000:6.1f} ms   {report['styles_removed']} styles, "
+                  f"{report['numbering_removed']} numbering definitions, {len(report['parts_removed'])} parts, "
+                  f"{report['images_downsampled']} images downsampled   same text and styles")
+
+
+if __name__ == "__main__":
+    main()
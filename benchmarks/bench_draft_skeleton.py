@@ -0,0 +1,83 @@
+"""Benchmark: draft skeleton fill vs building the draft document from scratch.
+
+Also checks that both modes produce byte-identical package parts.
+
+Usage: python benchmarks/bench_draft_skeleton.py [--repeat N]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from rent_agreement_generator import build_field_values, create_document_from_draft, get_draft_skeleton
+
+RECORD = {
+    "execution_date": date(2025, 5, 1),
+    "lessor_name": "Amit Gupta",
+    "lessor_father_name": "R. K. Gupta",
+    "lessor_address": "B-12, Sector 62, Noida",
+    "lessee_name": "Rahul Sharma",
+    "lessee_father_name": "S. Sharma",
+    "lessee_address": "Flat 4, Karol Bagh, New Delhi 110005",
+    "rent_amount": 43000,
+    "security_deposit": 86000,
+    "payment_due_day": 5,
+    "rent_increase_percentage": 10,
+    "lease_start": date(2025, 5, 1),
+    "lease_end": date(2026, 3, 31),
+    "lease_period_months": 11,
+    "notice_period_months": "two",
+    "apartment_unit_no": "1204",
+    "tower_no": "T5",
+    "property_name": "Gupta Residency",
+    "property_sector": "62",
+    "property_location": "Noida, UP",
+    "property_type": "3 BHK + Study",
+    "car_parks": 2,
+}
+
+
+def package_parts(doc):
+    return {part.partname: part.blob for part in doc.part.package.iter_parts()}
+
+
+def bench(use_skeleton, field_values, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        doc = create_document_from_draft(field_values, use_skeleton=use_skeleton)
+        doc.save(io.BytesIO())
+        timings.append(time.perf_counter() - start)
+    return min(timings), sum(timings) / len(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    field_values = build_field_values(RECORD)
+    start = time.perf_counter()
+    get_draft_skeleton()
+    skeleton_ms = (time.perf_counter() - start) * 1000
+
+    full = package_parts(create_document_from_draft(field_values, use_skeleton=False))
+    filled = package_parts(create_document_from_draft(field_values))
+    if full != filled:
+        differing = sorted(name for name in full if full[name] != filled.get(name))
+        sys.exit(f"skeleton output differs from the full build in {differing}")
+
+    print(f"skeleton build (once): {skeleton_ms:8.2f} ms")
+    full_best, full_mean = bench(False, field_values, args.repeat)
+    fill_best, fill_mean = bench(True, field_values, args.repeat)
+    print(f"full build + save:     {full_best * 1000:8.2f} ms best, {full_mean * 1000:8.2f} ms mean")
+    print(f"skeleton fill + save:  {fill_best * 1000:8.2f} ms best, {fill_mean * 1000:8.2f} ms mean")
+    print(f"speedup:               {full_mean / fill_mean:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
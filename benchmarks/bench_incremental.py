@@ -0,0 +1,133 @@
+"""Benchmark: incremental re-render after a one-field edit vs a full render.
+
+Edits one lease record field at a time, the way an agent tweaks a draft, and
+patches the previous render with only the paragraphs that depend on it.
+Checks first that every patched document is identical to a full render of
+the same values, and that the changed template fields are covered by
+affected_fields() of the edited record field.
+
+Usage: python benchmarks/bench_incremental.py [--paragraphs N] [--repeat N]
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from lxml import etree
+
+import template_cache
+from bench_suite import synthetic_records, synthetic_template
+from rent_agreement_generator import RenderedDraft, affected_fields, build_field_values, create_document_from_draft
+
+EDITS = [
+    ("rent_amount", lambda value: value + 500),
+    ("security_deposit", lambda value: value + 1000),
+    ("execution_date", lambda value: value + timedelta(days=400)),
+    ("lessee_name", lambda value: value + " Jr."),
+    ("payment_due_day", lambda value: value % 10 + 1),
+    ("lease_period_months", lambda value: value + 1),
+]
+
+
+def xml(document):
+    return etree.tostring(document.element)
+
+
+def edits(record):
+    """Yield (edited field, new record) for a sequence of one-field edits"""
+    for field, change in EDITS:
+        record = dict(record, **{field: change(record[field])})
+        yield field, record
+
+
+def check_draft(record):
+    rendered = RenderedDraft(build_field_values(record))
+    for field, record in edits(record):
+        field_values = build_field_values(record)
+        changed = template_cache.changed_fields(rendered.field_values, field_values)
+        if not changed <= affected_fields({field}):
+            sys.exit(f"editing {field} changed {sorted(changed)}, not all in affected_fields()")
+        rendered.update(field_values)
+        if xml(rendered.document) != xml(create_document_from_draft(field_values)):
+            sys.exit(f"patched draft differs from a full render after editing {field}")
+
+
+def check_template(template, record):
+    rendered = template_cache.RenderedTemplate(template, build_field_values(record))
+    for field, record in edits(record):
+        field_values = build_field_values(record)
+        rendered.update(field_values)
+        if xml(rendered.document) != xml(template.render(field_values)):
+            sys.exit(f"patched template differs from a full render after editing {field}")
+
+
+def measure(render, repeat):
+    best = float("inf")
+    for n in range(repeat):
+        start = time.perf_counter()
+        render(n)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def compare(label, full, patch, repeat):
+    def save(document):
+        document.save(io.BytesIO())
+
+    full_time = measure(lambda n: full(n), repeat)
+    patch_time = measure(lambda n: patch(n), repeat)
+    full_saved = measure(lambda n: save(full(n)), repeat)
+    patch_saved = measure(lambda n: save(patch(n)), repeat)
+    print(f"{label}")
+    print(f"  full render:        {full_time * 1000:9.2f} ms   with save {full_saved * 1000:9.2f} ms")
+    print(f"  incremental update: {patch_time * 1000:9.2f} ms   with save {patch_saved * 1000:9.2f} ms")
+    print(f"  speedup:            {full_time / patch_time:9.1f}x  with save {full_saved / patch_saved:9.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--paragraphs", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    record = synthetic_records(1)[0]
+    rent_values = [build_field_values(dict(record, rent_amount=record["rent_amount"] + 500 * n))
+                   for n in range(2)]
+
+    check_draft(record)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "template.docx")
+        synthetic_template(args.paragraphs).save(path)
+        template = template_cache.load_template(path)
+        check_template(template, record)
+        print("patched documents match full renders")
+
+        rendered = template_cache.RenderedTemplate(template, rent_values[0])
+        patched = len(template.locations_for(template_cache.changed_fields(*rent_values)))
+
+        def patch_template(n):
+            # Switch to the other rent on every call
+            rendered.update(rent_values[rendered.field_values == rent_values[0]])
+            return rendered.document
+
+        compare(f"template of {args.paragraphs} paragraphs, rent edited "
+                f"({patched} of {len(template.locations)} paragraphs re-rendered)",
+                lambda n: template.render(rent_values[n % 2]), patch_template, args.repeat)
+
+    draft = RenderedDraft(rent_values[0])
+
+    def patch_draft(n):
+        draft.update(rent_values[draft.field_values == rent_values[0]])
+        return draft.document
+
+    compare("draft format, rent edited",
+            lambda n: create_document_from_draft(rent_values[n % 2]), patch_draft, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Benchmark: slotted LeaseRecord vs dict records.
+
+Checks that LeaseRecord.to_field_values() gives exactly the field values of
+the dict-based build_field_values() it replaced, and that validate_columns()
+reports the same errors as validating row by row. Then measures the memory
+of --records records as dicts and as LeaseRecords, repeated field value
+derivation with and without the cached derived fields, and column-oriented
+vs row-by-row validation.
+
+Usage: python benchmarks/bench_lease_record.py [--records N] [--repeat N]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from amount_words import rupees_in_words
+from bench_suite import synthetic_records
+from lease_record import LeaseRecord, format_date_with_suffix, validate_columns, validate_record
+
+
+def dict_field_values(record):
+    """build_field_values() as it was before LeaseRecord"""
+    field_values = {}
+    execution_date = record["execution_date"]
+    rent_amount = record["rent_amount"]
+    security_deposit = record["security_deposit"]
+
+    for key, value in record.items():
+        if key == "execution_date":
+            field_values["execution_date"] = format_date_with_suffix(execution_date)
+            field_values["execution_month"] = execution_date.strftime("%B")
+            field_values["execution_year"] = execution_date.strftime("%Y")
+        elif key == "rent_amount":
+            field_values["rent_amount_numeric"] = f"Rs. {rent_amount:,}/-"
+            field_values["rent_amount_words"] = rupees_in_words(rent_amount).replace("Rupees ", "")
+        elif key == "security_deposit":
+            field_values["security_deposit_numeric"] = f"Rs. {security_deposit:,}/-"
+            field_values["security_deposit_words"] = rupees_in_words(security_deposit).replace("Rupees ", "")
+        elif key == "lease_start":
+            field_values["lease_start_date"] = format_date_with_suffix(value)
+        elif key == "lease_end":
+            field_values["lease_end_date"] = format_date_with_suffix(value)
+        else:
+            field_values[key] = value
+    return field_values
+
+
+def measure_memory(build):
+    tracemalloc.start()
+    built = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return built, size
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    records = synthetic_records(args.records)
+    # Blank out some required fields, so validation has errors to find
+    for n in range(0, args.records, 7):
+        records[n] = dict(records[n], lessee_name="", tower_no="" if n % 2 else records[n]["tower_no"])
+    records[1]["notes"] = "passed through unchanged"
+
+    for record in records:
+        if LeaseRecord.from_dict(record).to_field_values() != dict_field_values(record):
+            sys.exit(f"field values differ for {record}")
+    columns = {name: [record.get(name) for record in records] for name in records[0]}
+    expected = {row: errors for row, record in enumerate(records) if (errors := validate_record(record))}
+    if validate_columns(columns) != expected:
+        sys.exit("validate_columns() differs from validating row by row")
+    print(f"{args.records} records: field values and validation errors match")
+
+    dicts, dict_bytes = measure_memory(lambda: [dict(record) for record in records])
+    leases, lease_bytes = measure_memory(lambda: [LeaseRecord.from_dict(record) for record in records])
+    print(f"memory per record:   dict {dict_bytes / args.records:6.0f} B   "
+          f"LeaseRecord {lease_bytes / args.records:6.0f} B   (shared values counted once)")
+
+    dict_time = timed(lambda: [dict_field_values(record) for _ in range(args.repeat) for record in dicts])
+    lease_time = timed(lambda: [lease.to_field_values() for _ in range(args.repeat) for lease in leases])
+    print(f"field values x{args.repeat}:   dict {dict_time * 1000:8.1f} ms   "
+          f"LeaseRecord {lease_time * 1000:8.1f} ms   ({dict_time / lease_time:.1f}x)")
+
+    row_time = timed(lambda: [validate_record(record) for record in records])
+    column_time = timed(lambda: validate_columns(columns))
+    print(f"validation:          rows {row_time * 1000:8.1f} ms   "
+          f"columns {column_time * 1000:8.1f} ms       ({row_time / column_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
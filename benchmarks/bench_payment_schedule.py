@@ -0,0 +1,110 @@
+"""Benchmark: vectorized payment schedules vs a per-installment Python loop.
+
+Computes the schedules of --records synthetic leases of 1 to 60 months, with
+due days up to the 31st and increases every 1 to 24 months, with
+payment_schedule.record_schedules() and with a loop over every installment
+of every lease, checks that both give the same installments and times them,
+plus the CSV export. Then checks that both render engines produce the same
+agreement with a five-year schedule annexure and times that annexure.
+
+Usage: python benchmarks/bench_payment_schedule.py [--records N] [--repeat N]
+"""
+import argparse
+import calendar
+import io
+import os
+import random
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from bench_draft_skeleton import RECORD
+from bench_render_engines import check_equivalence
+from bench_suite import synthetic_records
+from lease_record import LeaseRecord
+from payment_schedule import ESCALATION_MONTHS, record_schedules, schedule_annexure_xml, write_schedules
+
+
+def loop_schedule(record):
+    """One lease's installments, computed the way they would be by hand"""
+    rent = record.rent_amount
+    escalation = record.rent_escalation_months or ESCALATION_MONTHS
+    due_day = record.payment_due_day or record.lease_start.day
+    year, month = record.lease_start.year, record.lease_start.month
+    total = 0
+    installments = []
+    for n in range(record.lease_period_months):
+        if n and n % escalation == 0:
+            rent = (2 * rent * (100 + record.rent_increase_percentage) + 100) // 200
+        if n == 0:
+            due = record.lease_start
+        else:
+            due = date(year, month, min(due_day, calendar.monthrange(year, month)[1]))
+        total += rent
+        installments.append((n + 1, due, rent, total))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return installments
+
+
+def synthetic_leases(count):
+    rng = random.Random(1)
+    leases = []
+    for record in synthetic_records(count):
+        record.update(
+            rent_amount=record["rent_amount"] + rng.randrange(97),
+            lease_period_months=rng.randrange(1, 61),
+            payment_due_day=rng.choice((None, 1, 5, 28, 29, 30, 31)),
+            rent_escalation_months=rng.choice((None, 1, 11, 12, 24)),
+        )
+        leases.append(LeaseRecord.from_dict(record))
+    return leases
+
+
+def timed(repeat, fn):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    leases = synthetic_leases(args.records)
+    loop_time, expected = timed(args.repeat, lambda: [loop_schedule(lease) for lease in leases])
+    vector_time, schedule = timed(args.repeat, lambda: record_schedules(leases))
+
+    actual = list(zip(
+        schedule["lease"].tolist(), schedule["installment"].tolist(), schedule["due_date"].tolist(),
+        schedule["rent_amount"].tolist(), schedule["total_paid"].tolist(),
+    ))
+    flat = [(n, *installment) for n, installments in enumerate(expected) for installment in installments]
+    if actual != flat:
+        first = next(i for i, (a, b) in enumerate(zip(actual, flat)) if a != b) if len(actual) == len(flat) else 0
+        sys.exit(f"schedules differ at installment {first}: {actual[first:first + 1]} vs {flat[first:first + 1]}")
+    print(f"{args.records} leases, {len(flat)} installments: schedules match the per-installment loop")
+
+    csv_time, _ = timed(args.repeat, lambda: write_schedules(io.StringIO(), leases))
+    print(f"per-installment loop: {loop_time * 1000:9.1f} ms")
+    print(f"record_schedules:     {vector_time * 1000:9.1f} ms   ({loop_time / vector_time:.1f}x)")
+    print(f"CSV export:           {csv_time * 1000:9.1f} ms   (schedules included)")
+
+    lease = LeaseRecord.from_dict(dict(RECORD, lease_period_months=60, payment_schedule=True))
+    field_values = lease.to_field_values()
+    check_equivalence(field_values)
+    print("engines produce identical agreements with a 60 month schedule")
+    annexure_time, _ = timed(args.repeat * 10, lambda: schedule_annexure_xml(
+        LeaseRecord.from_dict(dict(RECORD, lease_period_months=60, payment_schedule=True)).to_field_values()
+    ))
+    print(f"60 month annexure:    {annexure_time * 1000:9.2f} ms per agreement (schedule and table XML)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Benchmark: startup time and resident memory of the template registry.
+
+Writes --templates synthetic society templates (built from the same base
+document, so styles, numbering, fonts and theme are identical, as they are
+for templates derived from one firm's master) and preloads them in a fresh
+process, once with part sharing and once without. Also checks that every
+society selects its own template and that renders from shared templates
+match renders from unshared ones.
+
+Usage: python benchmarks/bench_registry.py [--templates N] [--paragraphs N]
+"""
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+
+def resident_bytes():
+    """Current resident set size, from /proc on Linux"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import metrics
+        return metrics.max_rss_bytes()
+
+
+def society(n):
+    return f"Society {n:03d}"
+
+
+def write_templates(directory, count, paragraphs):
+    from bench_suite import synthetic_template
+    base = synthetic_template(paragraphs)
+    buffer = io.BytesIO()
+    base.save(buffer)
+    import docx
+    for n in range(count):
+        doc = docx.Document(io.BytesIO(buffer.getvalue()))
+        doc.paragraphs[0].insert_paragraph_before(f"LEASE DEED - {society(n).upper()}")
+        doc.save(os.path.join(directory, f"society_{n:03d}.docx"))
+
+
+def child(directory, share_parts):
+    """Preload the registry and print the measurements as JSON"""
+    import gc
+    gc.collect()
+    before = resident_bytes()
+    import template_cache
+    from template_registry import TemplateRegistry
+    from bench_suite import synthetic_records
+    from rent_agreement_generator import build_field_values
+
+    registry = TemplateRegistry(directory, share_parts=share_parts)
+    registry.preload()
+    gc.collect()
+    after = resident_bytes()
+
+    selected = [registry.select(society(n)) for n in range(len(registry.templates()))]
+    field_values = build_field_values(synthetic_records(1)[0])
+    render = template_cache.load_template(selected[-1]).render(field_values)
+    buffer = io.BytesIO()
+    render.save(buffer)
+    with zipfile.ZipFile(buffer) as package:
+        parts = {name: package.read(name).hex() for name in package.namelist()}
+    print(json.dumps({
+        "stats": registry.stats(),
+        "resident_growth": after - before,
+        "selected": [os.path.basename(path or "") for path in selected],
+        "render": parts,
+    }))
+
+
+def run_child(directory, share_parts):
+    result = subprocess.run(
+        [sys.executable, __file__, "--child", directory, "--share" if share_parts else "--no-share"],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--templates", type=int, default=50)
+    parser.add_argument("--paragraphs", type=int, default=200)
+    parser.add_argument("--child")
+    parser.add_argument("--share", action=argparse.BooleanOptionalAction, default=True)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.share)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_templates(tmp, args.templates, args.paragraphs)
+        shared = run_child(tmp, True)
+        unshared = run_child(tmp, False)
+
+    expected = [f"society_{n:03d}.docx" for n in range(args.templates)]
+    if shared["selected"] != expected:
+        sys.exit(f"wrong templates selected: {shared['selected'][:5]}...")
+    if shared["render"] != unshared["render"]:
+        sys.exit("renders from shared templates differ from unshared ones")
+    print(f"{args.templates} templates selected by society; shared and unshared renders match")
+
+    for label, result in (("shared parts", shared), ("no sharing", unshared)):
+        stats = result["stats"]
+        print(f"{label:12}  startup {stats['load_seconds']:6.2f} s   "
+              f"resident +{result['resident_growth'] / 1024 / 1024:7.1f} MB   "
+              f"{stats['shared_parts']} parts shared")
+
+
+if __name__ == "__main__":
+    main()
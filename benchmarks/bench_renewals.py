@@ -0,0 +1,91 @@
+"""Benchmark: vectorized renewal computation vs a per-lease Python loop.
+
+Computes the renewals of --records synthetic leases with
+renewals.compute_renewals() and with a straightforward loop over the records,
+checks that both give the same terms, month-end and leap-year leases
+included, and times them and the schedule
+(including the amounts in words) written for --dry-run.
+
+Usage: python benchmarks/bench_renewals.py [--records N] [--round-to N]
+"""
+import argparse
+import calendar
+import io
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from bench_suite import synthetic_records
+from lease_record import LeaseRecord
+from renewals import compute_renewals, write_schedule
+
+
+def renew(record, round_to):
+    """One lease's renewal, computed the way it would be by hand"""
+    rent, deposit = record.rent_amount, record.security_deposit
+    unit = 100 * round_to
+    new_rent = (2 * rent * (100 + record.rent_increase_percentage) + unit) // (2 * unit) * round_to
+    new_deposit = (2 * deposit * new_rent + rent * round_to) // (2 * rent * round_to) * round_to
+    start = record.lease_end + timedelta(days=1)
+    month = start.month - 1 + record.lease_period_months
+    year, month = start.year + month // 12, month % 12 + 1
+    same_day = date(year, month, min(start.day, calendar.monthrange(year, month)[1]))
+    return {
+        "rent_amount": new_rent,
+        "security_deposit": new_deposit,
+        "lease_start": start,
+        "lease_end": same_day - timedelta(days=1),
+        "execution_date": start,
+        "execution_year": start.year,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument("--round-to", type=int, default=1)
+    args = parser.parse_args()
+
+    records = synthetic_records(args.records)
+    for n, record in enumerate(records):
+        # Odd amounts, so rounding is exercised
+        record["rent_amount"] += n % 97
+        record["security_deposit"] += n % 89
+    # Terms ending on a month end, in and around leap years
+    for n, (start, end, months) in enumerate((
+        (date(2025, 3, 1), date(2026, 1, 31), 11), (date(2024, 1, 1), date(2024, 12, 31), 12),
+        (date(2023, 3, 1), date(2024, 2, 29), 12), (date(2027, 2, 1), date(2027, 12, 31), 11),
+        (date(2026, 12, 31), date(2027, 1, 30), 1), (date(2027, 3, 31), date(2028, 2, 28), 11),
+    )):
+        records[n].update(lease_start=start, lease_end=end, lease_period_months=months)
+    records = [LeaseRecord.from_dict(record) for record in records]
+
+    start = time.perf_counter()
+    expected = [renew(record, args.round_to) for record in records]
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    renewals = compute_renewals(records, round_to=args.round_to)
+    vector_time = time.perf_counter() - start
+
+    columns = {name: values.tolist() for name, values in renewals.items()}
+    for n, terms in enumerate(expected):
+        for name, value in terms.items():
+            if columns[name][n] != value:
+                sys.exit(f"record {n + 1}: {name} is {columns[name][n]!r}, expected {value!r}")
+    print(f"{args.records} renewals match the per-lease computation")
+
+    start = time.perf_counter()
+    write_schedule(io.StringIO(), records, renewals)
+    schedule_time = time.perf_counter() - start
+
+    print(f"per-lease loop:    {loop_time * 1000:9.1f} ms")
+    print(f"compute_renewals:  {vector_time * 1000:9.1f} ms   ({loop_time / vector_time:.1f}x)")
+    print(f"schedule as CSV:   {schedule_time * 1000:9.1f} ms   (amounts in words included)")
+
+
+if __name__ == "__main__":
+    main()
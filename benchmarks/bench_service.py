@@ -0,0 +1,144 @@
+"""Load test of the HTTP service through an in-process asyncio client.
+
+Starts service.AgreementService on an ephemeral port in this process, then
+checks the responses for a valid record (the .docx text must match a direct
+render), an invalid record (422), a malformed body (400) and a burst larger
+than the workers plus queue (some requests must get 503). Finally measures
+latency and throughput for --requests requests at --concurrency.
+
+Usage: python benchmarks/bench_service.py [--workers N] [--max-queue N] [--requests N]
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import docx
+
+from bench_draft_skeleton import RECORD
+from rent_agreement_generator import build_field_values, create_document_from_draft
+from service import AgreementService
+
+PAYLOAD = json.dumps(RECORD, default=str).encode("utf-8")
+
+
+async def request(port, method, path, body=b""):
+    """Send one request and return (status, headers, body)"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1")
+        + body
+    )
+    await writer.drain()
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+    status = int(head[0].split()[1])
+    headers = {}
+    for line in head[1:]:
+        if line:
+            key, _, value = line.partition(":")
+            headers[key.strip().lower()] = value.strip()
+    data = await reader.readexactly(int(headers["content-length"]))
+    writer.close()
+    await writer.wait_closed()
+    return status, headers, data
+
+
+def document_text(data):
+    doc = docx.Document(io.BytesIO(data))
+    return [p.text for p in doc.paragraphs]
+
+
+def document_text_of(doc):
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return document_text(buffer.getvalue())
+
+
+async def check_responses(port, workers, max_queue):
+    status, _, data = await request(port, "GET", "/healthz")
+    assert status == 200, status
+    assert json.loads(data)["workers"] == workers
+
+    status, headers, data = await request(port, "POST", "/agreements", PAYLOAD)
+    assert status == 200, (status, data[:200])
+    assert headers["content-type"].endswith("wordprocessingml.document")
+    expected = document_text_of(create_document_from_draft(build_field_values(RECORD)))
+    assert document_text(data) == expected, "service output differs from a direct render"
+
+    status, _, data = await request(port, "POST", "/agreements?engine=ooxml", PAYLOAD)
+    assert status == 200 and document_text(data) == expected, status
+
+    invalid = json.dumps(dict(RECORD, lessor_name=""), default=str)
+    status, _, data = await request(port, "POST", "/agreements", invalid.encode("utf-8"))
+    assert status == 422, status
+    assert "Lessor name" in json.loads(data)["error"]
+
+    status, _, _ = await request(port, "POST", "/agreements", b"{not json")
+    assert status == 400, status
+    status, _, _ = await request(port, "GET", "/agreements")
+    assert status == 405, status
+
+    burst = workers + max_queue + 8
+    statuses = await asyncio.gather(*(request(port, "POST", "/agreements", PAYLOAD) for _ in range(burst)))
+    codes = [status for status, _, _ in statuses]
+    assert codes.count(503) >= 1, codes
+    assert set(codes) <= {200, 503}, codes
+    print(f"burst of {burst}: {codes.count(200)} served, {codes.count(503)} refused with 503")
+
+
+async def load(port, requests, concurrency):
+    latencies = []
+    pending = iter(range(requests))
+
+    async def client():
+        for _ in pending:
+            start = time.perf_counter()
+            status, _, _ = await request(port, "POST", "/agreements", PAYLOAD)
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                await asyncio.sleep(0.05)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+
+    print(f"{len(latencies)}/{requests} served at concurrency {concurrency}: "
+          f"{len(latencies) / elapsed:.1f} docs/second, p50 {percentile(50):.0f} ms, "
+          f"p99 {percentile(99):.0f} ms")
+
+
+async def run(args):
+    service = AgreementService(None, workers=args.workers, max_queue=args.max_queue)
+    server = await service.start("127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        async with server:
+            await check_responses(port, args.workers, args.max_queue)
+            print("service responses are correct")
+            await load(port, args.requests, args.concurrency)
+    finally:
+        service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--max-queue", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
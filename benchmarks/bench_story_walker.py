@@ -0,0 +1,201 @@
+"""Benchmark: the single-pass story walker vs python-docx proxy traversal.
+
+Builds table-heavy templates of --tables tables of --rows rows, with merged
+cells, a nested table in every fourth row, text boxes, a header, a footer and
+footnotes, all holding placeholders. Fills them three ways on fresh copies:
+
+* proxies: doc.paragraphs, then doc.tables -> rows -> cells -> paragraphs,
+  the traversal generate_agreement used before the template cache, which
+  visits a merged cell once per grid column it spans
+* body index: the paragraphs with placeholders of the body and its
+  top-level tables, found the way template_cache did before it walked every
+  story part
+* walker: template_cache's one iteration over the w:p of every story part
+
+and reports the paragraphs each visits, the placeholders left unfilled, the
+time of the traversal alone and with the substitution. Checks that the walker
+leaves no placeholder, and that every paragraph the other two reach comes out
+of the walker the same.
+
+Usage: python benchmarks/bench_story_walker.py [--tables N [N ...]] [--rows N] [--repeat N]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import docx
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.opc.packuri import PackURI
+from docx.opc.part import XmlPart
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls, nsmap, qn
+from docx.text.paragraph import Paragraph
+
+import template_cache
+from bench_suite import synthetic_records
+from lease_record import build_field_values
+from substitution import PLACEHOLDER_PATTERN, substitute_paragraph
+
+FOOTNOTES_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.footnotes+xml"
+TEXT_BOX = (
+    '<w:r {}><w:pict><v:shape style="width:200pt;height:40pt"><v:textbox><w:txbxContent>'
+    '<w:p><w:r><w:t>Unit [[apartment_unit_no]], [[tower_no]]</w:t></w:r></w:p>'
+    '</w:txbxContent></v:textbox></v:shape></w:pict></w:r>'
+).format(nsdecls("w") + ' xmlns:v="urn:schemas-microsoft-com:vml"')
+
+
+def table_heavy_template(tables, rows, names):
+    """A template whose placeholders are mostly in table cells, some merged or nested"""
+    doc = docx.Document()
+    section = doc.sections[0]
+    section.header.paragraphs[0].text = "Lease of [[apartment_unit_no]], [[property_name]]"
+    section.footer.paragraphs[0].text = "[[lessor_name]] / [[lessee_name]]"
+    n = 0
+    for t in range(tables):
+        doc.add_paragraph(f"Schedule {t + 1} for [[{names[t % len(names)]}]]")
+        table = doc.add_table(rows=rows, cols=4)
+        for r in range(rows):
+            for c in range(4):
+                table.cell(r, c).text = f"[[{names[n % len(names)]}]]"
+                n += 1
+        for r in range(0, rows, 3):
+            # Merged across the first two grid columns
+            table.cell(r, 0).merge(table.cell(r, 1))
+        for r in range(1, rows - 1, 5):
+            # Merged down two rows
+            table.cell(r, 3).merge(table.cell(r + 1, 3))
+        for r in range(2, rows, 4):
+            nested = table.cell(r, 2).add_table(rows=2, cols=2)
+            for cell in nested._cells:
+                cell.text = f"Nested [[{names[n % len(names)]}]]"
+                n += 1
+        doc.add_paragraph("See the box: ")._p.append(parse_xml(TEXT_BOX))
+    footnotes = parse_xml(
+        f'<w:footnotes {nsdecls("w")}><w:footnote w:id="1"><w:p><w:r>'
+        f'<w:t>Rent of [[rent_amount_numeric]] from [[lease_start_date]]</w:t></w:r></w:p></w:footnote></w:footnotes>'
+    )
+    part = XmlPart(PackURI("/word/footnotes.xml"), FOOTNOTES_CONTENT_TYPE, footnotes, doc.part.package)
+    doc.part.relate_to(part, RT.FOOTNOTES)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return docx.Document(io.BytesIO(buffer.getvalue()))
+
+
+def proxy_traversal(doc):
+    """The body paragraphs and table cell paragraphs, through python-docx proxies"""
+    visited = [paragraph._p for paragraph in doc.paragraphs]
+    for table in doc.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                visited.extend(paragraph._p for paragraph in cell.paragraphs)
+    return visited
+
+
+def body_index(doc):
+    """The paragraphs with placeholders of the body and its top-level table cells, by child index"""
+    candidates = []
+    for child in doc.element.body:
+        if child.tag == qn("w:p"):
+            candidates.append(child)
+        elif child.tag == qn("w:tbl"):
+            for tr in child.iterchildren(qn("w:tr")):
+                for tc in tr.iterchildren(qn("w:tc")):
+                    candidates.extend(tc.iterchildren(qn("w:p")))
+    return [p for p in candidates if PLACEHOLDER_PATTERN.search(Paragraph(p, None).text)]
+
+
+def walker(doc):
+    """The paragraphs with placeholders of every story part, indexed in one pass"""
+    roots = template_cache.story_roots(doc)
+    paragraphs = template_cache._paragraphs(roots)
+    return [
+        paragraphs[location.part][location.paragraph]
+        for location in template_cache._index_placeholders(roots, paragraphs)
+    ]
+
+
+def own_text(p):
+    """The text substitute_paragraph() fills in, without that of text boxes in p"""
+    return "".join(p.xpath("./w:r/w:t/text() | ./w:hyperlink/w:r/w:t/text()"))
+
+
+def unfilled(doc):
+    return sum(
+        len(PLACEHOLDER_PATTERN.findall(own_text(p)))
+        for root in template_cache.story_roots(doc).values() for p in root.iter(qn("w:p"))
+    )
+
+
+def paths(doc, paragraphs):
+    tree = doc.element.getroottree()
+    return {tree.getpath(p) for p in paragraphs}
+
+
+def best_of(repeat, template, find, field_values):
+    """Best times of find() alone and of find() plus filling what it found, on fresh clones"""
+    find_best = fill_best = float("inf")
+    for _ in range(repeat):
+        doc = template.clone()
+        start = time.perf_counter()
+        find(doc)
+        find_best = min(find_best, time.perf_counter() - start)
+        doc = template.clone()
+        start = time.perf_counter()
+        visited = find(doc)
+        for p in visited:
+            substitute_paragraph(p, field_values)
+        fill_best = min(fill_best, time.perf_counter() - start)
+    return find_best, fill_best, doc, visited
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tables", type=int, nargs="+", default=[5, 20, 80])
+    parser.add_argument("--rows", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    field_values = build_field_values(synthetic_records(1)[0])
+    names = sorted(field_values)
+    for tables in args.tables:
+        document = table_heavy_template(tables, args.rows, names)
+        template = template_cache.CompiledTemplate("bench", document, "bench", 0, 0)
+        paragraphs = sum(map(len, template.paragraphs.values()))
+
+        results = {}
+        for name, find in (("proxies", proxy_traversal), ("body index", body_index), ("walker", walker)):
+            results[name] = best_of(args.repeat, template, find, field_values)
+
+        walker_doc = results["walker"][2]
+        if unfilled(walker_doc):
+            sys.exit(f"{tables} tables: the walker left {unfilled(walker_doc)} placeholders")
+        walker_tree = walker_doc.element.getroottree()
+        for name in ("proxies", "body index"):
+            doc, visited = results[name][2:]
+            for path in paths(doc, visited):
+                # The paragraph's own text; a text box inside it is a paragraph of its own
+                expected = own_text(walker_tree.xpath(path, namespaces=nsmap)[0])
+                if own_text(doc.element.getroottree().xpath(path, namespaces=nsmap)[0]) != expected:
+                    sys.exit(f"{tables} tables: {name} and the walker fill {path} differently")
+
+        print(f"{tables} tables x {args.rows} rows, {paragraphs} paragraphs in {len(template.paragraphs)} story parts:")
+        walker_time = results["walker"][0]
+        for name, (find_time, fill_time, doc, visited) in results.items():
+            print(f"  {name:10}  traversal {find_time * 1000:7.2f} ms ({find_time / walker_time:4.1f}x walker)   "
+                  f"with substitution {fill_time * 1000:7.2f} ms   "
+                  f"{len(visited):5d} visits, {len(visited) - len(set(visited)):4d} repeated, "
+                  f"{unfilled(doc):4d} placeholders left")
+        render_time = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            template.render(field_values)
+            render_time = min(render_time, time.perf_counter() - start)
+        print(f"  cached render (clone and fill the indexed paragraphs) {render_time * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
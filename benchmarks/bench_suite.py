@@ -0,0 +1,248 @@
+"""Benchmark suite for the agreement rendering hot paths.
+
+Times each stage separately on synthetic inputs of increasing size:
+
+* templates of 10 to 5,000 paragraphs, plus a placeholder table with one row
+  per ten paragraphs: template load, clone, substitution and doc.save
+* lease datasets of 1 to 10,000 records: field derivation (including the
+  amounts in words) and the clause bold-splitting
+* the draft format: annexure table build and doc.save
+
+Every timing is the best of --repeat runs. Results are written as JSON; with
+--compare, each stage is checked against an earlier results file and the run
+fails if any stage got slower by more than --threshold percent.
+
+Usage:
+    python benchmarks/bench_suite.py --output results.json
+    python benchmarks/bench_suite.py --output new.json --compare results.json --threshold 10
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import docx
+
+import template_cache
+from amount_words import rupees_in_words
+from rent_agreement_generator import (
+    DRAFT_CLAUSE_SEGMENTS,
+    _annexure_table_xml,
+    _clause_runs,
+    _parse_block,
+    build_field_values,
+    create_document_from_draft,
+)
+from substitution import substitute_paragraph
+
+TEMPLATE_SIZES = (10, 100, 1000, 5000)
+DATASET_SIZES = (1, 100, 1000, 10000)
+TABLE_COLUMNS = 4
+
+FIRST_NAMES = ("Amit", "Rahul", "Priya", "Sunita", "Vikram", "Neha", "Arjun", "Kavita")
+LAST_NAMES = ("Gupta", "Sharma", "Verma", "Singh", "Agarwal", "Mehta", "Iyer", "Khan")
+
+
+def synthetic_records(count, seed=0):
+    """Return count lease records with varied names, amounts and dates"""
+    rng = random.Random(seed)
+    records = []
+    for n in range(count):
+        start = date(2025, 1, 1) + timedelta(days=rng.randrange(365))
+        rent = rng.randrange(8, 300) * 500
+        records.append({
+            "execution_date": start - timedelta(days=rng.randrange(30)),
+            "lessor_name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "lessor_father_name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "lessor_address": f"House {rng.randrange(1, 999)}, Sector {rng.randrange(1, 150)}, Noida",
+            "lessee_name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "lessee_father_name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "lessee_address": f"Flat {rng.randrange(1, 99)}, Karol Bagh, New Delhi",
+            "rent_amount": rent,
+            "security_deposit": rent * rng.choice((1, 2, 3)),
+            "payment_due_day": rng.randrange(1, 11),
+            "rent_increase_percentage": rng.choice((5, 8, 10)),
+            "lease_start": start,
+            "lease_end": start + timedelta(days=11 * 30),
+            "lease_period_months": 11,
+            "notice_period_months": rng.choice(("one", "two", "three")),
+            "apartment_unit_no": str(rng.randrange(101, 2500)),
+            "tower_no": f"T{rng.randrange(1, 12)}",
+            "property_name": "Gupta Residency",
+            "property_sector": str(rng.randrange(1, 150)),
+            "property_location": "Noida, UP",
+            "property_type": "3 BHK + Study",
+            "car_parks": rng.randrange(0, 3),
+        })
+    return records
+
+
+def synthetic_template(paragraphs):
+    """Build a template of paragraphs with placeholders, some split across runs
+    the way Word stores them, and a table with placeholders in every cell"""
+    names = sorted(build_field_values(synthetic_records(1)[0]))
+    doc = docx.Document()
+    for i in range(paragraphs):
+        para = doc.add_paragraph(f"Clause {i}: between ")
+        para.add_run(f"[[{names[i % len(names)]}]]").bold = True
+        para.add_run(" and [[")
+        para.add_run(names[(i + 1) % len(names)])
+        para.add_run("]] at a fixed rate, payable in advance.")
+    table = doc.add_table(rows=max(1, paragraphs // 10), cols=TABLE_COLUMNS)
+    for r, row in enumerate(table.rows):
+        for c, cell in enumerate(row.cells):
+            cell.text = f"{c + 1}. [[{names[(r + c) % len(names)]}]]"
+    return doc
+
+
+def best_of(repeat, fn, setup=None):
+    """Return the shortest time of repeat calls of fn(setup())"""
+    best = float("inf")
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_templates(sizes, repeat, results):
+    field_values = build_field_values(synthetic_records(1)[0])
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, f"template_{size}.docx")
+            synthetic_template(size).save(path)
+
+            def load(_):
+                template_cache.clear_cache()
+                template_cache.load_template(path)
+
+            template = template_cache.load_template(path)
+
+            def substitute(doc):
+                paragraphs = template_cache.story_paragraphs(doc)
+                for location in template.locations:
+                    substitute_paragraph(paragraphs[location.part][location.paragraph], field_values)
+
+            prefix = f"template/{size}"
+            results[f"{prefix}/load"] = {"seconds": best_of(repeat, load), "items": 1}
+            results[f"{prefix}/clone"] = {"seconds": best_of(repeat, lambda _: template.clone()), "items": 1}
+            results[f"{prefix}/substitute"] = {
+                "seconds": best_of(repeat, substitute, template.clone),
+                "items": len(template.locations),
+            }
+            rendered = template.render(field_values)
+            results[f"{prefix}/save"] = {
+                "seconds": best_of(repeat, lambda _: rendered.save(io.BytesIO())),
+                "items": 1,
+            }
+
+
+def bench_datasets(sizes, repeat, results):
+    for size in sizes:
+        records = synthetic_records(size)
+
+        def derive(_):
+            rupees_in_words.cache_clear()
+            for record in records:
+                build_field_values(record)
+
+        all_field_values = [build_field_values(record) for record in records]
+
+        def split_clauses(_):
+            for field_values in all_field_values:
+                for i, segments in enumerate(DRAFT_CLAUSE_SEGMENTS, 1):
+                    _clause_runs(field_values, i, segments)
+
+        prefix = f"dataset/{size}"
+        results[f"{prefix}/field_values"] = {"seconds": best_of(repeat, derive), "items": size}
+        results[f"{prefix}/clause_split"] = {"seconds": best_of(repeat, split_clauses), "items": size}
+
+
+def bench_draft(repeat, results):
+    field_values = build_field_values(synthetic_records(1)[0])
+    doc = create_document_from_draft(field_values)
+
+    def add_annexure_table(document):
+        document.element.body.append(_parse_block(_annexure_table_xml(field_values, document.part)))
+
+    results["draft/annexure_table"] = {
+        "seconds": best_of(repeat, add_annexure_table, docx.Document),
+        "items": 1,
+    }
+    results["draft/save"] = {"seconds": best_of(repeat, lambda _: doc.save(io.BytesIO())), "items": 1}
+
+
+def compare(results, baseline, threshold):
+    """Print each stage against the baseline and return the regressed stage names"""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]["seconds"]
+        change = (result["seconds"] - before) / before * 100 if before else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:36} {before * 1000:10.3f} ms -> {result['seconds'] * 1000:10.3f} ms  {change:+7.1f}%{flag}")
+    return regressions
+
+
+def parse_sizes(value):
+    return tuple(int(size) for size in value.split(","))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", "-o", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="results JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="percent slowdown that counts as a regression (default: 10)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--template-sizes", type=parse_sizes, default=TEMPLATE_SIZES,
+                        help="comma-separated paragraph counts")
+    parser.add_argument("--dataset-sizes", type=parse_sizes, default=DATASET_SIZES,
+                        help="comma-separated record counts")
+    args = parser.parse_args()
+
+    results = {}
+    bench_templates(args.template_sizes, args.repeat, results)
+    bench_datasets(args.dataset_sizes, args.repeat, results)
+    bench_draft(args.repeat, results)
+
+    report = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            sys.exit(f"{len(regressions)} stage(s) slower by more than {args.threshold:g}%")
+    else:
+        for name, result in results.items():
+            per_item = result["seconds"] / result["items"] * 1e6 if result["items"] else 0.0
+            print(f"{name:36} {result['seconds'] * 1000:10.3f} ms  {per_item:10.1f} us/item")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Benchmark: template cold load from the .docx vs from its precompiled artifact.
+
+For synthetic templates of --sizes paragraphs, with placeholders split across
+runs the way Word stores them, times template_cache.load_template() on an
+empty cache with and without the artifact template_compiler.py writes,
+checks that renders of both give the same document, and that a changed
+template makes load_template() ignore its stale artifact.
+
+Usage: python benchmarks/bench_template_compiler.py [--sizes N [N ...]] [--repeat N]
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from lxml import etree
+
+import template_cache
+from bench_suite import synthetic_records, synthetic_template
+from lease_record import build_field_values
+from template_compiler import compile_template, load_source
+
+
+def cold_load(path, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        template_cache.clear_cache()
+        start = time.perf_counter()
+        template = template_cache.load_template(path)
+        best = min(best, time.perf_counter() - start)
+    return best, template
+
+
+def document_xml(template, field_values):
+    return etree.tostring(template.render(field_values).element, method="c14n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    field_values = build_field_values(synthetic_records(1)[0])
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            path = os.path.join(tmp, f"template_{size}.docx")
+            synthetic_template(size).save(path)
+
+            source_time, source = cold_load(path, args.repeat)
+            start = time.perf_counter()
+            compile_template(path, file=io.StringIO())
+            compile_time = time.perf_counter() - start
+            compiled_time, compiled = cold_load(path, args.repeat)
+            if [(l.part, l.paragraph) for l in compiled.locations] != [(l.part, l.paragraph) for l in source.locations]:
+                sys.exit(f"{size} paragraphs: the artifact's placeholder index differs")
+            if document_xml(compiled, field_values) != document_xml(source, field_values):
+                sys.exit(f"{size} paragraphs: renders of the .docx and of the artifact differ")
+
+            print(f"{size:5d} paragraphs: .docx {source_time * 1000:8.1f} ms   "
+                  f"artifact {compiled_time * 1000:7.1f} ms   ({source_time / compiled_time:4.1f}x)   "
+                  f"compile once {compile_time * 1000:7.1f} ms   renders identical")
+
+        # Editing the template makes its artifact stale
+        synthetic_template(args.sizes[-1] + 1).save(path)
+        template_cache.clear_cache()
+        template = template_cache.load_template(path)
+        expected = load_source(path)
+        if template.digest != expected.digest or [(l.part, l.paragraph) for l in template.locations] != [
+            (l.part, l.paragraph) for l in expected.locations
+        ]:
+            sys.exit("a stale artifact was loaded")
+        print("a changed template is indexed again instead of using its stale artifact")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Clause text compiled into plain and bold segments.
+
+A clause is written as text with ``[[field]]`` placeholders and ``**``
+around each span to print in bold, e.g.
+"payable **on or before [[payment_due_day]]th** of each month".
+compile_clause() parses it once into a tuple of Segments, and render_clause()
+walks them and returns (text, bold) pieces, so a value is bold exactly where
+its placeholder is marked bold, however often the same value appears in the
+clause.
+"""
+from collections import namedtuple
+
+from substitution import PLACEHOLDER_PATTERN
+
+BOLD_MARKER = "**"
+
+# A literal piece of clause text (field is None) or a placeholder for field
+Segment = namedtuple("Segment", "text field bold")
+
+
+def _next_year(field_values):
+    return str(int(str(field_values.get("execution_year", 2025))) + 1)
+
+
+# Fields computed from other field values when a clause refers to them and
+# field_values does not have them, and the fields each one is computed from
+DERIVED_FIELDS = {
+    "next_year": _next_year,
+}
+DERIVED_FIELD_INPUTS = {
+    "next_year": ("execution_year",),
+}
+
+
+def compile_clause(text):
+    """Parse clause text into a tuple of Segments"""
+    spans = text.split(BOLD_MARKER)
+    if len(spans) % 2 == 0:
+        raise ValueError(f"Unbalanced {BOLD_MARKER} in clause: {text!r}")
+
+    segments = []
+    for n, span in enumerate(spans):
+        bold = n % 2 == 1
+        position = 0
+        for m in PLACEHOLDER_PATTERN.finditer(span):
+            if m.start() > position:
+                segments.append(Segment(span[position:m.start()], None, bold))
+            segments.append(Segment(m.group(0), m.group(1), bold))
+            position = m.end()
+        if position < len(span):
+            segments.append(Segment(span[position:], None, bold))
+    return tuple(segments)
+
+
+def clause_fields(segments):
+    """Return the names of the fields a compiled clause refers to"""
+    return {segment.field for segment in segments if segment.field is not None}
+
+
+def with_derived(fields):
+    """Return fields plus the derived fields computed from any of them"""
+    fields = set(fields)
+    fields.update(name for name, inputs in DERIVED_FIELD_INPUTS.items() if fields.intersection(inputs))
+    return fields
+
+
+def render_clause(segments, field_values):
+    """Return the clause as (text, bold) pieces, merging neighbours of the same weight
+
+    Placeholders of fields that are neither in field_values nor derivable
+    are left as they are.
+    """
+    pieces = []
+    for text, field, bold in segments:
+        if field is not None:
+            if field in field_values:
+                text = str(field_values[field])
+            elif field in DERIVED_FIELDS:
+                text = DERIVED_FIELDS[field](field_values)
+        if not text:
+            continue
+        if pieces and pieces[-1][1] == bold:
+            pieces[-1] = (pieces[-1][0] + text, bold)
+        else:
+            pieces.append((text, bold))
+    return pieces
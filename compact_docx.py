@@ -0,0 +1,350 @@
+"""Compact output: shrink a generated .docx without changing what it shows.
+
+A document saved by python-docx carries its whole default package: 164
+styles and the latent style table in styles.xml, the same again for Word
+2010 in stylesWithEffects.xml, a thumbnail, an empty bibliography custom XML
+item and the revision ids (rsids) Word adds as it edits a template. Together
+they are most of a 40 KB agreement. compact() rewrites the saved bytes:
+
+* styles are kept only when a story part, another kept style, a kept
+  numbering definition or the settings refer to them, or they are a default
+  style; the latent style table goes
+* numbering definitions (w:num and w:abstractNum) no paragraph or kept style
+  uses are removed
+* the thumbnail, stylesWithEffects.xml, custom XML items the document does
+  not bind content controls to, embedded fonts and any part no relationship
+  reaches are dropped, with their relationships and content types; rsids and
+  empty core properties are removed
+* with image_dpi, pictures larger than their size on the page at that
+  resolution are downsampled (needs Pillow; without it they are kept as they
+  are)
+* whitespace between elements is removed and every entry is deflated at
+  level, pictures, compressed already, at level 1
+
+The text, the formatting of every paragraph and run and the page layout stay
+as they were; bench_compact.py checks the text and paragraph styles.
+"""
+import io
+import posixpath
+import zipfile
+
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.ns import qn
+from lxml import etree
+
+import metrics
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Bump when compact() changes the documents it writes; part of the render
+# cache key of compacted agreements
+COMPACT_VERSION = 1
+DEFAULT_LEVEL = 9
+
+RT_STYLES_WITH_EFFECTS = "http://schemas.microsoft.com/office/2007/relationships/stylesWithEffects"
+STORY_RELATIONSHIPS = (RT.HEADER, RT.FOOTER, RT.FOOTNOTES, RT.ENDNOTES, RT.COMMENTS)
+
+CONTENT_TYPES = "[Content_Types].xml"
+_CT = "{http://schemas.openxmlformats.org/package/2006/content-types}"
+_R_EMBED = qn("r:embed")
+_VAL = qn("w:val")
+_RSID = qn("w:rsid")
+_W = qn("w:p")[:-1]
+
+# Elements whose w:val names a style, a w:num or a w:abstractNum
+_STYLE_REFERENCES = {qn(tag) for tag in (
+    "w:pStyle", "w:rStyle", "w:tblStyle", "w:basedOn", "w:link", "w:next", "w:numStyleLink", "w:styleLink",
+    "w:clickAndTypeStyle", "w:defaultTableStyle",
+)}
+_NUM_REFERENCE = qn("w:numId")
+_ABSTRACT_NUM_REFERENCE = qn("w:abstractNumId")
+_FONT_EMBEDS = tuple(qn(tag) for tag in ("w:embedRegular", "w:embedBold", "w:embedItalic", "w:embedBoldItalic"))
+_DROPPED_SETTINGS = tuple(qn(tag) for tag in ("w:rsids", "w:embedTrueTypeFonts", "w:saveSubsetFonts"))
+
+# Pictures are compressed already and gain little from deflating them harder
+# than level 1
+_PICTURE_EXTENSIONS = (".jpeg", ".jpg", ".png", ".gif")
+_EMU_PER_INCH = 914400
+_IMAGE_FORMATS = {"JPEG": {"quality": 85, "optimize": True}, "PNG": {"optimize": True}}
+
+
+def downsampling_available():
+    """Return whether images can be downsampled, which needs Pillow"""
+    return Image is not None
+
+
+def version(level=DEFAULT_LEVEL, image_dpi=None):
+    """Return the description of the compact() options, for render cache keys"""
+    return f"compact/{COMPACT_VERSION}/level {level}" + (f"/{image_dpi} dpi" if image_dpi else "")
+
+
+def _rels_name(part):
+    """Return the zip name of the relationships of part ("" for the package)"""
+    directory, name = posixpath.split(part)
+    return posixpath.join(directory, "_rels", name + ".rels")
+
+
+def _target(part, relationship):
+    target = relationship.get("Target")
+    if target.startswith("/"):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(part), target))
+
+
+class _Package:
+    """The entries of a .docx, with the XML parts parsed on first use"""
+
+    def __init__(self, data):
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            self.infos = archive.infolist()
+            self.blobs = {info.filename: archive.read(info) for info in self.infos}
+        self.parsed = {}
+
+    def xml(self, name):
+        """Return the parsed root of part name, or None when there is no such part"""
+        root = self.parsed.get(name)
+        if root is None and name in self.blobs:
+            root = self.parsed[name] = etree.fromstring(self.blobs[name])
+        return root
+
+    def relationships(self, part):
+        """Return the (relationship element, target part) pairs of part's internal relationships"""
+        rels = self.xml(_rels_name(part))
+        if rels is None:
+            return []
+        return [
+            (relationship, _target(part, relationship)) for relationship in rels
+            if relationship.get("TargetMode") != "External"
+        ]
+
+    def related(self, part, relationship_type):
+        return [target for relationship, target in self.relationships(part)
+                if relationship.get("Type") == relationship_type]
+
+    def drop(self, names):
+        """Remove parts with their relationships, the relationships to them and their content types"""
+        names = set(names) & self.blobs.keys()
+        if not names:
+            return []
+        for name in names:
+            for entry in (name, _rels_name(name)):
+                self.blobs.pop(entry, None)
+                self.parsed.pop(entry, None)
+        for rels_name in [name for name in self.blobs if name.endswith(".rels")]:
+            part = posixpath.join(posixpath.dirname(posixpath.dirname(rels_name)),
+                                  posixpath.basename(rels_name)[:-len(".rels")])
+            for relationship, target in self.relationships(part):
+                if target in names:
+                    relationship.getparent().remove(relationship)
+        content_types = self.xml(CONTENT_TYPES)
+        for override in content_types.findall(_CT + "Override"):
+            if override.get("PartName")[1:] in names:
+                content_types.remove(override)
+        return sorted(names)
+
+    def unreachable(self):
+        """Return the parts no chain of relationships from the package reaches"""
+        reached = {""}
+        pending = [""]
+        while pending:
+            for _, target in self.relationships(pending.pop()):
+                if target not in reached:
+                    reached.add(target)
+                    pending.append(target)
+        return [
+            name for name in self.blobs
+            if name != CONTENT_TYPES and name not in reached and not name.endswith(".rels")
+        ]
+
+    def save(self, level):
+        """Return the package as .docx bytes, [Content_Types].xml first, deflated at level"""
+        buffer = io.BytesIO()
+        compression = zipfile.ZIP_DEFLATED if level else zipfile.ZIP_STORED
+        infos = sorted(
+            (info for info in self.infos if info.filename in self.blobs),
+            key=lambda info: info.filename != CONTENT_TYPES,
+        )
+        with zipfile.ZipFile(buffer, "w") as archive:
+            for info in infos:
+                name = info.filename
+                root = self.parsed.get(name)
+                if root is None:
+                    data = self.blobs[name]
+                else:
+                    _strip_whitespace(root)
+                    data = etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+                # The original timestamps keep the output of the same input identical
+                entry_level = min(level, 1) if name.lower().endswith(_PICTURE_EXTENSIONS) else level
+                archive.writestr(zipfile.ZipInfo(name, info.date_time), data, compression, entry_level or None)
+        return buffer.getvalue()
+
+
+def compact(data, level=DEFAULT_LEVEL, image_dpi=None):
+    """Return the compacted .docx bytes of data and a report of what was removed
+
+    The report has bytes_before and bytes_after, the number of styles,
+    numbering definitions and images removed or downsampled, and the names of
+    the parts dropped.
+    """
+    with metrics.stage("compact"):
+        package = _Package(data)
+        main = package.related("", RT.OFFICE_DOCUMENT)[0]
+        stories = [main]
+        for relationship_type in STORY_RELATIONSHIPS:
+            stories.extend(package.related(main, relationship_type))
+        story_roots = [package.xml(story) for story in stories]
+
+        dropped = package.drop(package.related("", RT.THUMBNAIL))
+        dropped += package.drop(package.related(main, RT_STYLES_WITH_EFFECTS))
+        if not any(root.find(".//" + qn("w:dataBinding")) is not None for root in story_roots):
+            dropped += package.drop(package.related(main, RT.CUSTOM_XML))
+        for font_table in package.related(main, RT.FONT_TABLE):
+            for embed in list(package.xml(font_table).iter(*_FONT_EMBEDS)):
+                embed.getparent().remove(embed)
+            dropped += package.drop(package.related(font_table, RT.FONT))
+
+        settings = next(iter(package.related(main, RT.SETTINGS)), None)
+        settings_root = package.xml(settings) if settings else None
+        if settings_root is not None:
+            for element in list(settings_root.iter(*_DROPPED_SETTINGS, qn("w:savePreviewPicture"))):
+                element.getparent().remove(element)
+
+        styles = next(iter(package.related(main, RT.STYLES)), None)
+        numbering = next(iter(package.related(main, RT.NUMBERING)), None)
+        styles_removed, numbering_removed = _prune_definitions(
+            story_roots + ([settings_root] if settings_root is not None else []),
+            package.xml(styles) if styles else None,
+            package.xml(numbering) if numbering else None,
+        )
+        for root in story_roots + [package.xml(name) for name in (styles, numbering) if name]:
+            if root is not None:
+                _strip_rsids(root)
+        for core in package.related("", RT.CORE_PROPERTIES):
+            _strip_empty_properties(package.xml(core))
+
+        images = 0
+        if image_dpi and Image is not None:
+            images = _downsample_images(package, stories, image_dpi)
+
+        dropped += package.drop(package.unreachable())
+        compacted = package.save(level)
+    metrics.count("compact_bytes_saved", len(data) - len(compacted))
+    return compacted, {
+        "bytes_before": len(data),
+        "bytes_after": len(compacted),
+        "styles_removed": styles_removed,
+        "numbering_removed": numbering_removed,
+        "images_downsampled": images,
+        "parts_removed": sorted(dropped),
+    }
+
+
+def _prune_definitions(roots, styles, numbering):
+    """Remove the styles and numbering definitions nothing in roots refers to, directly or not
+
+    Return the number of styles and of numbering definitions removed.
+    """
+    definitions = {}
+    if styles is not None:
+        for style in styles.iterchildren(qn("w:style")):
+            definitions["style", style.get(qn("w:styleId"))] = style
+    if numbering is not None:
+        for num in numbering.iterchildren(qn("w:num")):
+            definitions["num", num.get(qn("w:numId"))] = num
+        for abstract_num in numbering.iterchildren(qn("w:abstractNum")):
+            definitions["abstractNum", abstract_num.get(qn("w:abstractNumId"))] = abstract_num
+
+    used = set()
+    pending = list(roots)
+    pending.extend(style for (kind, _), style in definitions.items()
+                   if kind == "style" and style.get(qn("w:default")) in ("1", "true", "on"))
+    used.update(id(element) for element in pending)
+    while pending:
+        for reference in pending.pop().iter(*_STYLE_REFERENCES, _NUM_REFERENCE, _ABSTRACT_NUM_REFERENCE):
+            if reference.tag == _NUM_REFERENCE:
+                kind = "num"
+            elif reference.tag == _ABSTRACT_NUM_REFERENCE:
+                kind = "abstractNum"
+            else:
+                kind = "style"
+            definition = definitions.get((kind, reference.get(_VAL)))
+            if definition is not None and id(definition) not in used:
+                used.add(id(definition))
+                pending.append(definition)
+
+    removed = {"style": 0, "num": 0, "abstractNum": 0}
+    for (kind, _), definition in definitions.items():
+        if id(definition) not in used:
+            definition.getparent().remove(definition)
+            removed[kind] += 1
+    if styles is not None:
+        for latent_styles in styles.findall(qn("w:latentStyles")):
+            styles.remove(latent_styles)
+    return removed["style"], removed["num"] + removed["abstractNum"]
+
+
+def _strip_rsids(root):
+    """Remove the revision save ids Word records on paragraphs, runs, rows, sections and styles"""
+    for element in list(root.iter(_RSID)):
+        element.getparent().remove(element)
+    for element in root.iter():
+        for name in [name for name in element.attrib if name.startswith(_W + "rsid")]:
+            del element.attrib[name]
+
+
+def _strip_empty_properties(root):
+    for element in list(root):
+        if not len(element) and not (element.text or "").strip():
+            root.remove(element)
+
+
+def _strip_whitespace(root):
+    """Drop the whitespace between elements, which is never content in these parts
+
+    Text of elements without children, such as a w:t holding a space, is kept.
+    """
+    for element in root.iter():
+        if len(element) and element.text and not element.text.strip():
+            element.text = None
+        if element.tail and not element.tail.strip():
+            element.tail = None
+
+
+def _downsample_images(package, stories, image_dpi):
+    """Downsample the pictures of stories to image_dpi at their largest size on the page; return how many"""
+    widths = {}
+    for story in stories:
+        targets = {relationship.get("Id"): target for relationship, target in package.relationships(story)}
+        for extent in package.xml(story).iter(qn("wp:extent")):
+            width = int(extent.get("cx", 0)) / _EMU_PER_INCH * image_dpi
+            for blip in extent.getparent().iter(qn("a:blip")):
+                target = targets.get(blip.get(_R_EMBED))
+                if target in package.blobs:
+                    widths[target] = max(widths.get(target, 0), width)
+
+    downsampled = 0
+    for name, width in widths.items():
+        data = package.blobs[name]
+        try:
+            image = Image.open(io.BytesIO(data))
+            image_format = image.format
+            if image_format not in _IMAGE_FORMATS or image.width <= width * 1.1:
+                continue
+            if image.mode == "P":
+                image = image.convert("RGBA")
+            size = (max(1, round(width)), max(1, round(image.height * width / image.width)))
+            # JPEGs are decoded at the smallest scale still at least that large
+            image.draft(image.mode, size)
+            resized = image.resize(size, Image.LANCZOS)
+            buffer = io.BytesIO()
+            resized.save(buffer, image_format, **_IMAGE_FORMATS[image_format])
+        except (OSError, ValueError):
+            metrics.count("compact_image_errors")
+            continue
+        if buffer.tell() < len(data):
+            package.blobs[name] = buffer.getvalue()
+            downsampled += 1
+    return downsampled
@@ -0,0 +1,198 @@
+"""Background jobs for slow work started from the Streamlit app.
+
+A Streamlit script run is thrown away when the page reruns, so slow work such
+as rendering a large template or converting to PDF runs here instead, on a
+process-wide thread pool, and the page only keeps the job's id and polls its
+progress. Threads rather than processes, because renders reuse the parsed
+templates and caches of this process and PDF conversion already runs in
+LibreOffice processes.
+
+Jobs are submitted under a key describing their work: submitting a key that
+is queued, running or finished recently returns the existing job, so two
+sessions (or two reruns) asking for the same agreement share one render.
+Each owner (a browser session) may have at most max_per_owner jobs queued
+or running. A job function receives its Job and reports progress with
+job.update(), which raises JobCancelled once the job is cancelled; a job
+still queued is cancelled without running at all. Cancelling a shared job
+cancels it for every session waiting on it.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job function when its job has been cancelled"""
+
+
+class TooManyJobs(RuntimeError):
+    """The owner already has max_per_owner jobs queued or running"""
+
+
+class Job:
+    """One unit of background work and its progress"""
+
+    def __init__(self, key, owner, description=""):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.owner = owner
+        self.description = description
+        self.state = QUEUED
+        self.progress = 0.0
+        self.message = "Queued"
+        self.result = None
+        self.error = None
+        self.submitted_at = time.monotonic()
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._future = None
+
+    @property
+    def active(self):
+        return self.state in ACTIVE_STATES
+
+    def update(self, progress=None, message=None):
+        """Report progress (0 to 1) and a status message; raise JobCancelled if cancelled"""
+        if self._cancel.is_set():
+            raise JobCancelled()
+        if progress is not None:
+            self.progress = progress
+        if message is not None:
+            self.message = message
+
+    def wait(self, future, poll_interval=0.1):
+        """Return the result of a concurrent future, cancelling it if the job is cancelled"""
+        while True:
+            if self._cancel.is_set():
+                future.cancel()
+                raise JobCancelled()
+            try:
+                return future.result(timeout=poll_interval)
+            except TimeoutError:
+                pass
+
+    def cancel(self):
+        """Ask the job to stop; return False if it had already finished"""
+        if not self.active:
+            return False
+        self._cancel.set()
+        if self._future is not None and self._future.cancel():
+            self._finish(CANCELLED, message="Cancelled")
+        return True
+
+    def _finish(self, state, result=None, error=None, message=None):
+        self.result = result
+        self.error = error
+        if message is not None:
+            self.message = message
+        self.finished_at = time.monotonic()
+        self.state = state
+
+
+class JobQueue:
+    """Runs jobs on a thread pool, deduplicated by key and capped per owner"""
+
+    def __init__(self, workers=4, max_per_owner=2, keep_seconds=600):
+        self.workers = workers
+        self.max_per_owner = max_per_owner
+        self.keep_seconds = keep_seconds
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._by_key = {}
+
+    def submit(self, key, fn, owner=None, description=""):
+        """Run fn(job) in the background and return the Job
+
+        Returns the existing job instead when one with the same key is
+        queued, running or done (and not yet pruned). Raises TooManyJobs
+        when owner already has max_per_owner active jobs.
+        """
+        with self._lock:
+            self._prune()
+            existing = self._by_key.get(key)
+            if existing is not None and (existing.active or existing.state == DONE):
+                return existing
+            active = sum(1 for job in self._jobs.values() if job.owner == owner and job.active)
+            if owner is not None and active >= self.max_per_owner:
+                raise TooManyJobs(f"{active} jobs are already running, wait for one to finish or cancel it")
+            job = Job(key, owner, description)
+            self._jobs[job.id] = job
+            self._by_key[key] = job
+            job._future = self._executor.submit(self._run, job, fn)
+            return job
+
+    def get(self, job_id):
+        """Return the job with this id, or None once it is unknown or pruned"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a job by id; return False if it is unknown or already finished"""
+        job = self.get(job_id)
+        return job.cancel() if job is not None else False
+
+    def jobs(self, owner=None):
+        """Return the jobs of owner, or all jobs, oldest first"""
+        with self._lock:
+            return [job for job in self._jobs.values() if owner is None or job.owner == owner]
+
+    def stats(self):
+        """Return the number of jobs in each state"""
+        with self._lock:
+            counts = {state: 0 for state in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)}
+            for job in self._jobs.values():
+                counts[job.state] += 1
+            return counts
+
+    def shutdown(self):
+        """Cancel the queued jobs and wait for the running ones"""
+        for job in self.jobs():
+            job.cancel()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def _run(self, job, fn):
+        if job._cancel.is_set():
+            job._finish(CANCELLED, message="Cancelled")
+            return
+        job.state = RUNNING
+        job.message = "Running"
+        try:
+            result = fn(job)
+        except JobCancelled:
+            job._finish(CANCELLED, message="Cancelled")
+        except Exception as e:
+            job._finish(FAILED, error=f"{type(e).__name__}: {e}", message="Failed")
+        else:
+            job.progress = 1.0
+            job._finish(DONE, result=result, message="Done")
+
+    def _prune(self):
+        """Forget jobs that finished more than keep_seconds ago"""
+        cutoff = time.monotonic() - self.keep_seconds
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and job.finished_at < cutoff:
+                del self._jobs[job_id]
+                if self._by_key.get(job.key) is job:
+                    del self._by_key[job.key]
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue(**options):
+    """Return the process-wide job queue, starting it on first use"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue(**options)
+        return _queue
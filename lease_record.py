@@ -0,0 +1,259 @@
+"""Lease records: the raw inputs of one agreement and the fields derived from them.
+
+A LeaseRecord is a frozen dataclass with __slots__ holding what the form (or
+a batch row) provides: dates as date objects, amounts as whole rupees and
+text as given. The template fields derived from them, dates with ordinal
+suffixes, amounts in figures and in words and the payment schedule, are
+formatted on first use and cached on the record, and to_field_values()
+returns the flat dict of template fields the renderers take.
+
+validate_columns() checks a column-oriented dataset of records (field name to
+a sequence of values) one column at a time and reports the errors per row.
+"""
+from dataclasses import dataclass, field, fields
+from datetime import date
+
+from amount_words import rupees_in_words
+from payment_schedule import lease_schedule
+
+# Required lease record fields and the message shown when one is missing
+REQUIRED_FIELDS = {
+    "lessor_name": "Lessor name is required",
+    "lessor_father_name": "Lessor's father name is required",
+    "lessor_address": "Lessor address is required",
+    "lessee_name": "Lessee name is required",
+    "lessee_father_name": "Lessee's father name is required",
+    "lessee_address": "Lessee address is required",
+    "apartment_unit_no": "Apartment/Unit number is required",
+    "tower_no": "Tower number is required",
+    "property_name": "Property name is required",
+    "property_sector": "Property sector is required",
+    "property_location": "Property location is required",
+}
+
+# Template fields derived from each record field; any other record field
+# feeds only the template field of the same name
+FIELD_DERIVATIONS = {
+    "execution_date": ("execution_date", "execution_month", "execution_year"),
+    "rent_amount": ("rent_amount_numeric", "rent_amount_words"),
+    "security_deposit": ("security_deposit_numeric", "security_deposit_words"),
+    "lease_start": ("lease_start_date",),
+    "lease_end": ("lease_end_date",),
+    "payment_schedule": ("payment_schedule",),
+}
+
+
+def format_date_with_suffix(date):
+    """Format date with suffix (1st, 2nd, 3rd, etc.)"""
+    day = date.day
+    suffix = 'th' if 11 <= day <= 13 else {1: 'st', 2: 'nd', 3: 'rd'}.get(day % 10, 'th')
+    return f"{day}{suffix} {date.strftime('%B %Y')}"
+
+
+def _amount_words(amount):
+    return rupees_in_words(amount).replace("Rupees ", "")
+
+
+@dataclass(frozen=True, slots=True)
+class LeaseRecord:
+    """The inputs of one lease agreement
+
+    Fields left as None are missing and produce no template field. extra
+    holds (name, value) pairs of inputs the record does not know, which are
+    passed through to the template fields unchanged. inventory is given as
+    a list of dicts (item, description, notes, photo) and held as a tuple
+    of their (key, value) pairs, so the record stays immutable and hashable;
+    to_dict() and to_field_values() return it as dicts again.
+    """
+
+    execution_date: date = None
+    lessor_name: str = None
+    lessor_father_name: str = None
+    lessor_address: str = None
+    lessee_name: str = None
+    lessee_father_name: str = None
+    lessee_address: str = None
+    rent_amount: int = None
+    security_deposit: int = None
+    payment_due_day: int = None
+    rent_increase_percentage: int = None
+    rent_escalation_months: int = None
+    lease_start: date = None
+    lease_end: date = None
+    lease_period_months: int = None
+    notice_period_months: str = None
+    payment_schedule: bool = None
+    apartment_unit_no: str = None
+    tower_no: str = None
+    property_name: str = None
+    property_sector: str = None
+    property_location: str = None
+    property_type: str = None
+    car_parks: int = None
+    ceiling_fans: int = None
+    tube_lights: str = None
+    fan_regulators: str = None
+    electric_bell: int = None
+    geyser: str = None
+    chimney: str = None
+    mirrors: str = None
+    modular_woodwork: str = None
+    fixed_almirah: str = None
+    keys: str = None
+    inventory: tuple = None
+    extra: tuple = ()
+    _derived: dict = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.inventory is not None:
+            object.__setattr__(self, "inventory", tuple(
+                tuple(entry.items()) if isinstance(entry, dict) else tuple(entry) for entry in self.inventory
+            ))
+
+    @classmethod
+    def from_dict(cls, record):
+        """Build a record from a dict of inputs, keeping unknown keys in extra"""
+        known = {}
+        extra = []
+        for key, value in record.items():
+            if key in INPUT_FIELDS:
+                known[key] = value
+            else:
+                extra.append((key, value))
+        return cls(**known, extra=tuple(extra))
+
+    def to_dict(self):
+        """Return the inputs as a dict, without the missing ones"""
+        record = {name: getattr(self, name) for name in INPUT_FIELDS if getattr(self, name) is not None}
+        if self.inventory is not None:
+            record["inventory"] = self._inventory_dicts()
+        record.update(self.extra)
+        return record
+
+    def _inventory_dicts(self):
+        return [dict(entry) for entry in self.inventory]
+
+    def derived(self):
+        """Return the derived template fields, formatted on the first call"""
+        derived = self._derived
+        if derived is None:
+            derived = {}
+            if self.execution_date is not None:
+                derived["execution_date"] = format_date_with_suffix(self.execution_date)
+                derived["execution_month"] = self.execution_date.strftime("%B")
+                derived["execution_year"] = self.execution_date.strftime("%Y")
+            if self.rent_amount is not None:
+                derived["rent_amount_numeric"] = f"Rs. {self.rent_amount:,}/-"
+                derived["rent_amount_words"] = _amount_words(self.rent_amount)
+            if self.security_deposit is not None:
+                derived["security_deposit_numeric"] = f"Rs. {self.security_deposit:,}/-"
+                derived["security_deposit_words"] = _amount_words(self.security_deposit)
+            if self.lease_start is not None:
+                derived["lease_start_date"] = format_date_with_suffix(self.lease_start)
+            if self.lease_end is not None:
+                derived["lease_end_date"] = format_date_with_suffix(self.lease_end)
+            if self.payment_schedule is not None:
+                schedulable = None not in (self.rent_amount, self.lease_start, self.lease_period_months)
+                derived["payment_schedule"] = lease_schedule(self) if self.payment_schedule and schedulable else None
+            # Frozen, but the cache is not part of the record's value
+            object.__setattr__(self, "_derived", derived)
+        return derived
+
+    def to_field_values(self):
+        """Return the template field values of this record as a new dict"""
+        derived = self.derived()
+        field_values = {}
+        for name in INPUT_FIELDS:
+            value = getattr(self, name)
+            if value is None:
+                continue
+            outputs = FIELD_DERIVATIONS.get(name)
+            if name == "inventory":
+                field_values[name] = self._inventory_dicts()
+            elif outputs is None:
+                field_values[name] = value
+            else:
+                for output in outputs:
+                    field_values[output] = derived[output]
+        field_values.update(self.extra)
+        return field_values
+
+    def validate(self):
+        """Return the validation errors of this record"""
+        return [message for name, message in REQUIRED_FIELDS.items() if not getattr(self, name)]
+
+
+INPUT_FIELDS = tuple(f.name for f in fields(LeaseRecord) if f.name not in ("extra", "_derived"))
+
+# Fields holding data for the draft's annexures rather than text for a placeholder
+STRUCTURED_FIELDS = ("inventory", "payment_schedule")
+
+
+def template_fields():
+    """Return the names of the template fields a record provides, for placeholders"""
+    names = []
+    for name in INPUT_FIELDS:
+        if name not in STRUCTURED_FIELDS:
+            names.extend(FIELD_DERIVATIONS.get(name, (name,)))
+    return names
+
+
+def build_field_values(record):
+    """Derive the template field values from a lease record dict
+
+    The record holds the raw inputs: dates as date objects and amounts as
+    numbers. Every other key is passed through unchanged.
+    """
+    return LeaseRecord.from_dict(record).to_field_values()
+
+
+def validate_record(record):
+    """Return the validation errors for a lease record dict"""
+    return [message for name, message in REQUIRED_FIELDS.items() if not record.get(name)]
+
+
+def validate_columns(columns, count=None):
+    """Validate a column-oriented dataset of lease records
+
+    columns maps field names to equal-length sequences of values; count is
+    the number of rows, by default the length of the longest column. Each
+    required column is scanned once. Returns {row: [messages]} for the rows
+    with errors, rows numbered from 0 in ascending order and each row's
+    messages in REQUIRED_FIELDS order.
+    """
+    if count is None:
+        count = max((len(values) for values in columns.values()), default=0)
+    errors = {}
+    for name, message in REQUIRED_FIELDS.items():
+        values = columns.get(name)
+        if values is None:
+            rows = range(count)
+        else:
+            rows = [row for row, value in enumerate(values) if not value]
+            rows.extend(range(len(values), count))
+        for row in rows:
+            errors.setdefault(row, []).append(message)
+    return dict(sorted(errors.items()))
+
+
+def records_from_columns(columns, count=None):
+    """Return (records, errors) for a column-oriented dataset
+
+    records has a LeaseRecord per row, or None for a row that failed
+    validation; errors is as returned by validate_columns().
+    """
+    if count is None:
+        count = max((len(values) for values in columns.values()), default=0)
+    errors = validate_columns(columns, count)
+    known = [(name, values) for name, values in columns.items() if name in INPUT_FIELDS]
+    extra = [(name, values) for name, values in columns.items() if name not in INPUT_FIELDS]
+    records = []
+    for row in range(count):
+        if row in errors:
+            records.append(None)
+            continue
+        records.append(LeaseRecord(
+            **{name: values[row] for name, values in known if row < len(values)},
+            extra=tuple((name, values[row]) for name, values in extra if row < len(values)),
+        ))
+    return records, errors
@@ -0,0 +1,344 @@
+"""Per-stage timings and counters for document generation.
+
+Code marks its stages with ``with metrics.stage("substitute"):`` or the
+@metrics.timed decorator, and counts work with ``metrics.count(name, n)``.
+Nothing is recorded until a sink is enabled: while disabled, stage() hands
+back one shared no-op context manager and count() returns straight away.
+
+Once enabled, each stage's call count, total and worst time are aggregated
+in the process, and flush() passes a snapshot to every sink. Built-in sinks
+write a Prometheus text-format file (for node_exporter's textfile collector)
+or log JSON lines. With trace_memory=True, each stage also records the peak
+traced memory allocated while it ran; this uses tracemalloc and is far from
+free, so it is off by default. The process's peak RSS is always reported.
+
+Metrics can be switched on without code changes through the
+RENT_AGREEMENT_METRICS environment variable, e.g.
+``prometheus:/var/lib/node_exporter/rent_agreement_{pid}.prom,log``.
+"""
+import functools
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+ENV_VAR = "RENT_AGREEMENT_METRICS"
+
+_sinks = []
+_spec = None
+_trace_memory = False
+_lock = threading.Lock()
+_stages = {}
+_counters = {}
+_flush_lock = threading.Lock()
+# The stages open on each thread, innermost last, while tracing memory
+_open_stages = threading.local()
+
+
+def _memory_stack():
+    stack = getattr(_open_stages, "stack", None)
+    if stack is None:
+        stack = _open_stages.stack = []
+    return stack
+
+
+class _NullStage:
+    """The context manager stage() returns while metrics are disabled"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("name", "start", "base", "peak")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        if _trace_memory:
+            stack = _memory_stack()
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            self.base = current
+            self.peak = current
+            stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        peak_bytes = 0
+        stack = _memory_stack() if _trace_memory else None
+        if stack and stack[-1] is self:
+            stack.pop()
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            peak_bytes = self.peak - self.base
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, self.peak)
+        _record(self.name, elapsed, peak_bytes)
+        return False
+
+
+def _record(name, elapsed, peak_bytes):
+    with _lock:
+        stats = _stages.get(name)
+        if stats is None:
+            stats = _stages[name] = {"count": 0, "seconds": 0.0, "max_seconds": 0.0, "peak_bytes": 0}
+        stats["count"] += 1
+        stats["seconds"] += elapsed
+        stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+        stats["peak_bytes"] = max(stats["peak_bytes"], peak_bytes)
+    for sink in _sinks:
+        sink.stage(name, elapsed, peak_bytes)
+
+
+def enabled():
+    """Return True when at least one sink is enabled"""
+    return bool(_sinks)
+
+
+def stage(name):
+    """Return a context manager that times the block as stage name"""
+    if not _sinks:
+        return _NULL_STAGE
+    return _Stage(name)
+
+
+def timed(name=None):
+    """Decorator that times every call of the function as a stage
+
+    The stage is named after the function unless name is given.
+    """
+    def decorator(fn):
+        stage_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _sinks:
+                return fn(*args, **kwargs)
+            with _Stage(stage_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, n=1):
+    """Add n to the counter name"""
+    if not _sinks:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def max_rss_bytes():
+    """Return the peak resident set size of the process, or 0 if unknown"""
+    if resource is None:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def snapshot():
+    """Return the stage stats and counters recorded so far"""
+    with _lock:
+        return {
+            "stages": {name: dict(stats) for name, stats in _stages.items()},
+            "counters": dict(_counters),
+            "max_rss_bytes": max_rss_bytes(),
+        }
+
+
+def reset():
+    """Forget the recorded stats and counters"""
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+
+
+def flush():
+    """Export a snapshot to every sink
+
+    Flushes from different threads are exported one at a time, so the last
+    snapshot taken is the last written. A sink that fails to export is logged
+    and skipped rather than failing the caller's work.
+    """
+    if not _sinks:
+        return
+    with _flush_lock:
+        data = snapshot()
+        for sink in _sinks:
+            try:
+                sink.export(data)
+            except OSError as e:
+                logging.getLogger("rent_agreement.metrics").warning(
+                    "Could not export metrics with %s: %s", type(sink).__name__, e
+                )
+
+
+def enable(*sinks, trace_memory=False):
+    """Start recording, exporting to sinks"""
+    global _trace_memory
+    _sinks[:] = sinks
+    _trace_memory = trace_memory
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    """Stop recording and drop the sinks"""
+    global _trace_memory, _spec, _open_stages
+    _sinks.clear()
+    _spec = None
+    if _trace_memory:
+        _trace_memory = False
+        tracemalloc.stop()
+    # Stages still open on other threads must not be parents once re-enabled
+    _open_stages = threading.local()
+
+
+def configure(spec):
+    """Enable the sinks described by spec, a comma-separated list of
+    ``prometheus:PATH``, ``log`` and ``memory`` (turns on trace_memory)
+
+    Calling it again with the same spec does nothing, so it is safe on every
+    Streamlit rerun. An empty spec disables metrics.
+    """
+    global _spec
+    if spec == _spec:
+        return
+    if not spec:
+        disable()
+        return
+    sinks = []
+    trace_memory = False
+    for item in spec.split(","):
+        kind, _, arg = item.strip().partition(":")
+        if kind == "prometheus":
+            if not arg:
+                raise ValueError("prometheus metrics need a file path, e.g. prometheus:/tmp/metrics.prom")
+            sinks.append(PrometheusFileSink(arg))
+        elif kind == "log":
+            sinks.append(LogSink())
+        elif kind == "memory":
+            trace_memory = True
+        else:
+            raise ValueError(f"Unknown metrics sink {kind!r}")
+    enable(*sinks, trace_memory=trace_memory)
+    _spec = spec
+
+
+def configure_from_env():
+    """configure() from the RENT_AGREEMENT_METRICS environment variable"""
+    configure(os.environ.get(ENV_VAR, ""))
+
+
+class Sink:
+    """Base class for metric exporters; override either hook"""
+
+    def stage(self, name, seconds, peak_bytes):
+        """Called after every timed stage"""
+
+    def export(self, data):
+        """Called by flush() with a snapshot()"""
+
+
+def _metric_name(name):
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+class PrometheusFileSink(Sink):
+    """Writes the snapshot in the Prometheus text format on every flush
+
+    A ``{pid}`` in the path is replaced by the process id, so worker
+    processes of a batch each write their own file. The file is replaced
+    atomically, from a temporary file of its own for every export, so a
+    collector never reads half of it and threads never write each other's.
+    """
+
+    def __init__(self, path, prefix="rent_agreement"):
+        self.path = path
+        self.prefix = prefix
+
+    def export(self, data):
+        p = self.prefix
+        lines = [
+            f"# HELP {p}_stage_seconds Time spent in each document generation stage",
+            f"# TYPE {p}_stage_seconds summary",
+        ]
+        stages = sorted(data["stages"].items())
+        for name, stats in stages:
+            lines.append(f'{p}_stage_seconds_sum{{stage="{name}"}} {stats["seconds"]:.9f}')
+            lines.append(f'{p}_stage_seconds_count{{stage="{name}"}} {stats["count"]}')
+        lines.append(f"# HELP {p}_stage_max_seconds Slowest run of each stage")
+        lines.append(f"# TYPE {p}_stage_max_seconds gauge")
+        for name, stats in stages:
+            lines.append(f'{p}_stage_max_seconds{{stage="{name}"}} {stats["max_seconds"]:.9f}')
+        if any(stats["peak_bytes"] for _, stats in stages):
+            lines.append(f"# HELP {p}_stage_peak_bytes Peak memory allocated while each stage ran")
+            lines.append(f"# TYPE {p}_stage_peak_bytes gauge")
+            for name, stats in stages:
+                lines.append(f'{p}_stage_peak_bytes{{stage="{name}"}} {stats["peak_bytes"]}')
+        for name, value in sorted(data["counters"].items()):
+            metric = f"{p}_{_metric_name(name)}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        lines.append(f"# TYPE {p}_max_rss_bytes gauge")
+        lines.append(f"{p}_max_rss_bytes {data['max_rss_bytes']}")
+
+        path = self.path.replace("{pid}", str(os.getpid()))
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            # mkstemp makes the file private; the collector may run as another user
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+
+class LogSink(Sink):
+    """Logs one JSON line per stage and per flush"""
+
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or logging.getLogger("rent_agreement.metrics")
+        self.level = level
+
+    def stage(self, name, seconds, peak_bytes):
+        if self.logger.isEnabledFor(self.level):
+            event = {"event": "stage", "stage": name, "ms": round(seconds * 1000, 3)}
+            if peak_bytes:
+                event["peak_bytes"] = peak_bytes
+            self.logger.log(self.level, json.dumps(event))
+
+    def export(self, data):
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, json.dumps(dict(event="metrics", **data)))
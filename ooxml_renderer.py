@@ -0,0 +1,175 @@
+"""Render .docx packages by writing OOXML straight into a zip stream.
+
+The python-docx engine builds an lxml tree for every document and then
+serializes and zips it. For a document whose layout is fixed, such as the
+draft-format agreement, everything except a few paragraphs' runs is the same
+on every render. StreamingDocxRenderer keeps the other package parts as ready-to-write,
+already deflated zip entries and word/document.xml as precompiled byte
+fragments around those paragraphs, so a render only formats the variable runs,
+deflates one part and writes the zip stream sequentially.
+"""
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from docx.opc.oxml import serialize_part_xml
+from docx.oxml.ns import qn
+
+from archive_writer import ArchiveWriter, compress_entry
+
+_SLOT_MARKER = "@@slot-{}@@"
+_SPECIAL_CHARS = re.compile(r"(\t|\r|\n)")
+# Characters XML 1.0 does not allow; Word refuses a document.xml holding one
+_XML_ILLEGAL_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]")
+
+
+def xml_text(text):
+    """Return text without the characters XML cannot hold, such as a vertical tab pasted from Word"""
+    return _XML_ILLEGAL_CHARS.sub("", text)
+
+
+def run_xml(text, bold=False, underline=False, superscript=False):
+    """Return the w:r element python-docx writes for add_run(text) with these properties"""
+    props = []
+    if bold:
+        props.append("<w:b/>")
+    if underline:
+        props.append('<w:u w:val="single"/>')
+    if superscript:
+        props.append('<w:vertAlign w:val="superscript"/>')
+
+    content = []
+    for token in _SPECIAL_CHARS.split(xml_text(text)):
+        if not token:
+            continue
+        if token == "\t":
+            content.append("<w:tab/>")
+        elif token in "\r\n":
+            content.append("<w:br/>")
+        elif len(token.strip()) < len(token):
+            content.append(f'<w:t xml:space="preserve">{escape(token)}</w:t>')
+        else:
+            content.append(f"<w:t>{escape(token)}</w:t>")
+
+    if not props and not content:
+        return "<w:r/>"
+    rpr = f"<w:rPr>{''.join(props)}</w:rPr>" if props else ""
+    return f"<w:r>{rpr}{''.join(content)}</w:r>"
+
+
+class _ZipEntry:
+    """A compressed zip member: name, uncompressed size, method, crc and data"""
+
+    __slots__ = ("name", "size", "method", "crc", "data")
+
+    def __init__(self, name, raw, level):
+        self.name = name
+        self.size = len(raw)
+        self.method, self.crc, self.data = compress_entry(raw, level)
+
+
+def _write_zip(file, entries):
+    """Write compressed entries as a zip archive to a (possibly unseekable) file"""
+    with ArchiveWriter(file) as archive:
+        for entry in entries:
+            archive.write_compressed(entry.name, entry.size, entry.method, entry.crc, entry.data)
+
+
+class StreamingDocxRenderer:
+    """Writes a fixed-layout document whose slot paragraphs get new runs per render
+
+    Build one with from_document() from a python-docx document in which the
+    slot paragraphs have no runs yet. A block slot is a placeholder element
+    replaced as a whole by XML given at render time, such as a table, or
+    left out when that XML is empty.
+    """
+
+    def __init__(self, parts, document_name, fragments, level=6, block_slots=frozenset()):
+        # parts: _ZipEntry per package part in package order, with None in
+        # place of the main document part, which is built on each render
+        self.parts = parts
+        self.document_name = document_name
+        self.fragments = fragments
+        self.level = level
+        self.block_slots = frozenset(block_slots)
+
+    @classmethod
+    def from_document(cls, document, slot_elements, level=6, block_slots=()):
+        """Precompile document, leaving a hole at the end of each slot paragraph
+
+        The elements of the slots numbered in block_slots are left out
+        instead, leaving a hole in their place.
+        """
+        main_part = document.part
+        element = main_part.element
+        markers = []
+        replaced = []
+        for n, p in enumerate(slot_elements):
+            marker = p.makeelement(qn("w:r"), {})
+            t = marker.makeelement(qn("w:t"), {})
+            t.text = _SLOT_MARKER.format(n)
+            marker.append(t)
+            if n in block_slots:
+                block_marker = p.makeelement(qn("w:p"), {})
+                block_marker.append(marker)
+                p.getparent().replace(p, block_marker)
+                replaced.append((block_marker, p))
+            else:
+                p.append(marker)
+                markers.append(marker)
+        try:
+            xml = serialize_part_xml(element)
+        finally:
+            for marker in markers:
+                marker.getparent().remove(marker)
+            for block_marker, p in replaced:
+                block_marker.getparent().replace(block_marker, p)
+
+        fragments = []
+        rest = xml
+        for n in range(len(slot_elements)):
+            marker_xml = f"<w:r><w:t>{_SLOT_MARKER.format(n)}</w:t></w:r>"
+            if n in block_slots:
+                marker_xml = f"<w:p>{marker_xml}</w:p>"
+            head, rest = rest.split(marker_xml.encode("utf-8"), 1)
+            fragments.append(head)
+        fragments.append(rest)
+
+        buffer = io.BytesIO()
+        document.save(buffer)
+        document_name = main_part.partname.lstrip("/")
+        parts = []
+        with zipfile.ZipFile(buffer) as package:
+            for name in package.namelist():
+                parts.append(None if name == document_name else _ZipEntry(name, package.read(name), level))
+        return cls(parts, document_name, fragments, level, block_slots)
+
+    def document_xml(self, slot_runs):
+        """Return word/document.xml with slot_runs written into the slots
+
+        slot_runs holds one list of run specs, (text, bold, underline,
+        superscript), per slot, or the XML string of a block slot.
+        """
+        if len(slot_runs) != len(self.fragments) - 1:
+            raise ValueError(f"Expected {len(self.fragments) - 1} slots, got {len(slot_runs)}")
+        chunks = []
+        for slot, (fragment, runs) in enumerate(zip(self.fragments, slot_runs)):
+            chunks.append(fragment)
+            if slot in self.block_slots:
+                chunks.append(runs.encode("utf-8"))
+            else:
+                chunks.append("".join(run_xml(*run) for run in runs).encode("utf-8"))
+        chunks.append(self.fragments[-1])
+        return b"".join(chunks)
+
+    def write(self, file, slot_runs):
+        """Write the rendered package to a file-like object"""
+        document = _ZipEntry(self.document_name, self.document_xml(slot_runs), self.level)
+        _write_zip(file, [document if entry is None else entry for entry in self.parts])
+
+    def render(self, slot_runs):
+        """Return the rendered package as bytes"""
+        buffer = io.BytesIO()
+        self.write(buffer, slot_runs)
+        return buffer.getvalue()
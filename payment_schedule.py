@@ -0,0 +1,199 @@
+"""Month-by-month rent payment schedules.
+
+A lease of lease_period_months months is paid in as many monthly
+installments: the first on the lease start, each following one on
+payment_due_day of its calendar month (the last day of a shorter month).
+Rent goes up by rent_increase_percentage, as clause 5 provides, every
+rent_escalation_months months (ESCALATION_MONTHS unless the record says
+otherwise), each increase rounded half up to the rupee.
+
+compute_schedules() works on columns of many leases at once: the
+installments of every lease are laid out as a leases x months grid of
+NumPy dates and amounts, so a portfolio of thousands of five-year leases
+takes milliseconds. schedule_annexure_xml() writes one lease's schedule as
+the annexure of the draft agreement, through annexure.table_xml().
+"""
+import numpy as np
+
+from annexure import table_xml
+from ooxml_renderer import run_xml
+
+ESCALATION_MONTHS = 12
+
+CSV_COLUMNS = ("record", "installment", "due_date", "rent_amount", "total_paid")
+
+TABLE_COLUMNS = [("S.NO.", 0.5), ("DUE DATE", 1.75), ("MONTHLY RENT", 1.75), ("TOTAL PAID", 1.75)]
+
+MONTH_ABBREVIATIONS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+# date.toordinal() of 1970-01-01, day 0 of datetime64[D]
+_EPOCH_ORDINAL = 719163
+
+
+def round_half_up(numerator, denominator, round_to=1):
+    """numerator / denominator rounded to the nearest multiple of round_to, in integer arithmetic"""
+    unit = denominator * round_to
+    return (2 * numerator + unit) // (2 * unit) * round_to
+
+
+def date_column(records, field):
+    """Return the dates in attribute field of records as a datetime64[D] array"""
+    # Much faster than np.array(dates, dtype="datetime64[D]"), which parses each date
+    ordinals = np.fromiter((getattr(r, field).toordinal() for r in records), dtype=np.int64, count=len(records))
+    return (ordinals - _EPOCH_ORDINAL).astype("datetime64[D]")
+
+
+def _int_column(records, field, default):
+    values = (getattr(r, field) for r in records)
+    return np.fromiter((default if v is None else v for v in values), dtype=np.int64, count=len(records))
+
+
+def compute_schedules(rent, increase, start, months, due_day, escalation):
+    """Return the installments of many leases as a dict of flat NumPy arrays
+
+    The arguments are equal-length arrays, one element per lease: monthly
+    rent, increase percentage, lease start (datetime64[D]), number of
+    months, due day of the month and months between increases. The result
+    has lease (the index of the lease), installment (from 1), due_date
+    (datetime64[D]), rent_amount and total_paid (int64, the running total
+    of the lease), one element per installment, leases in order.
+    """
+    rent = np.asarray(rent, dtype=np.int64)
+    increase = np.asarray(increase, dtype=np.int64)
+    start = np.asarray(start, dtype="datetime64[D]")
+    months = np.asarray(months, dtype=np.int64)
+    due_day = np.asarray(due_day, dtype=np.int64)
+    escalation = np.maximum(np.asarray(escalation, dtype=np.int64), 1)
+
+    width = int(months.max(initial=0))
+    month = np.arange(width)
+    paid = month < months[:, None]
+
+    # Rent after each increase; a lease never needs more than width of them
+    steps = month // escalation[:, None]
+    step_count = int(np.where(paid, steps, 0).max(initial=0)) + 1
+    rent_by_step = np.empty((len(rent), step_count), dtype=np.int64)
+    rent_by_step[:, 0] = rent
+    for step in range(1, step_count):
+        rent_by_step[:, step] = round_half_up(rent_by_step[:, step - 1] * (100 + increase), 100)
+    amounts = np.take_along_axis(rent_by_step, np.minimum(steps, step_count - 1), axis=1)
+    amounts = np.where(paid, amounts, 0)
+
+    # Due on due_day of each calendar month, clipped to the month's length
+    calendar_month = start.astype("datetime64[M]")[:, None] + month
+    first_day = calendar_month.astype("datetime64[D]")
+    month_length = ((calendar_month + np.timedelta64(1, "M")).astype("datetime64[D]") - first_day).astype(np.int64)
+    due = first_day + (np.minimum(due_day[:, None], month_length) - 1)
+    due[:, :1] = start[:, None]
+
+    lease, installment = np.nonzero(paid)
+    return {
+        "lease": lease,
+        "installment": installment + 1,
+        "due_date": due[paid],
+        "rent_amount": amounts[paid],
+        "total_paid": np.cumsum(amounts, axis=1)[paid],
+    }
+
+
+def record_schedules(records):
+    """compute_schedules() for LeaseRecords
+
+    A record without a payment_due_day pays on its lease start's day of the
+    month and one without a rent_increase_percentage never increases.
+    """
+    start = date_column(records, "lease_start")
+    start_day = start - start.astype("datetime64[M]").astype("datetime64[D]") + np.timedelta64(1, "D")
+    due_day = _int_column(records, "payment_due_day", 0)
+    return compute_schedules(
+        _int_column(records, "rent_amount", 0),
+        _int_column(records, "rent_increase_percentage", 0),
+        start,
+        _int_column(records, "lease_period_months", 0),
+        np.where(due_day > 0, due_day, start_day.astype(np.int64)),
+        _int_column(records, "rent_escalation_months", ESCALATION_MONTHS),
+    )
+
+
+def lease_schedule(record):
+    """Return the schedule of one LeaseRecord for its template fields
+
+    A dict of rows, (due date, rent, total paid) per installment, the due
+    day, and the increase and escalation period the amounts use.
+    """
+    schedule = record_schedules([record])
+    return {
+        "rows": list(zip(
+            schedule["due_date"].tolist(), schedule["rent_amount"].tolist(), schedule["total_paid"].tolist(),
+        )),
+        "payment_due_day": record.payment_due_day or record.lease_start.day,
+        "rent_increase_percentage": record.rent_increase_percentage or 0,
+        "escalation_months": record.rent_escalation_months or ESCALATION_MONTHS,
+    }
+
+
+def write_schedules(file, records):
+    """Write the installments of LeaseRecords as CSV; None records are skipped
+
+    Records are numbered from 1 in the order given, None ones included, so
+    the numbers match the input rows.
+    """
+    numbers = np.array([n for n, record in enumerate(records, 1) if record is not None], dtype=np.int64)
+    schedule = record_schedules([record for record in records if record is not None])
+    # Leases share most due dates, so format each distinct date once
+    dates, date_index = np.unique(schedule["due_date"], return_inverse=True)
+    lines = [",".join(CSV_COLUMNS)]
+    lines.extend(map(
+        "{},{},{},{},{}".format,
+        numbers[schedule["lease"]].tolist(),
+        schedule["installment"].tolist(),
+        np.datetime_as_string(dates)[date_index].tolist(),
+        schedule["rent_amount"].tolist(),
+        schedule["total_paid"].tolist(),
+    ))
+    file.write("\r\n".join(lines) + "\r\n")
+    return len(lines) - 1
+
+
+def _ordinal(day):
+    return f"{day}{'th' if 11 <= day <= 13 else {1: 'st', 2: 'nd', 3: 'rd'}.get(day % 10, 'th')}"
+
+
+def _amount(value):
+    return f"Rs. {value:,}/-"
+
+
+def _due_date(value):
+    return f"{value.day:02d} {MONTH_ABBREVIATIONS[value.month - 1]} {value.year}"
+
+
+def schedule_annexure_xml(field_values):
+    """Return the payment schedule annexure of the draft agreement as one body element
+
+    Nothing, "", without a payment_schedule field; otherwise a
+    content control holding the heading on a new page, a summary of the
+    terms and the installments table.
+    """
+    schedule = field_values.get("payment_schedule")
+    if not schedule:
+        return ""
+    rows = schedule["rows"]
+    terms = (
+        f"Rent payable on or before the {_ordinal(schedule['payment_due_day'])} of each English Calendar month, "
+        f"the first month's rent on the lease start"
+    )
+    if schedule["rent_increase_percentage"]:
+        terms += (
+            f", increased by {schedule['rent_increase_percentage']}% "
+            f"after every {schedule['escalation_months']} months"
+        )
+    terms += f". Total rent for {len(rows)} months: {_amount(rows[-1][2] if rows else 0)}"
+    table = table_xml(TABLE_COLUMNS, [
+        (str(n), _due_date(due), _amount(rent), _amount(total)) for n, (due, rent, total) in enumerate(rows, 1)
+    ])
+    return (
+        '<w:sdt><w:sdtPr><w:alias w:val="Payment Schedule"/><w:tag w:val="payment_schedule"/></w:sdtPr>'
+        '<w:sdtContent><w:p><w:pPr><w:pageBreakBefore/><w:jc w:val="center"/></w:pPr>'
+        f'{run_xml("PAYMENT SCHEDULE", bold=True, underline=True)}</w:p>'
+        f"<w:p>{run_xml(terms)}</w:p>{table}<w:p/></w:sdtContent></w:sdt>"
+    )
@@ -0,0 +1,318 @@
+"""DOCX to PDF conversion on a pool of warm headless LibreOffice workers.
+
+Each worker thread owns one ``soffice`` process with its own user profile.
+When the ``uno`` bridge that ships with LibreOffice is importable, the process
+is started once with ``--accept`` and documents are converted over the UNO
+connection, so a conversion does not pay for process start-up, and the
+process is recycled after recycle_after conversions.
+
+Without ``uno`` there is no warm process: every job is a cold
+``soffice --convert-to pdf`` run, which only reuses the worker's profile and
+so skips the first-run profile setup, and recycle_after does not apply. Install
+LibreOffice's Python bridge (python3-uno) for the warm pool. A pool created
+without it logs a warning, once per process, and reports "mode": "cold" in
+stats().
+
+In both modes a job that runs past its timeout has its LibreOffice process
+group killed, and submit() refuses new work once the bounded queue is full.
+stats() reports the latency of a job from submit() to its result and the
+conversion time alone, without the wait in the queue.
+"""
+import logging
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+try:
+    import uno
+    from com.sun.star.beans import PropertyValue
+except ImportError:
+    uno = None
+
+
+WARM = "warm"
+COLD = "cold"
+
+_cold_warned = False
+_cold_warned_lock = threading.Lock()
+
+
+def conversion_mode():
+    """Return WARM when conversions can reuse a running LibreOffice (uno is importable), else COLD"""
+    return WARM if uno is not None else COLD
+
+
+class PdfConversionError(RuntimeError):
+    """A document could not be converted to PDF"""
+
+
+class ConversionQueueFull(PdfConversionError):
+    """The conversion queue is at capacity"""
+
+
+def find_soffice():
+    """Return the path of the LibreOffice executable, or None"""
+    return shutil.which("soffice") or shutil.which("libreoffice")
+
+
+def _file_url(path):
+    return "file://" + os.path.abspath(path).replace(os.sep, "/")
+
+
+def _uno_property(name, value):
+    prop = PropertyValue()
+    prop.Name = name
+    prop.Value = value
+    return prop
+
+
+class SofficeWorker:
+    """One LibreOffice process with its own profile, reused across jobs"""
+
+    def __init__(self, soffice, workdir, index):
+        self.soffice = soffice
+        self.workdir = workdir
+        self.index = index
+        self.profile = os.path.join(workdir, f"profile-{index}")
+        self.process = None
+        self.desktop = None
+        self.conversions = 0
+        self.generation = 0
+
+    def start(self):
+        """Start the warm LibreOffice process; without uno there is none to start"""
+        self.conversions = 0
+        if uno is None:
+            return
+        self.generation += 1
+        pipe = f"rent_agreement_{os.getpid()}_{self.index}_{self.generation}"
+        # A session of its own, so stop() also kills the soffice.bin it starts
+        self.process = subprocess.Popen(
+            [
+                self.soffice, "--headless", "--invisible", "--nologo", "--norestore",
+                "--nodefault", "--nolockcheck", f"-env:UserInstallation={_file_url(self.profile)}",
+                f"--accept=pipe,name={pipe};urp;StarOffice.ComponentContext",
+            ],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+        )
+        local = uno.getComponentContext()
+        resolver = local.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local)
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                context = resolver.resolve(f"uno:pipe,name={pipe};urp;StarOffice.ComponentContext")
+                break
+            except Exception:
+                if time.monotonic() > deadline or self.process.poll() is not None:
+                    self.stop()
+                    raise PdfConversionError("LibreOffice did not start")
+                time.sleep(0.1)
+        self.desktop = context.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", context)
+
+    def stop(self):
+        self.desktop = None
+        process = self.process
+        if process is not None:
+            if process.poll() is None:
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except (AttributeError, ProcessLookupError):
+                    process.kill()
+            process.wait()
+            self.process = None
+
+    def convert(self, docx_path, pdf_path, timeout):
+        """Convert docx_path to pdf_path, killing the process after timeout seconds"""
+        self.conversions += 1
+        if uno is None:
+            # A cold start per document, reusing only the profile
+            self.process = subprocess.Popen(
+                [
+                    self.soffice, "--headless", "--norestore", "--nolockcheck",
+                    f"-env:UserInstallation={_file_url(self.profile)}",
+                    "--convert-to", "pdf", "--outdir", os.path.dirname(pdf_path), docx_path,
+                ],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+            )
+            try:
+                returncode = self.process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                raise PdfConversionError(f"Conversion timed out after {timeout}s")
+            finally:
+                self.stop()
+            if returncode:
+                raise PdfConversionError(f"soffice exited with status {returncode}")
+            return
+
+        if self.process is None:
+            self.start()
+        timed_out = threading.Event()
+
+        def expire():
+            timed_out.set()
+            self.stop()
+
+        watchdog = threading.Timer(timeout, expire)
+        watchdog.start()
+        try:
+            doc = self.desktop.loadComponentFromURL(
+                _file_url(docx_path), "_blank", 0, (_uno_property("Hidden", True),)
+            )
+            try:
+                doc.storeToURL(_file_url(pdf_path), (_uno_property("FilterName", "writer_pdf_Export"),))
+            finally:
+                doc.close(True)
+        except Exception as e:
+            watchdog.cancel()
+            # Until the watchdog has stopped the process, if it fired
+            watchdog.join()
+            if timed_out.is_set():
+                raise PdfConversionError(f"Conversion timed out after {timeout}s")
+            self.stop()
+            raise PdfConversionError(f"LibreOffice failed: {e}")
+        finally:
+            watchdog.cancel()
+
+
+class PdfConverterPool:
+    """A bounded queue of conversion jobs served by LibreOffice workers, warm when uno is importable"""
+
+    def __init__(self, workers=2, max_queue=32, timeout=60, recycle_after=200, soffice=None):
+        global _cold_warned
+        self.soffice = soffice or find_soffice()
+        if self.soffice is None:
+            raise PdfConversionError("LibreOffice (soffice) is not installed")
+        self.mode = conversion_mode()
+        if self.mode == COLD:
+            with _cold_warned_lock:
+                if not _cold_warned:
+                    _cold_warned = True
+                    logging.getLogger("rent_agreement.pdf").warning(
+                        "LibreOffice's Python bridge (uno) is not importable: every PDF conversion starts "
+                        "soffice from cold. Install python3-uno for warm workers."
+                    )
+        self.timeout = timeout
+        self.recycle_after = recycle_after
+        self._jobs = queue.Queue(maxsize=max_queue)
+        self._latencies = deque(maxlen=1000)
+        self._conversion_times = deque(maxlen=1000)
+        self._failures = 0
+        self._stats_lock = threading.Lock()
+        self._workdir = tempfile.mkdtemp(prefix="rent_agreement_pdf_")
+        self._threads = []
+        for index in range(workers):
+            thread = threading.Thread(
+                target=self._serve, args=(SofficeWorker(self.soffice, self._workdir, index),),
+                name=f"soffice-worker-{index}", daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, docx_bytes, block=False):
+        """Queue a conversion and return a Future for the PDF bytes
+
+        Raises ConversionQueueFull when the queue is full, unless block is set,
+        in which case it waits for room.
+        """
+        future = Future()
+        try:
+            self._jobs.put((docx_bytes, future, time.perf_counter()), block=block)
+        except queue.Full:
+            raise ConversionQueueFull("Too many PDF conversions in progress, try again shortly")
+        return future
+
+    def convert(self, docx_bytes):
+        """Convert and wait for the PDF bytes"""
+        return self.submit(docx_bytes).result()
+
+    def stats(self):
+        """Return the worker mode, conversion count, failures and percentiles in ms
+
+        mode is WARM or COLD (see conversion_mode()). p50_ms, p90_ms and p99_ms are of the latency from submit() to the
+        result, waiting in the queue included; convert_p50_ms and so on are
+        of the conversion alone.
+        """
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            conversion_times = sorted(self._conversion_times)
+            failures = self._failures
+
+        def percentile(values, p):
+            if not values:
+                return 0.0
+            return values[min(len(values) - 1, int(p / 100 * len(values)))] * 1000
+
+        stats = {"mode": self.mode, "conversions": len(latencies), "failures": failures, "queued": self._jobs.qsize()}
+        for p in (50, 90, 99):
+            stats[f"p{p}_ms"] = percentile(latencies, p)
+            stats[f"convert_p{p}_ms"] = percentile(conversion_times, p)
+        return stats
+
+    def shutdown(self):
+        """Stop the workers once the queued jobs are done"""
+        for _ in self._threads:
+            self._jobs.put(None)
+        for thread in self._threads:
+            thread.join()
+        shutil.rmtree(self._workdir, ignore_errors=True)
+
+    def _serve(self, worker):
+        jobdir = os.path.join(self._workdir, f"jobs-{worker.index}")
+        os.makedirs(jobdir, exist_ok=True)
+        docx_path = os.path.join(jobdir, "agreement.docx")
+        pdf_path = os.path.join(jobdir, "agreement.pdf")
+        try:
+            try:
+                worker.start()
+            except PdfConversionError:
+                pass  # retried by the first conversion
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    return
+                docx_bytes, future, queued_at = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    if self.mode == WARM and worker.conversions >= self.recycle_after:
+                        worker.stop()
+                        worker.start()
+                    with open(docx_path, "wb") as f:
+                        f.write(docx_bytes)
+                    started = time.perf_counter()
+                    worker.convert(docx_path, pdf_path, self.timeout)
+                    converted = time.perf_counter() - started
+                    with open(pdf_path, "rb") as f:
+                        pdf = f.read()
+                    os.remove(pdf_path)
+                except Exception as e:
+                    with self._stats_lock:
+                        self._failures += 1
+                    future.set_exception(e if isinstance(e, PdfConversionError) else PdfConversionError(str(e)))
+                else:
+                    with self._stats_lock:
+                        self._latencies.append(time.perf_counter() - queued_at)
+                        self._conversion_times.append(converted)
+                    future.set_result(pdf)
+        finally:
+            worker.stop()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(**options):
+    """Return the process-wide converter pool, starting it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PdfConverterPool(**options)
+        return _pool
@@ -0,0 +1,196 @@
+"""Content-addressed on-disk cache of rendered agreements.
+
+Rendered .docx bytes are stored under a key hashed from the normalized field
+values, the template's content hash and the render engine's version, so the
+same agreement is rendered once no matter how often it is regenerated, by
+the app or by a batch run, and across restarts.
+
+Entries are written to a temporary file and renamed into place, so readers
+in other processes never see a partial document. Reading an entry bumps its
+mtime, and once the cache grows past its size cap the least recently used
+entries are deleted. Several processes can share one directory; a process
+that loses a race with another one's eviction just sees a miss. An entry
+that is not a complete zip package, say truncated by a full disk or a copy,
+is deleted and counts as a miss, so it is rendered again.
+"""
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import zipfile
+
+ENV_DIR = "RENT_AGREEMENT_CACHE_DIR"
+ENV_MAX_MB = "RENT_AGREEMENT_CACHE_MB"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+SUFFIX = ".docx"
+
+
+def cache_key(field_values, template_digest, engine_version):
+    """Return the hex key of an agreement rendered from these inputs"""
+    normalized = json.dumps(field_values, sort_keys=True, default=str, ensure_ascii=False)
+    digest = hashlib.sha256()
+    for part in (engine_version, template_digest, normalized):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class RenderCache:
+    """Rendered documents on local disk, capped at max_bytes with LRU eviction"""
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # Approximate total size; recomputed from the directory before evicting
+        self._size = None
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + SUFFIX)
+
+    def get(self, key):
+        """Return the cached bytes for key, or None"""
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            if not zipfile.is_zipfile(io.BytesIO(data)):
+                os.remove(path)
+                raise FileNotFoundError(path)
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """Store data under key"""
+        path = self.path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+        with self._lock:
+            self.writes += 1
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data)
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def get_or_render(self, key, render):
+        """Return the cached bytes for key, calling render() and caching its result on a miss"""
+        data = self.get(key)
+        if data is None:
+            data = render()
+            self.put(key, data)
+        return data
+
+    def evict(self):
+        """Delete least recently used entries until the cache is under 90% of its cap"""
+        entries = []
+        for entry_path, size, mtime in self._entries():
+            entries.append((mtime, size, entry_path))
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        evicted = 0
+        for _, size, entry_path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(entry_path)
+                evicted += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        with self._lock:
+            self.evictions += evicted
+            self._size = total
+
+    def clear(self):
+        """Delete every entry"""
+        for entry_path, _, _ in self._entries():
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._size = 0
+
+    def stats(self):
+        """Return the hit, miss, write and eviction counts of this process"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "bytes": self._size if self._size is not None else self._scan_size(),
+                "max_bytes": self.max_bytes,
+            }
+
+    def _entries(self):
+        try:
+            shards = os.scandir(self.directory)
+        except FileNotFoundError:
+            return
+        with shards:
+            for shard in shards:
+                if not shard.is_dir():
+                    continue
+                with os.scandir(shard.path) as files:
+                    for entry in files:
+                        if entry.name.endswith(SUFFIX):
+                            try:
+                                stat = entry.stat()
+                            except FileNotFoundError:
+                                continue
+                            yield entry.path, stat.st_size, stat.st_mtime_ns
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def from_env():
+    """Return the cache configured by RENT_AGREEMENT_CACHE_DIR, or None
+
+    RENT_AGREEMENT_CACHE_MB sets the size cap (default 512 MB).
+    """
+    directory = os.environ.get(ENV_DIR)
+    if not directory:
+        return None
+    max_mb = os.environ.get(ENV_MAX_MB)
+    max_bytes = int(float(max_mb) * 1024 * 1024) if max_mb else DEFAULT_MAX_BYTES
+    with _caches_lock:
+        cache = _caches.get((directory, max_bytes))
+        if cache is None:
+            cache = _caches[(directory, max_bytes)] = RenderCache(directory, max_bytes)
+        return cache
@@ -0,0 +1,231 @@
+"""Renewal agreements for a whole portfolio of leases.
+
+Clause 5 raises the rent by rent_increase_percentage once lease_period_months
+have passed. compute_renewals() applies that to every lease of a portfolio at
+once with NumPy: the new rent, the security deposit kept at the same multiple
+of the rent, a new term of lease_period_months calendar months starting the
+day after the current one ends, and the execution date and year of the
+renewal. The schedule can
+be written out as CSV for review with --dry-run, or the renewal agreements
+rendered through batch_generate.run_batch().
+
+Usage:
+    python renewals.py portfolio.csv --dry-run > renewals.csv
+    python renewals.py portfolio.csv --output renewals.zip --workers 8
+    python renewals.py portfolio.jsonl --output renewals/ --execution-date 2026-04-25 --round-to 100
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+
+import numpy as np
+
+import metrics
+from amount_words import rupees_in_words_batch
+from archive_writer import DEFAULT_LEVEL
+from batch_generate import RecordError, normalize_record, parse_date, read_records, run_batch
+from lease_record import LeaseRecord
+from payment_schedule import date_column, round_half_up
+from rent_agreement_generator import ENGINES
+from template_registry import TemplateRegistry
+
+# Record fields a renewal replaces
+RENEWED_FIELDS = ("rent_amount", "security_deposit", "lease_start", "lease_end", "execution_date")
+
+SCHEDULE_COLUMNS = (
+    "record", "tower_no", "apartment_unit_no", "lessee_name",
+    "rent_amount", "new_rent_amount", "new_rent_amount_words",
+    "security_deposit", "new_security_deposit", "new_security_deposit_words",
+    "lease_start", "lease_end", "execution_date", "execution_year",
+)
+
+
+def load_portfolio(rows):
+    """Normalize portfolio rows
+
+    Returns (rows, records, errors): the raw rows, the LeaseRecord of each
+    row or None where it is invalid, and (row number, message) per invalid
+    row. Slotted records keep a portfolio of tens of thousands of leases
+    small in memory.
+    """
+    rows = list(rows)
+    records = []
+    errors = []
+    for index, raw in enumerate(rows, 1):
+        try:
+            records.append(LeaseRecord.from_dict(normalize_record(raw)))
+        except RecordError as e:
+            records.append(None)
+            errors.append((index, str(e)))
+    return rows, records, errors
+
+
+def compute_renewals(records, execution_date=None, round_to=1):
+    """Return the renewal terms of LeaseRecords as a dict of NumPy arrays
+
+    The arrays are rent_amount and security_deposit (int64, rounded half up
+    to the nearest round_to rupees), lease_start, lease_end and
+    execution_date (datetime64[D]) and execution_year, one element per
+    record. The new term starts the day after the current one ends and ends
+    the day before the same day of the month lease_period_months calendar
+    months later (the last day of a shorter month); a record without
+    lease_period_months counts the length of its current term in months of
+    30 days. Every renewal is executed on its new lease start unless
+    execution_date is given.
+    """
+    count = len(records)
+    rent = np.fromiter((r.rent_amount for r in records), dtype=np.int64, count=count)
+    deposit = np.fromiter((r.security_deposit for r in records), dtype=np.int64, count=count)
+    increase = np.fromiter((r.rent_increase_percentage for r in records), dtype=np.int64, count=count)
+    start = date_column(records, "lease_start")
+    end = date_column(records, "lease_end")
+
+    new_rent = round_half_up(rent * (100 + increase), 100, round_to)
+    # The deposit stays the same multiple of the rent; without a rent it is kept
+    has_rent = rent > 0
+    new_deposit = np.where(
+        has_rent, round_half_up(deposit * new_rent, np.where(has_rent, rent, 1), round_to), deposit,
+    )
+
+    new_start = end + np.timedelta64(1, "D")
+    months = np.fromiter(
+        (-1 if r.lease_period_months is None else r.lease_period_months for r in records), dtype=np.int64, count=count
+    )
+    # Without a period, batch_generate.normalize_record() counts 30 days to the month
+    months = np.where(months >= 0, months, np.round((end - start).astype(np.int64) / 30).astype(np.int64))
+    new_end = add_months(new_start, months) - np.timedelta64(1, "D")
+    if execution_date is None:
+        new_execution = new_start
+    else:
+        new_execution = np.full(count, np.datetime64(execution_date, "D"))
+    return {
+        "rent_amount": new_rent,
+        "security_deposit": new_deposit,
+        "lease_start": new_start,
+        "lease_end": new_end,
+        "execution_date": new_execution,
+        "execution_year": new_execution.astype("datetime64[Y]").astype(np.int64) + 1970,
+    }
+
+
+def add_months(dates, months):
+    """Add months to datetime64[D] dates, keeping the day of the month
+
+    A day past the end of the resulting month becomes its last day, so
+    2024-01-31 plus one month is 2024-02-29.
+    """
+    first_day = dates.astype("datetime64[M]")
+    day = (dates - first_day.astype("datetime64[D]")).astype(np.int64)
+    month = first_day + np.asarray(months).astype("timedelta64[M]")
+    month_length = ((month + np.timedelta64(1, "M")).astype("datetime64[D]") - month.astype("datetime64[D]")).astype(np.int64)
+    return month.astype("datetime64[D]") + np.minimum(day, month_length - 1)
+
+
+def renewed_records(rows, records, renewals):
+    """Yield the renewal record of each row, or the raw row where it is invalid
+
+    Invalid rows are passed on so run_batch() reports them under the same
+    row number.
+    """
+    columns = [(name, renewals[name].tolist()) for name in RENEWED_FIELDS]
+    n = 0
+    for row, record in zip(rows, records):
+        if record is None:
+            yield row
+            continue
+        yield dict(record.to_dict(), **{name: values[n] for name, values in columns})
+        n += 1
+
+
+def write_schedule(file, records, renewals):
+    """Write the current and renewed terms of every valid record as CSV"""
+    valid = [(index, record) for index, record in enumerate(records, 1) if record is not None]
+    columns = {name: values.tolist() for name, values in renewals.items()}
+    rent_words = rupees_in_words_batch(renewals["rent_amount"])
+    deposit_words = rupees_in_words_batch(renewals["security_deposit"])
+
+    writer = csv.writer(file)
+    writer.writerow(SCHEDULE_COLUMNS)
+    for n, (index, record) in enumerate(valid):
+        writer.writerow((
+            index, record.tower_no or "", record.apartment_unit_no or "", record.lessee_name or "",
+            record.rent_amount, columns["rent_amount"][n], rent_words[n],
+            record.security_deposit, columns["security_deposit"][n], deposit_words[n],
+            columns["lease_start"][n], columns["lease_end"][n],
+            columns["execution_date"][n], columns["execution_year"][n],
+        ))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute and generate renewal agreements for a portfolio")
+    parser.add_argument("input", help="CSV or JSONL file with one current lease per row")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only write the renewal schedule, without rendering agreements")
+    parser.add_argument("--schedule", metavar="CSV",
+                        help="write the schedule here (default: stdout with --dry-run, none otherwise)")
+    parser.add_argument("--execution-date", type=parse_date,
+                        help="execution date of every renewal (default: its new lease start)")
+    parser.add_argument("--round-to", type=int, default=1,
+                        help="round the new rent and deposit to the nearest multiple of this many rupees")
+    parser.add_argument("--output", "-o", help="output directory or a path ending in .zip")
+    parser.add_argument("--template", default="agreement_template.docx",
+                        help="template to fill; the draft format is used when it does not exist")
+    parser.add_argument("--templates", metavar="DIR", help="directory of per-society templates")
+    parser.add_argument("--engine", choices=ENGINES, default="python-docx")
+    parser.add_argument("--compression", type=int, choices=range(10), default=DEFAULT_LEVEL, metavar="0-9",
+                        help="zip compression: 0 stores documents as they are, 1-9 are deflate levels")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+    if not args.dry_run and not args.output:
+        parser.error("--output is required unless --dry-run is given")
+    if args.round_to < 1:
+        parser.error("--round-to must be at least 1")
+
+    start = time.perf_counter()
+    rows, records, errors = load_portfolio(read_records(args.input))
+    loaded = time.perf_counter()
+    renewals = compute_renewals([record for record in records if record is not None],
+                                args.execution_date, args.round_to)
+    computed = time.perf_counter()
+    print(f"{len(records) - len(errors)} renewals computed in {(computed - loaded) * 1000:.1f} ms "
+          f"(portfolio read in {loaded - start:.2f}s)", file=sys.stderr)
+
+    if args.schedule or args.dry_run:
+        if args.schedule:
+            with open(args.schedule, "w", newline="", encoding="utf-8") as f:
+                write_schedule(f, records, renewals)
+        else:
+            write_schedule(sys.stdout, records, renewals)
+
+    if args.dry_run:
+        for index, error in errors:
+            print(f"record {index}: {error}", file=sys.stderr)
+        return 1 if errors else 0
+
+    try:
+        metrics.configure_from_env()
+    except ValueError as e:
+        parser.error(str(e))
+    template_path = args.template if os.path.exists(args.template) else None
+    registry = None
+    if args.templates:
+        registry = TemplateRegistry(args.templates)
+        registry.preload()
+
+    try:
+        summary = run_batch(renewed_records(rows, records, renewals), args.output, template_path,
+                            workers=args.workers, engine=args.engine, registry=registry,
+                            compression=args.compression)
+    finally:
+        metrics.flush()
+    for index, error in summary["errors"]:
+        print(f"record {index}: {error}", file=sys.stderr)
+    print(f"{summary['written']} renewal agreements written, {summary['failed']} failed in "
+          f"{summary['seconds']:.2f}s ({summary['docs_per_second']:.1f} docs/second)")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,61 +2,635 @@ import streamlit as st
 import docx
 import re
 import io
+import sqlite3
 from datetime import datetime, timedelta
 import os
-import inflect
+import hashlib
+import json
+import threading
+import time
+import uuid
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls, qn
+from docx.text.paragraph import Paragraph
+from lxml import etree
 
-# Initialize inflect engine for converting numbers to words
-p = inflect.engine()
-
-def format_date_with_suffix(date):
-    """Format date with suffix (1st, 2nd, 3rd, etc.)"""
-    day = date.day
-    suffix = 'th' if 11 <= day <= 13 else {1: 'st', 2: 'nd', 3: 'rd'}.get(day % 10, 'th')
-    return f"{day}{suffix} {date.strftime('%B %Y')}"
+import agreement_index
+import compact_docx
+import jobs
+import metrics
+import render_cache
+import template_cache
+import template_registry
+from amount_words import rupees_in_words
+from annexure import ANNEXURE_FIELDS, PHOTO_WIDTH_INCHES, annexure_table_xml, has_photos
+from clauses import clause_fields, compile_clause, render_clause, with_derived
+from lease_record import FIELD_DERIVATIONS, LeaseRecord, build_field_values, format_date_with_suffix, validate_record
+from ooxml_renderer import StreamingDocxRenderer, xml_text
+from payment_schedule import ESCALATION_MONTHS, schedule_annexure_xml
+from pdf_conversion import WARM as PDF_WARM, PdfConversionError, conversion_mode, find_soffice, get_pool
 
 def number_to_words_rupees(number):
     """Convert number to words with 'Rupees' prefix and 'only' suffix"""
-    if number == 0:
-        return "Rupees Zero only"
+    return rupees_in_words(number)
+
+def affected_fields(record_fields):
+    """Return the template fields, including clause-derived ones, that depend on record_fields"""
+    fields = set()
+    for name in record_fields:
+        fields.update(FIELD_DERIVATIONS.get(name, (name,)))
+    return with_derived(fields)
+
+# Directory of per-society templates (see template_registry) and the single
+# template used when it does not exist or has no match for a lease
+TEMPLATE_DIR = os.environ.get("RENT_AGREEMENT_TEMPLATES", "templates")
+DEFAULT_TEMPLATE = "agreement_template.docx"
+
+def get_template_registry():
+    """Return the registry of TEMPLATE_DIR, preloading it in the background, or None"""
+    if not os.path.isdir(TEMPLATE_DIR):
+        return None
+    return template_registry.get_registry(TEMPLATE_DIR, background=True)
+
+def select_template(field_values):
+    """Return the template for a lease: its society's and property type's, else DEFAULT_TEMPLATE"""
+    registry = get_template_registry()
+    if registry is not None:
+        template_path = registry.select(field_values.get("property_name"), field_values.get("property_type"))
+        if template_path:
+            return template_path
+    return DEFAULT_TEMPLATE
+
+# Render engines accepted by render_agreement_bytes
+ENGINES = ("python-docx", "ooxml")
+
+# Bump when a change alters the rendered documents, so agreements cached on
+# disk by an older version are not served again
+RENDER_VERSION = 5
+
+# compact_docx.compact() options of the "Compact output" mode: pictures are
+# downsampled to the resolution they print at, when Pillow is installed
+COMPACT_OPTIONS = {"image_dpi": 150} if compact_docx.downsampling_available() else {}
+
+def engine_version(engine, compact=None):
+    """Return the engine name and render version, part of the render cache key
+
+    compact is the compact_docx.compact() options of compacted output, or
+    None for documents as rendered.
+    """
+    version = f"{engine}/{RENDER_VERSION}/python-docx {docx.__version__}"
+    if compact is not None:
+        version += f" + {compact_docx.version(**compact)}"
+    return version
+
+@metrics.timed("render")
+def render_agreement_bytes(template_path, field_values, engine="python-docx", previous_renders=None):
+    """Render the agreement and return the saved .docx bytes
+
+    The "ooxml" engine streams the draft format straight to OOXML without
+    building a python-docx document; templates always use python-docx.
+    With previous_renders, a dict kept per session, the python-docx engine
+    patches that session's previous render of the same template, re-rendering
+    only the paragraphs whose fields changed.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}")
+    if engine == "ooxml" and not os.path.exists(template_path):
+        return render_draft_bytes(field_values)
+    if previous_renders is not None:
+        return _render_incremental_bytes(template_path, field_values, previous_renders)
+    
+    doc = generate_agreement(template_path, field_values)
+    buffer = io.BytesIO()
+    with metrics.stage("save"):
+        doc.save(buffer)
+    return buffer.getvalue()
+
+def _render_incremental_bytes(template_path, field_values, previous_renders):
+    """Patch and save the previous render in previous_renders
+
+    previous_renders maps a template's path, or None for the draft format, to
+    its last render. The render is taken out of the dict while it is patched,
+    so a second job of the same session renders from scratch instead of
+    patching the same document at the same time.
+    """
+    try:
+        template = template_cache.load_template(template_path)
+    except Exception:
+        template = None
+    key = template.path if template is not None else None
+    
+    previous = previous_renders.pop(key, None)
+    if previous is None or getattr(previous, "template", None) is not template:
+        if template is not None:
+            previous = template_cache.RenderedTemplate(template, field_values)
+        else:
+            previous = RenderedDraft(field_values)
+    else:
+        previous.update(field_values)
+    buffer = io.BytesIO()
+    with metrics.stage("save"):
+        previous.document.save(buffer)
+    previous_renders[key] = previous
+    return buffer.getvalue()
+
+def field_values_key(field_values):
+    """Return a stable hash of field_values, used as a cache key"""
+    normalized = json.dumps(field_values, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+def template_digest(template_path):
+    """Return the content hash of the template, or "draft" when it is missing"""
+    try:
+        return template_cache.load_template(template_path).digest
+    except Exception:
+        return "draft"
+
+def agreement_bytes(template_path, digest, field_values, engine="python-docx", previous_renders=None):
+    """Render the agreement, through the disk render cache when RENT_AGREEMENT_CACHE_DIR is set
+
+    digest is template_digest(template_path). previous_renders is the
+    session's previous renders, patched on a cache miss (see
+    render_agreement_bytes). Runs in job threads, so it must not call
+    Streamlit; cached renders survive restarts and are shared with batch runs.
+    """
+    def render():
+        # Agents tweak one field at a time, so patch the previous render
+        return render_agreement_bytes(template_path, field_values, engine, previous_renders)
     
-    words = p.number_to_words(number)
-    words = words.replace(',', '')
-    words = words.replace('-', ' ')
-    words = ' '.join(word.capitalize() for word in words.split())
-    return f"Rupees {words} only"
+    disk_cache = render_cache.from_env()
+    if disk_cache is None:
+        return render()
+    key = render_cache.cache_key(field_values, digest, engine_version(engine))
+    return disk_cache.get_or_render(key, render)
+
+# Generation runs as background jobs (see jobs.py) so reruns do not block on
+# or discard it; a session may have MAX_JOBS_PER_SESSION queued or running
+JOB_WORKERS = int(os.environ.get("RENT_AGREEMENT_JOB_WORKERS", "4"))
+MAX_JOBS_PER_SESSION = 2
+JOB_POLL_SECONDS = 0.5
+
+def get_job_queue():
+    """Return the process-wide generation job queue"""
+    return jobs.get_queue(workers=JOB_WORKERS, max_per_owner=MAX_JOBS_PER_SESSION)
+
+def index_agreement(record, template_path, digest, field_values, engine, data, compact=None):
+    """Record a generated agreement in the agreement index; return its id, or None without an index"""
+    index = agreement_index.from_env()
+    if index is None:
+        return None
+    version = engine_version(engine, compact)
+    return index.add(
+        render_cache.cache_key(field_values, digest, version), record, data,
+        template_path if digest != "draft" else None, digest, version,
+    )
+
+def generation_job(template_path, field_values, engine, produce_pdf, record=None, compact=None,
+                   previous_renders=None):
+    """Return the job function rendering the agreement, and converting it to PDF if produce_pdf
+
+    previous_renders is the submitting session's previous renders, patched
+    instead of rendering from scratch (see render_agreement_bytes). With
+    compact, compact_docx.compact() options, the .docx is compacted after
+    rendering. The job's result is a dict of the .docx bytes, the warning to
+    show when the template is missing, the compaction report, the PDF bytes or the PDF conversion error, the
+    agreement's id in the agreement index (when record, the lease record's
+    inputs, is given) or the indexing error, and the generation time in ms.
+    """
+    def run(job):
+        started = time.perf_counter()
+        job.update(0.1, "Rendering agreement")
+        digest = template_digest(template_path)
+        data = agreement_bytes(template_path, digest, field_values, engine, previous_renders)
+        # Shown by the page, the job has no Streamlit script context
+        warning = None
+        if digest == "draft":
+            warning = "Template file not found. Creating a new document based on the draft format."
+        compaction = None
+        if compact is not None:
+            job.update(0.3, "Compacting agreement")
+            data, compaction = compact_docx.compact(data, **compact)
+        result = {
+            "docx": data, "warning": warning, "compaction": compaction, "pdf": None, "pdf_error": None,
+            "index_id": None, "index_error": None,
+        }
+        if record is not None:
+            try:
+                result["index_id"] = index_agreement(
+                    record, template_path, digest, field_values, engine, data, compact
+                )
+            except (sqlite3.Error, OSError) as e:
+                metrics.count("index_errors")
+                result["index_error"] = str(e)
+        if produce_pdf:
+            job.update(0.5, "Converting to PDF")
+            try:
+                result["pdf"] = job.wait(get_pool().submit(data))
+            except PdfConversionError as e:
+                result["pdf_error"] = str(e)
+        result["generation_ms"] = (time.perf_counter() - started) * 1000
+        metrics.flush()
+        return result
+    return run
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def show_job_progress(job_id):
+    """Poll a running job, rerunning the whole page once it has finished"""
+    job = get_job_queue().get(job_id)
+    if job is None or not job.active:
+        st.rerun()
+    st.progress(job.progress, text=job.message)
+    if st.button("Cancel", key=f"cancel_{job.id}"):
+        job.cancel()
+        st.rerun()
 
 def generate_agreement(template_path, field_values):
     """Generate agreement by replacing placeholders with values"""
     try:
-        doc = docx.Document(template_path)
+        template = template_cache.load_template(template_path)
     except Exception as e:
         # If template doesn't exist, create a new document based on the draft.txt
-        st.warning(f"Template file not found. Creating a new document based on the draft format.")
         doc = create_document_from_draft(field_values)
         return doc
     
-    # Replace in paragraphs
-    for para in doc.paragraphs:
-        for field_name, value in field_values.items():
-            placeholder = f"[[{field_name}]]"
-            if placeholder in para.text:
-                para.text = para.text.replace(placeholder, str(value))
-    
-    # Replace in tables
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for paragraph in cell.paragraphs:
-                    for field_name, value in field_values.items():
-                        placeholder = f"[[{field_name}]]"
-                        if placeholder in paragraph.text:
-                            paragraph.text = paragraph.text.replace(placeholder, str(value))
+    # Only the paragraphs and table cells indexed as holding placeholders are touched
+    return template.render(field_values)
+
+# Clauses of the draft format; **...** marks the spans printed in bold (see clauses.py)
+DRAFT_CLAUSES = [
+    # Rent amount
+    "That the rent for the demised property and fittings provided therein payable by the tenant of the owner shall be **[[rent_amount_numeric]]** ( [[rent_amount_words]] excluding maintenance) which shall be directly payable by tenant & will be applicable from 01-May-**[[execution_year]]**.",
+
+    # Security deposit
+    "The tenant shall deposit **[[security_deposit_numeric]]** ([[security_deposit_words]]) through cheque/online as a security deposit to the owner, free of interest. This deposit shall be refunded to the tenant upon the expiry of the lease, after deducting any arrears on rent, electricity, water dues, any damage, and cleaning costs of the flat, if any. This clause will apply after the flat is vacant and will not be adjustable against the rental.",
+
+    # Lease period
+    "That the lease is for a period of **[[lease_period_months]]** months w.e.f. 1st May **[[execution_year]]** to 31st March **[[next_year]]**.",
+
+    # Payment due day
+    "The monthly rent shall be payable **on or before [[payment_due_day]]th** of each English Calendar month by Online transfer directly to owners account.",
+
+    # Rent increase
+    "That after the expiry of **[[lease_period_months]]** months period the rent shall be **increased by [[rent_increase_percentage]]%** if the tenancy shall be continued and tenant to deposit rent by [[rent_increase_percentage]]% increase after [[lease_period_months]]th month.",
+
+    # Electricity charges
+    "That the electricity charges, Gas(IGL) and water charges and other society charges shall be paid by the lessee directly to the Estate Office or concerned authority as per the meter installed therein. That the monthly Society maintenance charges shall be paid by the lessee directly to the Estate office or concerned authority before the due date as per monthly invoice.",
+
+    # Subletting
+    "That the Lessee or his occupants shall not sub-let, assign or part with possession of the said premises in question or any portion thereof in any manner whatsoever.",
+
+    # Inspection
+    "That the Lessee shall permit the Lessor or its agents/authorized person to enter the deemed premises to inspect, click photos of flat premises and view the state and condition thereof at reasonable times during the tenancy period, but with an advance notice.",
+
+    # Structural changes
+    "That the lessee shall not carry out any permanent or temporary structural additions or alterations to the building layout.",
+
+    # Repairs
+    "That the lessor shall effect all major repairs such as major leakage in water pipes or major structural cracks etc. at his / her own cost immediately upon such defects being notified to him / her by the lessee and all minor repairs will be borne by the lessee",
+
+    # Security deposit refund
+    "The interest free deposit shall be refundable on termination of lease subject to handing over of vacant physical possession and all fixtures & fittings in working conditions, by the lessor after adjustment of Water, Electricity Charges, Gas, cleaning Etc. if outstanding in any case.",
+
+    # Notice period
+    "That the Lessor / Lessee shall be at liberty to revoke the present lease at any time by serving **[[notice_period_months]]** month notice in writing or by paying One month rent in lieu thereof.",
+
+    # Combustible goods
+    "That the lessee shall not store in the demised premises or any part thereof any such goods of combustible or explosive nature, provided that nothing contained in this sub-clause shall apply to the storage of kerosene, lanterns etc. kept for day-to-day use.",
+
+    # Expiry terms
+    "On the expiry of the terms of this license, the Licensee shall remove itself, its servants and goods from the said FLAT without demur and without raising any objection of any sort or kind whatsoever and shall not claim any tenancy rights in the said FLAT.",
+
+    # Rules compliance
+    "That the Lessee shall comply with all the rules & regulations of the local authorities and Society, whatsoever with relation to the use and occupation of the said premises.",
+
+    # Residential use
+    "That the Tenant shall use the said premises only for residential purposes of self and dependent family and not for any other purposes.",
+
+    # No subletting
+    "That the tenant/second party shall not sub-let the said premises of any portion thereof to any persons or persons under any circumstances",
+
+    # Antisocial activities
+    "The Lessee shall not carry out any acts or activities which are obnoxious, antisocial, illegal or prejudicial to the norms of decency or etiquette or society by laws which cause a nuisance to the other members of the society in the building.",
+
+    # Early termination
+    "If Lessee terminate the lease before 6 month of start date, the security amount will not be refundable.",
+
+    # Possession return
+    "The Lessee agrees to deliver vacant and peaceful possession of the said FLAT on the expiry of this agreement in good and clean condition as it was when the lessee obtained possession unless extended for a further period of 11 month by mutual consent.",
+
+    # Property sale
+    "In the event that the Owner decides to sell the property, the Tenant agrees to accommodate reasonable requests for property viewings and inspections by potential buyers, provided that the Tenant is given at least 24 hours' notice",
+
+    # Police verification
+    "That in accordance with the requirement of law, the lessee shall get police verification done and produce document/s for satisfaction of the said authority.",
+
+    # Property type
+    "That the Lessor is providing furnished flat consisting of **[[property_type]]**.",
+
+    # Car parks
+    "Lessor is providing **[[car_parks]]** car park in the society premises for exclusive use of the tenant **[[lessee_name]]** & his family and not to sublease the parking further.",
+]
+
+# Clauses parsed once into plain and bold segments
+DRAFT_CLAUSE_SEGMENTS = [compile_clause(text) for text in DRAFT_CLAUSES]
+
+def _run(text, bold=False, underline=False, superscript=False):
+    """A run of draft text: (text, bold, underline, superscript)"""
+    return (text, bold, underline, superscript)
+
+def _add_runs(para, runs):
+    """Add runs made with _run to a python-docx paragraph"""
+    metrics.count("runs_created", len(runs))
+    for text, bold, underline, superscript in runs:
+        # Dropped as run_xml drops them, so both engines write the same text
+        run = para.add_run(xml_text(text))
+        if bold:
+            run.bold = True
+        if underline:
+            run.underline = True
+        if superscript:
+            run.font.superscript = True
+
+def _execution_date_runs(field_values):
+    """Runs of the "executed on" line, with the day suffix as superscript"""
+    runs = []
+    # Add superscript for date suffix (th, st, nd, rd)
+    date_text = field_values.get('execution_date', '')
+    if date_text:
+        day_num = int(''.join(filter(str.isdigit, date_text.split()[0])))
+        day_suffix = 'th'
+        if day_num % 10 == 1 and day_num != 11:
+            day_suffix = 'st'
+        elif day_num % 10 == 2 and day_num != 12:
+            day_suffix = 'nd'
+        elif day_num % 10 == 3 and day_num != 13:
+            day_suffix = 'rd'
+        
+        runs.append(_run(f"This Lease Deed is executed on this {day_num}"))
+        runs.append(_run(day_suffix, superscript=True))
+        runs.append(_run(f" day of {field_values.get('execution_month', '')} '{field_values.get('execution_year', '')}"))
+    return runs
+
+def _lessor_runs(field_values):
+    """Runs of the lessor's name and address followed by the lessor boilerplate"""
+    return [
+        _run(f"MR {field_values.get('lessor_name', '')} S/O {field_values.get('lessor_father_name', '')} {field_values.get('lessor_address', '')}", bold=True, underline=True),
+        _run(" (hereinafter called the Lessor(s)/ Owner(s) which expression unless repugnant to the subject or context thereof shall include his heirs, successors, executors, administrators, legal representatives etc."),
+    ]
+
+def _lessee_runs(field_values):
+    """Runs of the lessee's name and address followed by the lessee boilerplate"""
+    return [
+        _run(f"MR.{field_values.get('lessee_name', '')} S/o {field_values.get('lessee_father_name', '')} R/O {field_values.get('lessee_address', '')}", bold=True, underline=True),
+        _run(" (Hereinafter called the Lessee/ Tenant, which expression unless repugnant to the subject or context thereof shall include its successors, executors, administrators, legal representatives etc.)"),
+    ]
+
+def _whereas_runs(field_values):
+    """Runs of the WHEREAS paragraph describing the premises"""
+    return [
+        _run("WHEREAS, ", bold=True),
+        _run("the Lessor(s) is the sole and absolute owner and is in actual, physical peaceful possession of the premises at "),
+        _run(f"APARTMENT/ UNIT No. {field_values.get('apartment_unit_no', '')}", bold=True),
+        _run(" in "),
+        _run(f"TOWER NO- {field_values.get('tower_no', '')}", bold=True),
+        _run(", located at "),
+        _run(f"{field_values.get('property_name', '')}", bold=True),
+        _run(", Sector-"),
+        _run(f"{field_values.get('property_sector', '')}", bold=True),
+        _run(f", {field_values.get('property_location', '')}"),
+        _run(" hereinafter referred to as the \"Said Premises\")."),
+    ]
+
+def _clause_runs(field_values, i, segments):
+    """Runs of clause number i, from its compiled segments"""
+    runs = [_run(f"{i}.", bold=True), _run(" ")]
+    runs.extend(_run(text, bold=bold) for text, bold in render_clause(segments, field_values))
+    return runs
+
+@metrics.timed("annexure_table")
+def _annexure_table_xml(field_values, part=None):
+    """Return the annexure's furniture & fixtures table as w:tbl XML
+
+    Photos of inventory items are added to part, the main document part;
+    without one they are left out.
+    """
+    return annexure_table_xml(field_values, _photo_run(part) if part is not None else None)
+
+def _photo_run(part):
+    """Return a photo_run for annexure_table_xml that adds the images to part"""
+    def photo_run(photo):
+        if isinstance(photo, bytes):
+            photo = io.BytesIO(photo)
+        inline = part.new_pic_inline(photo, docx.shared.Inches(PHOTO_WIDTH_INCHES), None)
+        return f"<w:r><w:drawing>{etree.tostring(inline, encoding='unicode')}</w:drawing></w:r>"
+    return photo_run
+
+@metrics.timed("payment_schedule")
+def _payment_schedule_xml(field_values, part=None):
+    """Return the payment schedule annexure, or "" without one"""
+    return schedule_annexure_xml(field_values)
+
+def _parse_block(xml):
+    """Parse the XML of a body-level element such as a table
+
+    The namespace is declared on the element itself rather than on a
+    wrapper, so moving it into a document needs no per-node namespace fixup.
+    """
+    return parse_xml(re.sub(r"^<([\w:]+)", rf"<\1 {nsdecls('w')}", xml, count=1))
+
+# Paragraphs of the draft that depend on field_values, in document order.
+# Each entry is the function that returns the paragraph's runs and its extra
+# arguments.
+DRAFT_SLOTS = [
+    (_execution_date_runs, ()),
+    (_lessor_runs, ()),
+    (_lessee_runs, ()),
+    (_whereas_runs, ()),
+] + [
+    (_clause_runs, (i, segments))
+    for i, segments in enumerate(DRAFT_CLAUSE_SEGMENTS, 1)
+    if clause_fields(segments)
+] + [
+    (_annexure_table_xml, ()),
+    (_payment_schedule_xml, ()),
+]
+
+# Slots whose placeholder paragraph is replaced by a whole block, the XML
+# returned by their function, instead of being filled with runs. Only the
+# last slot may return "" and leave nothing, so no other slot's index moves.
+DRAFT_BLOCK_SLOTS = {len(DRAFT_SLOTS) - 2, len(DRAFT_SLOTS) - 1}
+
+# Fields read by each entry of DRAFT_SLOTS, for incremental re-renders
+DRAFT_SLOT_FIELDS = [
+    {"execution_date", "execution_month", "execution_year"},
+    {"lessor_name", "lessor_father_name", "lessor_address"},
+    {"lessee_name", "lessee_father_name", "lessee_address"},
+    {"apartment_unit_no", "tower_no", "property_name", "property_sector", "property_location"},
+] + [
+    clause_fields(segments)
+    for segments in DRAFT_CLAUSE_SEGMENTS
+    if clause_fields(segments)
+] + [
+    ANNEXURE_FIELDS,
+    {"payment_schedule"},
+]
+
+_draft_skeleton = None
+_draft_stream_renderer = None
+_draft_skeleton_lock = threading.Lock()
+
+def create_document_from_draft(field_values, use_skeleton=True):
+    """Create a document based on the draft.txt format
+
+    By default the static text is built once per process and each call only
+    fills in the paragraphs listed in DRAFT_SLOTS on a copy of it. Pass
+    use_skeleton=False to build the whole document from scratch.
+    """
+    if not use_skeleton:
+        return _build_draft_document(field_values)
     
+    skeleton, slot_indices = get_draft_skeleton()
+    with metrics.stage("clone"):
+        doc = template_cache.clone_document(skeleton)
+    with metrics.stage("draft_fill"):
+        for slot, index in enumerate(slot_indices):
+            _fill_draft_slot(doc, slot, index, field_values)
     return doc
 
-def create_document_from_draft(field_values):
-    """Create a document based on the draft.txt format"""
+def _fill_draft_slot(doc, slot, index, field_values):
+    """Fill DRAFT_SLOTS[slot], the body element at index, for field_values"""
+    make_content, args = DRAFT_SLOTS[slot]
+    body = doc.element.body
+    if slot in DRAFT_BLOCK_SLOTS:
+        xml = make_content(field_values, *args, part=doc.part)
+        # An empty last slot was removed, leaving the body's sectPr at its index
+        present = body[index].tag != qn("w:sectPr")
+        if xml and present:
+            body[index] = _parse_block(xml)
+        elif xml:
+            body.insert(index, _parse_block(xml))
+        elif present:
+            del body[index]
+        return
+    p = body[index]
+    for r in p.findall(qn("w:r")):
+        p.remove(r)
+    _add_runs(Paragraph(p, None), make_content(field_values, *args))
+
+def update_draft_document(doc, old_field_values, field_values):
+    """Re-fill, in place, the slots of a draft document whose fields changed
+
+    doc must have been made by create_document_from_draft(old_field_values).
+    Returns the number of slots re-filled.
+    """
+    changed = with_derived(template_cache.changed_fields(old_field_values, field_values))
+    _, slot_indices = get_draft_skeleton()
+    patched = 0
+    with metrics.stage("patch"):
+        for slot, (index, fields) in enumerate(zip(slot_indices, DRAFT_SLOT_FIELDS)):
+            if fields.isdisjoint(changed):
+                continue
+            _fill_draft_slot(doc, slot, index, field_values)
+            patched += 1
+    metrics.count("paragraphs_patched", patched)
+    return patched
+
+class RenderedDraft:
+    """A draft-format render that can be updated in place, like template_cache.RenderedTemplate"""
+
+    template = None
+
+    def __init__(self, field_values):
+        self.field_values = dict(field_values)
+        self.document = create_document_from_draft(field_values)
+
+    def update(self, field_values):
+        """Re-fill the slots affected by the changed fields; return how many"""
+        patched = update_draft_document(self.document, self.field_values, field_values)
+        self.field_values = dict(field_values)
+        return patched
+
+def get_draft_skeleton():
+    """Return the draft skeleton document and the body index of each slot"""
+    global _draft_skeleton
+    with _draft_skeleton_lock:
+        if _draft_skeleton is None:
+            _draft_skeleton = _index_draft_skeleton(_build_draft_document({}, skeleton=True))
+        return _draft_skeleton
+
+def render_draft_bytes(field_values):
+    """Render the draft format with the streaming OOXML engine
+
+    Agreements with photos in the annexure need image parts, so they are
+    rendered with python-docx instead.
+    """
+    if has_photos(field_values):
+        buffer = io.BytesIO()
+        create_document_from_draft(field_values).save(buffer)
+        return buffer.getvalue()
+    renderer = get_draft_stream_renderer()
+    with metrics.stage("draft_fill"):
+        slot_runs = [make_content(field_values, *args) for make_content, args in DRAFT_SLOTS]
+    metrics.count("runs_created", sum(
+        len(runs) for slot, runs in enumerate(slot_runs) if slot not in DRAFT_BLOCK_SLOTS
+    ))
+    with metrics.stage("save"):
+        return renderer.render(slot_runs)
+
+def get_draft_stream_renderer():
+    """Return the streaming renderer precompiled from the draft skeleton"""
+    global _draft_stream_renderer
+    if _draft_stream_renderer is None:
+        skeleton, slot_indices = get_draft_skeleton()
+        doc = template_cache.clone_document(skeleton)
+        body = doc.element.body
+        renderer = StreamingDocxRenderer.from_document(
+            doc, [body[i] for i in slot_indices], block_slots=DRAFT_BLOCK_SLOTS
+        )
+        with _draft_skeleton_lock:
+            if _draft_stream_renderer is None:
+                _draft_stream_renderer = renderer
+    return _draft_stream_renderer
+
+def save_draft_skeleton(path):
+    """Write the draft skeleton to a .docx snapshot for load_draft_skeleton"""
+    skeleton, _ = get_draft_skeleton()
+    skeleton.save(path)
+
+def load_draft_skeleton(path):
+    """Use a snapshot written by save_draft_skeleton instead of building one"""
+    global _draft_skeleton, _draft_stream_renderer
+    skeleton = _index_draft_skeleton(docx.Document(path))
+    with _draft_skeleton_lock:
+        _draft_skeleton = skeleton
+        _draft_stream_renderer = None
+
+def _index_draft_skeleton(doc):
+    # Slots are the only top-level paragraphs of the skeleton without runs,
+    # apart from the one add_section() uses to carry the first section's sectPr
+    body = doc.element.body
+    slot_indices = [
+        i for i, child in enumerate(body)
+        if child.tag == qn("w:p")
+        and child.find(qn("w:r")) is None
+        and child.find(qn("w:pPr") + "/" + qn("w:sectPr")) is None
+    ]
+    if len(slot_indices) != len(DRAFT_SLOTS):
+        raise ValueError(
+            f"Draft skeleton has {len(slot_indices)} empty paragraphs, expected {len(DRAFT_SLOTS)}"
+        )
+    return doc, slot_indices
+
+def _build_draft_document(field_values, skeleton=False):
+    """Build the draft-format document with python-docx
+
+    With skeleton=True the paragraphs that depend on field_values are left
+    without runs, so they can be filled in later (see DRAFT_SLOTS).
+    """
+    def _fill(para, make_runs, *args):
+        if not skeleton:
+            _add_runs(para, make_runs(field_values, *args))
+    
     doc = docx.Document()
     
     # Add title - centered and underlined
@@ -69,22 +643,7 @@ def create_document_from_draft(field_values):
     # Add execution date - centered
     exec_date_para = doc.add_paragraph()
     exec_date_para.alignment = docx.enum.text.WD_ALIGN_PARAGRAPH.CENTER
-    # Add superscript for date suffix (th, st, nd, rd)
-    date_text = field_values.get('execution_date', '')
-    if date_text:
-        day_num = int(''.join(filter(str.isdigit, date_text.split()[0])))
-        day_suffix = 'th'
-        if day_num % 10 == 1 and day_num != 11:
-            day_suffix = 'st'
-        elif day_num % 10 == 2 and day_num != 12:
-            day_suffix = 'nd'
-        elif day_num % 10 == 3 and day_num != 13:
-            day_suffix = 'rd'
-        
-        exec_date_para.add_run(f"This Lease Deed is executed on this {day_num}")
-        suffix_run = exec_date_para.add_run(day_suffix)
-        suffix_run.font.superscript = True
-        exec_date_para.add_run(f" day of {field_values.get('execution_month', '')} '{field_values.get('execution_year', '')}")
+    _fill(exec_date_para, _execution_date_runs)
     
     # Add BETWEEN section - centered
     between_para = doc.add_paragraph()
@@ -93,10 +652,7 @@ def create_document_from_draft(field_values):
     
     # Add lessor details - with underline for name
     lessor_para = doc.add_paragraph()
-    lessor_name_run = lessor_para.add_run(f"MR {field_values.get('lessor_name', '')} S/O {field_values.get('lessor_father_name', '')} {field_values.get('lessor_address', '')}")
-    lessor_name_run.underline = True
-    lessor_name_run.bold = True
-    lessor_para.add_run(" (hereinafter called the Lessor(s)/ Owner(s) which expression unless repugnant to the subject or context thereof shall include his heirs, successors, executors, administrators, legal representatives etc.")
+    _fill(lessor_para, _lessor_runs)
     
     # Add AND section - centered
     and_para = doc.add_paragraph()
@@ -105,28 +661,11 @@ def create_document_from_draft(field_values):
     
     # Add lessee details - with underline for name
     lessee_para = doc.add_paragraph()
-    lessee_name_run = lessee_para.add_run(f"MR.{field_values.get('lessee_name', '')} S/o {field_values.get('lessee_father_name', '')} R/O {field_values.get('lessee_address', '')}")
-    lessee_name_run.underline = True
-    lessee_name_run.bold = True
-    lessee_para.add_run(" (Hereinafter called the Lessee/ Tenant, which expression unless repugnant to the subject or context thereof shall include its successors, executors, administrators, legal representatives etc.)")
+    _fill(lessee_para, _lessee_runs)
     
     # Add WHEREAS section
     whereas_para = doc.add_paragraph()
-    whereas_para.add_run("WHEREAS, ").bold = True
-    whereas_para.add_run("the Lessor(s) is the sole and absolute owner and is in actual, physical peaceful possession of the premises at ")
-    apartment_run = whereas_para.add_run(f"APARTMENT/ UNIT No. {field_values.get('apartment_unit_no', '')}")
-    apartment_run.bold = True
-    whereas_para.add_run(" in ")
-    tower_run = whereas_para.add_run(f"TOWER NO- {field_values.get('tower_no', '')}")
-    tower_run.bold = True
-    whereas_para.add_run(", located at ")
-    property_run = whereas_para.add_run(f"{field_values.get('property_name', '')}")
-    property_run.bold = True
-    whereas_para.add_run(", Sector-")
-    sector_run = whereas_para.add_run(f"{field_values.get('property_sector', '')}")
-    sector_run.bold = True
-    whereas_para.add_run(f", {field_values.get('property_location', '')}")
-    whereas_para.add_run(" hereinafter referred to as the \"Said Premises\").")
+    _fill(whereas_para, _whereas_runs)
     
     # Add AND Whereas section
     and_whereas_para = doc.add_paragraph()
@@ -137,172 +676,16 @@ def create_document_from_draft(field_values):
     now_para = doc.add_paragraph()
     now_para.add_run("NOW THIS LEASE DEED WITNESSETH AS UNDER:").bold = True
     
-    # Format clauses with proper spacing and bold for important values
-    clauses = [
-        # Rent amount
-        {"text": "That the rent for the demised property and fittings provided therein payable by the tenant of the owner shall be Rs. [[rent_amount]]/- ( [[rent_amount_words]] excluding maintenance) which shall be directly payable by tenant & will be applicable from 01-May-[[execution_year]].", 
-         "bold_fields": ["rent_amount", "execution_year"]},
-        
-        # Security deposit
-        {"text": "The tenant shall deposit Rs. [[security_deposit]]/- ([[security_deposit_words]]) through cheque/online as a security deposit to the owner, free of interest. This deposit shall be refunded to the tenant upon the expiry of the lease, after deducting any arrears on rent, electricity, water dues, any damage, and cleaning costs of the flat, if any. This clause will apply after the flat is vacant and will not be adjustable against the rental.",
-         "bold_fields": ["security_deposit"]},
-        
-        # Lease period
-        {"text": "That the lease is for a period of [[lease_period_months]] months w.e.f. 1st May [[execution_year]] to 31st March [[next_year]].",
-         "bold_fields": ["lease_period_months", "execution_year", "next_year"]},
-        
-        # Payment due day
-        {"text": "The monthly rent shall be payable on or before [[payment_due_day]]th of each English Calendar month by Online transfer directly to owners account.",
-         "bold_fields": ["on or before [[payment_due_day]]th"]},
-        
-        # Rent increase
-        {"text": "That after the expiry of [[lease_period_months]] months period the rent shall be increased by [[rent_increase_percentage]]% if the tenancy shall be continued and tenant to deposit rent by [[rent_increase_percentage]]% increase after [[lease_period_months]]th month.",
-         "bold_fields": ["lease_period_months", "increased by [[rent_increase_percentage]]%"]},
-        
-        # Electricity charges
-        {"text": "That the electricity charges, Gas(IGL) and water charges and other society charges shall be paid by the lessee directly to the Estate Office or concerned authority as per the meter installed therein. That the monthly Society maintenance charges shall be paid by the lessee directly to the Estate office or concerned authority before the due date as per monthly invoice.",
-         "bold_fields": []},
-        
-        # Subletting
-        {"text": "That the Lessee or his occupants shall not sub-let, assign or part with possession of the said premises in question or any portion thereof in any manner whatsoever.",
-         "bold_fields": []},
-        
-        # Inspection
-        {"text": "That the Lessee shall permit the Lessor or its agents/authorized person to enter the deemed premises to inspect, click photos of flat premises and view the state and condition thereof at reasonable times during the tenancy period, but with an advance notice.",
-         "bold_fields": []},
-        
-        # Structural changes
-        {"text": "That the lessee shall not carry out any permanent or temporary structural additions or alterations to the building layout.",
-         "bold_fields": []},
-        
-        # Repairs
-        {"text": "That the lessor shall effect all major repairs such as major leakage in water pipes or major structural cracks etc. at his / her own cost immediately upon such defects being notified to him / her by the lessee and all minor repairs will be borne by the lessee",
-         "bold_fields": []},
-        
-        # Security deposit refund
-        {"text": "The interest free deposit shall be refundable on termination of lease subject to handing over of vacant physical possession and all fixtures & fittings in working conditions, by the lessor after adjustment of Water, Electricity Charges, Gas, cleaning Etc. if outstanding in any case.",
-         "bold_fields": []},
-        
-        # Notice period
-        {"text": "That the Lessor / Lessee shall be at liberty to revoke the present lease at any time by serving [[notice_period_months]] month notice in writing or by paying One month rent in lieu thereof.",
-         "bold_fields": ["notice_period_months"]},
-        
-        # Combustible goods
-        {"text": "That the lessee shall not store in the demised premises or any part thereof any such goods of combustible or explosive nature, provided that nothing contained in this sub-clause shall apply to the storage of kerosene, lanterns etc. kept for day-to-day use.",
-         "bold_fields": []},
-        
-        # Expiry terms
-        {"text": "On the expiry of the terms of this license, the Licensee shall remove itself, its servants and goods from the said FLAT without demur and without raising any objection of any sort or kind whatsoever and shall not claim any tenancy rights in the said FLAT.",
-         "bold_fields": []},
-        
-        # Rules compliance
-        {"text": "That the Lessee shall comply with all the rules & regulations of the local authorities and Society, whatsoever with relation to the use and occupation of the said premises.",
-         "bold_fields": []},
-        
-        # Residential use
-        {"text": "That the Tenant shall use the said premises only for residential purposes of self and dependent family and not for any other purposes.",
-         "bold_fields": []},
-        
-        # No subletting
-        {"text": "That the tenant/second party shall not sub-let the said premises of any portion thereof to any persons or persons under any circumstances",
-         "bold_fields": []},
-        
-        # Antisocial activities
-        {"text": "The Lessee shall not carry out any acts or activities which are obnoxious, antisocial, illegal or prejudicial to the norms of decency or etiquette or society by laws which cause a nuisance to the other members of the society in the building.",
-         "bold_fields": []},
-        
-        # Early termination
-        {"text": "If Lessee terminate the lease before 6 month of start date, the security amount will not be refundable.",
-         "bold_fields": []},
-        
-        # Possession return
-        {"text": "The Lessee agrees to deliver vacant and peaceful possession of the said FLAT on the expiry of this agreement in good and clean condition as it was when the lessee obtained possession unless extended for a further period of 11 month by mutual consent.",
-         "bold_fields": []},
-        
-        # Property sale
-        {"text": "In the event that the Owner decides to sell the property, the Tenant agrees to accommodate reasonable requests for property viewings and inspections by potential buyers, provided that the Tenant is given at least 24 hours' notice",
-         "bold_fields": []},
-        
-        # Police verification
-        {"text": "That in accordance with the requirement of law, the lessee shall get police verification done and produce document/s for satisfaction of the said authority.",
-         "bold_fields": []},
-        
-        # Property type
-        {"text": "That the Lessor is providing furnished flat consisting of [[property_type]].",
-         "bold_fields": ["property_type"]},
-        
-        # Car parks
-        {"text": "Lessor is providing [[car_parks]] car park in the society premises for exclusive use of the tenant [[lessee_name]] & his family and not to sublease the parking further.",
-         "bold_fields": ["car_parks", "lessee_name"]}
-    ]
-    
-    # Process each clause
-    for i, clause_data in enumerate(clauses, 1):
-        clause_para = doc.add_paragraph()
-        clause_para.paragraph_format.left_indent = docx.shared.Pt(12)
-        clause_para.paragraph_format.first_line_indent = docx.shared.Pt(-12)
-        
-        # Add number with less spacing
-        number_run = clause_para.add_run(f"{i}.")
-        number_run.bold = True
-        
-        # Add space after number
-        clause_para.add_run(" ")
-        
-        # Get the clause text and replace placeholders with values
-        text = clause_data["text"]
-        bold_fields = clause_data["bold_fields"]
-        
-        # Replace placeholders with actual values
-        for field_name, value in field_values.items():
-            placeholder = f"[[{field_name}]]"
-            if placeholder in text:
-                # Convert value to string to avoid type errors
-                text = text.replace(placeholder, str(value))
-        
-        # Special case for next year in clause 3
-        if i == 3:
-            next_year = int(str(field_values.get('execution_year', 2025))) + 1
-            text = text.replace("[[next_year]]", str(next_year))
-        
-        # Add the text with bold parts
-        if bold_fields:
-            # Split text into parts to bold specific sections
-            current_text = text
-            for bold_field in bold_fields:
-                # Handle special cases
-                if bold_field == "on or before [[payment_due_day]]th":
-                    bold_text = f"on or before {field_values.get('payment_due_day', '5')}th"
-                    parts = current_text.split(bold_text)
-                    if len(parts) > 1:
-                        clause_para.add_run(parts[0])
-                        bold_run = clause_para.add_run(bold_text)
-                        bold_run.bold = True
-                        current_text = parts[1]
-                elif bold_field == "increased by [[rent_increase_percentage]]%":
-                    bold_text = f"increased by {field_values.get('rent_increase_percentage', '10')}%"
-                    parts = current_text.split(bold_text)
-                    if len(parts) > 1:
-                        clause_para.add_run(parts[0])
-                        bold_run = clause_para.add_run(bold_text)
-                        bold_run.bold = True
-                        current_text = parts[1]
-                else:
-                    # Regular field replacement
-                    field_value = str(field_values.get(bold_field, ""))
-                    if field_value:
-                        parts = current_text.split(field_value)
-                        if len(parts) > 1:
-                            clause_para.add_run(parts[0])
-                            bold_run = clause_para.add_run(field_value)
-                            bold_run.bold = True
-                            current_text = "".join(parts[1:])
-            
-            # Add any remaining text
-            clause_para.add_run(current_text)
-        else:
-            # No bold parts, just add the text
-            clause_para.add_run(text)
+    # Add the clauses; only the ones with placeholders depend on field_values
+    with metrics.stage("clauses"):
+        for i, segments in enumerate(DRAFT_CLAUSE_SEGMENTS, 1):
+            clause_para = doc.add_paragraph()
+            clause_para.paragraph_format.left_indent = docx.shared.Pt(12)
+            clause_para.paragraph_format.first_line_indent = docx.shared.Pt(-12)
+            if clause_fields(segments):
+                _fill(clause_para, _clause_runs, i, segments)
+            else:
+                _add_runs(clause_para, _clause_runs(field_values, i, segments))
     
     # Add signature section
     doc.add_paragraph("\nIN WITNESS WHEREOF, the parties have placed their respective hands and signed this Lease Deed on this date     Day of________, in the presence of the following witnesses.\n\n\n")
@@ -333,49 +716,11 @@ def create_document_from_draft(field_values):
     fixtures_run.bold = True
     fixtures_run.underline = True
     
-    # Create table for furniture and fixtures
-    table = doc.add_table(rows=14, cols=3)
-    table.style = 'Table Grid'
-    
-    # Set column widths
-    for cell in table.columns[0].cells:
-        cell.width = docx.shared.Inches(0.5)
-    for cell in table.columns[1].cells:
-        cell.width = docx.shared.Inches(2.0)
-    for cell in table.columns[2].cells:
-        cell.width = docx.shared.Inches(3.0)
-    
-    # Add headers
-    headers = ["S.NO.", "ITEM", "DESCRIPTION"]
-    for i, header in enumerate(headers):
-        cell = table.cell(0, i)
-        cell.text = header
-        for paragraph in cell.paragraphs:
-            for run in paragraph.runs:
-                run.bold = True
-    
-    # Add furniture items
-    furniture_items = [
-        ["1", "Prepaid Metering System", ""],
-        ["2", "Ceiling Fans", "6 Nos."],
-        ["3", "Tube lights/ Wall Lights/Ceiling Lights", "6 LED Tubelights"],
-        ["4", "Fan Regulators", "In all rooms"],
-        ["5", "Electric Bell", "1 Nos."],
-        ["6", "Geyser", "1 in master bed Toilet"],
-        ["7", "Electric Auto Clean Chimney", "1 in the Kitchen"],
-        ["8", "Mirror", "2 in the both Toilet"],
-        ["9", "Modular Wood Work cabinet", "In the Kitchen"],
-        ["10", "Fixed Almirah", "Both Bedrooms"],
-        ["11", "Keys", "Single key of every door"],
-        ["12", "Other Facilities", "Club Facilities provided by builder. Usage on chargeable basis"]
-    ]
-    
-    # Add furniture items to table
-    for i, item in enumerate(furniture_items):
-        row = table.rows[i+1]  # Skip header row
-        for j, text in enumerate(item):
-            cell = row.cells[j]
-            cell.text = text
+    annexure_table_para = doc.add_paragraph()
+    if not skeleton:
+        annexure_table_para._p.getparent().replace(
+            annexure_table_para._p, _parse_block(_annexure_table_xml(field_values, doc.part))
+        )
     
     # Add Lessor and Lessee signature lines at the bottom
     doc.add_paragraph("\n\n\n")
@@ -394,321 +739,478 @@ def create_document_from_draft(field_values):
     lessee_cell.text = "Lessee"
     lessee_cell.paragraphs[0].alignment = docx.enum.text.WD_ALIGN_PARAGRAPH.RIGHT
     
+    # Add the payment schedule annexure, when asked for, on a page of its own
+    schedule_para = doc.add_paragraph()
+    if not skeleton:
+        schedule_xml = _payment_schedule_xml(field_values)
+        if schedule_xml:
+            schedule_para._p.getparent().replace(schedule_para._p, _parse_block(schedule_xml))
+        else:
+            schedule_para._p.getparent().remove(schedule_para._p)
+    
     return doc
 
+def _agreement_label(entry):
+    unit = " ".join(filter(None, (entry["tower_no"], entry["apartment_unit_no"], entry["property_name"])))
+    return f"{entry['lessee_name'] or 'Unnamed lessee'}, {unit or 'no property'}: lease ends {entry['lease_end']}"
+
+def show_agreement_index():
+    """Search the agreement index and list the leases expiring soon, with their stored documents"""
+    index = agreement_index.from_env()
+    if index is None:
+        return
+    with st.expander("Find an earlier agreement"):
+        query = st.text_input("Search names, society, sector, tower or unit", key="index_query")
+        expiring_days = st.number_input(
+            "Or list leases expiring within (days)", min_value=0, max_value=3650, value=0, step=30,
+            key="index_expiring_days",
+        )
+        started = time.perf_counter()
+        if query:
+            entries = index.search(query, limit=20)
+        elif expiring_days:
+            entries = index.expiring(expiring_days, limit=20)
+        else:
+            entries = index.search(limit=5)
+        st.caption(
+            f"{len(entries)} shown of {index.stats()['agreements']} indexed · "
+            f"query {(time.perf_counter() - started) * 1000:.1f} ms"
+        )
+        # Documents are read only for the entry picked, not for every listed one on every rerun
+        for entry in entries:
+            if not st.button(_agreement_label(entry), key=f"index_open_{entry['id']}"):
+                continue
+            data = index.read(entry["id"])
+            if data is None:
+                st.error("The stored document of this agreement is missing or damaged. Generate it again.")
+                continue
+            st.download_button(
+                label="Download this agreement",
+                data=data,
+                file_name=f"rent_agreement_{entry['id']}.docx",
+                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                key=f"index_download_{entry['id']}",
+            )
+
 def main():
+    started = time.perf_counter()
+    metrics.configure_from_env()
+    st.session_state["rerun_count"] = st.session_state.get("rerun_count", 0) + 1
+    # Owner of this session's generation jobs
+    session_id = st.session_state.setdefault("session_id", uuid.uuid4().hex)
+    
     st.title("Gupta Properties: Rent Agreement Generator")
     st.subheader("Based on Lease Deed Template")
     
-    # Template path
-    template_path = "agreement_template.docx"
+    # Start parsing the society templates while the form is filled in
+    registry = get_template_registry()
     
-    # Create tabs for better organization
-    tab1, tab2, tab3, tab4, tab5 = st.tabs([
-        "Basic Information", 
-        "Financial Details", 
-        "Lease Period", 
-        "Property Details",
-        "Furniture & Fixtures"
-    ])
+    engine = st.sidebar.selectbox(
+        "Render engine", ENGINES, key="engine",
+        help="ooxml streams the draft format without python-docx; templates always use python-docx"
+    )
+    produce_pdf = st.sidebar.checkbox(
+        "Also produce PDF", key="produce_pdf", disabled=find_soffice() is None,
+        help="Converted with LibreOffice, which must be installed on the server"
+             + ("" if conversion_mode() == PDF_WARM else
+                "; without its Python bridge (python3-uno) every PDF starts LibreOffice from cold")
+    )
+    compact = st.sidebar.checkbox(
+        "Compact output", key="compact_output",
+        help="A smaller .docx to email or send on WhatsApp: unused styles and parts are removed"
+             + (" and photos downsampled to 150 dpi" if COMPACT_OPTIONS else "")
+    )
     
-    field_values = {}
-    validation_errors = []
-    
-    with tab1:
-        st.subheader("Parties & Property Information")
-        
-        # Execution date
-        execution_date = st.date_input("Execution Date", key="execution_date")
-        field_values["execution_date"] = format_date_with_suffix(execution_date)
-        field_values["execution_month"] = execution_date.strftime("%B")
-        field_values["execution_year"] = execution_date.strftime("%Y")
+    # Inputs only take effect when the form is submitted, so editing a field
+    # does not recompute the derived values on every keystroke
+    with st.form("agreement_form"):
+        # Create tabs for better organization
+        tab1, tab2, tab3, tab4, tab5 = st.tabs([
+            "Basic Information", 
+            "Financial Details", 
+            "Lease Period", 
+            "Property Details",
+            "Furniture & Fixtures"
+        ])
         
-        # Lessor details
-        st.markdown("### Lessor (Owner) Details")
-        lessor_name = st.text_input("Lessor Name", key="lessor_name")
-        if not lessor_name:
-            validation_errors.append("Lessor name is required")
-        field_values["lessor_name"] = lessor_name
+        record = {}
         
-        lessor_father_name = st.text_input("Lessor's Father Name (S/O)", key="lessor_father")
-        if not lessor_father_name:
-            validation_errors.append("Lessor's father name is required")
-        field_values["lessor_father_name"] = lessor_father_name
-        
-        lessor_address = st.text_area("Lessor Address", key="lessor_address")
-        if not lessor_address:
-            validation_errors.append("Lessor address is required")
-        field_values["lessor_address"] = lessor_address
-        
-        # Lessee details
-        st.markdown("### Lessee (Tenant) Details")
-        lessee_name = st.text_input("Lessee Name", key="lessee_name")
-        if not lessee_name:
-            validation_errors.append("Lessee name is required")
-        field_values["lessee_name"] = lessee_name
-        
-        lessee_father_name = st.text_input("Lessee's Father Name (S/O)", key="lessee_father")
-        if not lessee_father_name:
-            validation_errors.append("Lessee's father name is required")
-        field_values["lessee_father_name"] = lessee_father_name
-        
-        lessee_address = st.text_area("Lessee Address (with PIN code)", key="lessee_address")
-        if not lessee_address:
-            validation_errors.append("Lessee address is required")
-        field_values["lessee_address"] = lessee_address
-    
-    with tab2:
-        st.subheader("Financial Information")
-        
-        # Rent amount
-        rent_amount = st.number_input("Monthly Rent (₹)", min_value=0, value=43000, key="rent")
-        field_values["rent_amount_numeric"] = f"Rs. {rent_amount:,}/-"
-        field_values["rent_amount_words"] = number_to_words_rupees(rent_amount).replace("Rupees ", "")
+        with tab1:
+            st.subheader("Parties & Property Information")
+            
+            # Execution date
+            record["execution_date"] = st.date_input("Execution Date", key="execution_date")
+            
+            # Lessor details
+            st.markdown("### Lessor (Owner) Details")
+            record["lessor_name"] = st.text_input("Lessor Name", key="lessor_name")
+            
+            record["lessor_father_name"] = st.text_input("Lessor's Father Name (S/O)", key="lessor_father")
+            
+            record["lessor_address"] = st.text_area("Lessor Address", key="lessor_address")
+            
+            # Lessee details
+            st.markdown("### Lessee (Tenant) Details")
+            record["lessee_name"] = st.text_input("Lessee Name", key="lessee_name")
+            
+            record["lessee_father_name"] = st.text_input("Lessee's Father Name (S/O)", key="lessee_father")
+            
+            record["lessee_address"] = st.text_area("Lessee Address (with PIN code)", key="lessee_address")
         
-        # Security deposit
-        security_deposit = st.number_input("Security Deposit (₹)", min_value=0, value=rent_amount*2, key="deposit")
-        field_values["security_deposit_numeric"] = f"Rs. {security_deposit:,}/-"
-        field_values["security_deposit_words"] = number_to_words_rupees(security_deposit).replace("Rupees ", "")
+        with tab2:
+            st.subheader("Financial Information")
+            
+            # Rent amount
+            rent_amount = st.number_input("Monthly Rent (₹)", min_value=0, value=43000, key="rent")
+            record["rent_amount"] = rent_amount
+            
+            # Security deposit
+            security_deposit = st.number_input("Security Deposit (₹)", min_value=0, value=rent_amount*2, key="deposit")
+            record["security_deposit"] = security_deposit
+            
+            # Payment details
+            col1, col2 = st.columns(2)
+            with col1:
+                payment_due_day = st.number_input(
+                    "Payment Due Day", min_value=1, max_value=31, value=5, key="due_day",
+                    help="Day of month when rent is due (e.g., 5 means rent is due by 5th of each month)"
+                )
+                record["payment_due_day"] = payment_due_day
+            with col2:
+                rent_increase = st.number_input(
+                    "Rent Increase Percentage", min_value=0, max_value=100, value=10, key="increase",
+                    help="Percentage by which rent will increase after the lease period"
+                )
+                record["rent_increase_percentage"] = rent_increase
+            
+            record["rent_escalation_months"] = st.number_input(
+                "Rent Increase Every (months)", min_value=1, max_value=60, value=ESCALATION_MONTHS,
+                key="escalation",
+                help="How often the rent increases during a long lease, for the payment schedule"
+            )
         
-        # Payment details
-        col1, col2 = st.columns(2)
-        with col1:
-            payment_due_day = st.number_input(
-                "Payment Due Day", min_value=1, max_value=31, value=5, key="due_day",
-                help="Day of month when rent is due (e.g., 5 means rent is due by 5th of each month)"
+        with tab3:
+            st.subheader("Lease Period")
+            
+            # Lease start and end dates
+            col1, col2 = st.columns(2)
+            with col1:
+                lease_start = st.date_input(
+                    "Lease Start Date", key="lease_start",
+                    help="First day of the lease period"
+                )
+                record["lease_start"] = lease_start
+            
+            with col2:
+                # Calculate default end date (11 months from start date)
+                default_end_date = lease_start + timedelta(days=11*30)  # Approximate 11 months
+                lease_end = st.date_input(
+                    "Lease End Date", 
+                    value=default_end_date,
+                    key="lease_end",
+                    help="Last day of the lease period (typically 11 months from start date)"
+                )
+                record["lease_end"] = lease_end
+            
+            # Calculate lease period in months
+            lease_period_months = 11  # Default
+            if lease_start and lease_end:
+                # Calculate difference in months (approximate)
+                delta = lease_end - lease_start
+                lease_period_months = round(delta.days / 30)
+            
+            # Lease period
+            lease_period = st.number_input(
+                "Lease Period (months)", 
+                min_value=1, 
+                max_value=60,
+                value=lease_period_months,
+                help="Duration of lease in months (typically 11 months in India)",
+                key="lease_period"
             )
-            field_values["payment_due_day"] = payment_due_day
-        with col2:
-            rent_increase = st.number_input(
-                "Rent Increase Percentage", min_value=0, max_value=100, value=10, key="increase",
-                help="Percentage by which rent will increase after the lease period"
+            record["lease_period_months"] = lease_period
+            
+            # Notice period
+            notice_period = st.selectbox(
+                "Notice Period", 
+                options=["one", "two", "three"],
+                index=1,  # Default to "two"
+                help="Notice period required before terminating lease",
+                key="notice_period"
             )
-            field_values["rent_increase_percentage"] = rent_increase
-    
-    with tab3:
-        st.subheader("Lease Period")
-        
-        # Lease start and end dates
-        col1, col2 = st.columns(2)
-        with col1:
-            lease_start = st.date_input(
-                "Lease Start Date", key="lease_start",
-                help="First day of the lease period"
+            record["notice_period_months"] = notice_period
+            
+            record["payment_schedule"] = st.checkbox(
+                "Attach payment schedule", key="payment_schedule",
+                help="Add an annexure with the due date, rent and running total of every month of the lease"
             )
-            field_values["lease_start_date"] = format_date_with_suffix(lease_start)
         
-        with col2:
-            # Calculate default end date (11 months from start date)
-            default_end_date = lease_start + timedelta(days=11*30)  # Approximate 11 months
-            lease_end = st.date_input(
-                "Lease End Date", 
-                value=default_end_date,
-                key="lease_end",
-                help="Last day of the lease period (typically 11 months from start date)"
+        with tab4:
+            st.subheader("Property Details")
+            
+            # Property details
+            col1, col2 = st.columns(2)
+            with col1:
+                record["apartment_unit_no"] = st.text_input(
+                    "Apartment/Unit Number", 
+                    key="apartment_unit",
+                    help="Apartment or unit number"
+                )
+                
+                record["tower_no"] = st.text_input(
+                    "Tower Number", 
+                    key="tower_no",
+                    help="Tower or building number"
+                )
+            
+            with col2:
+                record["property_name"] = st.text_input(
+                    "Property Name", 
+                    key="property_name",
+                    help="Name of the housing society or complex"
+                )
+                
+                record["property_sector"] = st.text_input(
+                    "Sector", 
+                    key="property_sector",
+                    help="Sector or area number"
+                )
+            
+            record["property_location"] = st.text_input(
+                "Location", 
+                key="property_location",
+                help="City and state (e.g., Noida, UP)"
             )
-            field_values["lease_end_date"] = format_date_with_suffix(lease_end)
-        
-        # Calculate lease period in months
-        lease_period_months = 11  # Default
-        if lease_start and lease_end:
-            # Calculate difference in months (approximate)
-            delta = lease_end - lease_start
-            lease_period_months = round(delta.days / 30)
-        
-        # Lease period
-        lease_period = st.number_input(
-            "Lease Period (months)", 
-            min_value=1, 
-            max_value=60,
-            value=lease_period_months,
-            help="Duration of lease in months (typically 11 months in India)",
-            key="lease_period"
-        )
-        field_values["lease_period_months"] = lease_period
-        
-        # Notice period
-        notice_period = st.selectbox(
-            "Notice Period", 
-            options=["one", "two", "three"],
-            index=1,  # Default to "two"
-            help="Notice period required before terminating lease",
-            key="notice_period"
-        )
-        field_values["notice_period_months"] = notice_period
-    
-    with tab4:
-        st.subheader("Property Details")
-        
-        # Property details
-        col1, col2 = st.columns(2)
-        with col1:
-            apartment_unit = st.text_input(
-                "Apartment/Unit Number", 
-                key="apartment_unit",
-                help="Apartment or unit number"
+            
+            property_type = st.text_input(
+                "Property Type", 
+                value="3 BHK + Study",
+                key="property_type",
+                help="Type of property (e.g., 2 BHK, 3 BHK + Study)"
             )
-            if not apartment_unit:
-                validation_errors.append("Apartment/Unit number is required")
-            field_values["apartment_unit_no"] = apartment_unit
-            
-            tower_no = st.text_input(
-                "Tower Number", 
-                key="tower_no",
-                help="Tower or building number"
+            record["property_type"] = property_type
+            
+            car_parks = st.number_input(
+                "Number of Car Parks", 
+                min_value=0, 
+                value=2,
+                key="car_parks",
+                help="Number of car parking spaces included"
             )
-            if not tower_no:
-                validation_errors.append("Tower number is required")
-            field_values["tower_no"] = tower_no
+            record["car_parks"] = car_parks
         
-        with col2:
-            property_name = st.text_input(
-                "Property Name", 
-                key="property_name",
-                help="Name of the housing society or complex"
+        with tab5:
+            st.subheader("Furniture & Fixtures")
+            
+            # Furniture and fixtures
+            ceiling_fans = st.number_input(
+                "Ceiling Fans", 
+                min_value=0, 
+                value=6,
+                key="ceiling_fans"
             )
-            if not property_name:
-                validation_errors.append("Property name is required")
-            field_values["property_name"] = property_name
-            
-            property_sector = st.text_input(
-                "Sector", 
-                key="property_sector",
-                help="Sector or area number"
+            record["ceiling_fans"] = ceiling_fans
+            
+            tube_lights = st.text_input(
+                "Tube Lights/Wall Lights/Ceiling Lights", 
+                value="6 LED Tubelights",
+                key="tube_lights"
             )
-            if not property_sector:
-                validation_errors.append("Property sector is required")
-            field_values["property_sector"] = property_sector
-        
-        property_location = st.text_input(
-            "Location", 
-            key="property_location",
-            help="City and state (e.g., Noida, UP)"
-        )
-        if not property_location:
-            validation_errors.append("Property location is required")
-        field_values["property_location"] = property_location
-        
-        property_type = st.text_input(
-            "Property Type", 
-            value="3 BHK + Study",
-            key="property_type",
-            help="Type of property (e.g., 2 BHK, 3 BHK + Study)"
-        )
-        field_values["property_type"] = property_type
-        
-        car_parks = st.number_input(
-            "Number of Car Parks", 
-            min_value=0, 
-            value=2,
-            key="car_parks",
-            help="Number of car parking spaces included"
-        )
-        field_values["car_parks"] = car_parks
-    
-    with tab5:
-        st.subheader("Furniture & Fixtures")
-        
-        # Furniture and fixtures
-        ceiling_fans = st.number_input(
-            "Ceiling Fans", 
-            min_value=0, 
-            value=6,
-            key="ceiling_fans"
-        )
-        field_values["ceiling_fans"] = ceiling_fans
-        
-        tube_lights = st.text_input(
-            "Tube Lights/Wall Lights/Ceiling Lights", 
-            value="6 LED Tubelights",
-            key="tube_lights"
-        )
-        field_values["tube_lights"] = tube_lights
-        
-        fan_regulators = st.text_input(
-            "Fan Regulators", 
-            value="In all rooms",
-            key="fan_regulators"
-        )
-        field_values["fan_regulators"] = fan_regulators
-        
-        electric_bell = st.number_input(
-            "Electric Bell", 
-            min_value=0, 
-            value=1,
-            key="electric_bell"
-        )
-        field_values["electric_bell"] = electric_bell
-        
-        geyser = st.text_input(
-            "Geyser", 
-            value="1 in master bed Toilet",
-            key="geyser"
-        )
-        field_values["geyser"] = geyser
-        
-        chimney = st.text_input(
-            "Electric Auto Clean Chimney", 
-            value="1 in the Kitchen",
-            key="chimney"
-        )
-        field_values["chimney"] = chimney
-        
-        mirrors = st.text_input(
-            "Mirrors", 
-            value="2 in the both Toilet",
-            key="mirrors"
-        )
-        field_values["mirrors"] = mirrors
-        
-        modular_woodwork = st.text_input(
-            "Modular Wood Work Cabinet", 
-            value="In the Kitchen",
-            key="modular_woodwork"
-        )
-        field_values["modular_woodwork"] = modular_woodwork
-        
-        fixed_almirah = st.text_input(
-            "Fixed Almirah", 
-            value="Both Bedrooms",
-            key="fixed_almirah"
-        )
-        field_values["fixed_almirah"] = fixed_almirah
+            record["tube_lights"] = tube_lights
+            
+            fan_regulators = st.text_input(
+                "Fan Regulators", 
+                value="In all rooms",
+                key="fan_regulators"
+            )
+            record["fan_regulators"] = fan_regulators
+            
+            electric_bell = st.number_input(
+                "Electric Bell", 
+                min_value=0, 
+                value=1,
+                key="electric_bell"
+            )
+            record["electric_bell"] = electric_bell
+            
+            geyser = st.text_input(
+                "Geyser", 
+                value="1 in master bed Toilet",
+                key="geyser"
+            )
+            record["geyser"] = geyser
+            
+            chimney = st.text_input(
+                "Electric Auto Clean Chimney", 
+                value="1 in the Kitchen",
+                key="chimney"
+            )
+            record["chimney"] = chimney
+            
+            mirrors = st.text_input(
+                "Mirrors", 
+                value="2 in the both Toilet",
+                key="mirrors"
+            )
+            record["mirrors"] = mirrors
+            
+            modular_woodwork = st.text_input(
+                "Modular Wood Work Cabinet", 
+                value="In the Kitchen",
+                key="modular_woodwork"
+            )
+            record["modular_woodwork"] = modular_woodwork
+            
+            fixed_almirah = st.text_input(
+                "Fixed Almirah", 
+                value="Both Bedrooms",
+                key="fixed_almirah"
+            )
+            record["fixed_almirah"] = fixed_almirah
+            
+            keys = st.text_input(
+                "Keys", 
+                value="Single key of every door",
+                key="keys"
+            )
+            record["keys"] = keys
+            
+            # Anything else in the flat, listed after these in the annexure
+            inventory = st.data_editor(
+                {"item": [], "description": [], "notes": []},
+                num_rows="dynamic",
+                column_config={"item": "Other Item", "description": "Description", "notes": "Notes"},
+                key="inventory",
+            )
+            record["inventory"] = [
+                {"item": item, "description": description or "", "notes": notes or ""}
+                for item, description, notes in zip(inventory["item"], inventory["description"], inventory["notes"])
+                if item
+            ]
         
-        keys = st.text_input(
-            "Keys", 
-            value="Single key of every door",
-            key="keys"
-        )
-        field_values["keys"] = keys
+        submitted = st.form_submit_button("Generate Agreement")
     
-    # Generate button
-    if st.button("Generate Agreement"):
+    if submitted:
         # Validate all required fields
+        lease = LeaseRecord.from_dict(record)
+        validation_errors = lease.validate()
         if validation_errors:
             for error in validation_errors:
                 st.error(error)
+            st.session_state.pop("agreement", None)
         else:
-            # Generate document
+            st.session_state["agreement"] = lease.to_field_values()
+            st.session_state["agreement_record"] = lease.to_dict()
+    
+    field_values = st.session_state.get("agreement")
+    if field_values is not None:
+        template_path = select_template(field_values)
+        st.sidebar.caption(
+            f"Template: {os.path.basename(template_path) if os.path.exists(template_path) else 'draft format'}"
+        )
+        
+        # Generate in the background, keeping the job across reruns; a
+        # resubmitted form restarts a cancelled or failed job
+        job_queue = get_job_queue()
+        job_key = (
+            field_values_key(field_values), template_path, template_digest(template_path), engine, produce_pdf,
+            compact,
+        )
+        job = job_queue.get(st.session_state.get("agreement_job", ""))
+        if submitted or job is None or job.key != job_key:
             try:
-                doc = generate_agreement(template_path, field_values)
-                
-                # Save to BytesIO object
-                buffer = io.BytesIO()
-                doc.save(buffer)
-                buffer.seek(0)
-                
-                # Provide download button
-                st.download_button(
-                    label="Download Agreement",
-                    data=buffer,
-                    file_name="rent_agreement.docx",
-                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+                job = job_queue.submit(
+                    job_key,
+                    generation_job(
+                        template_path, field_values, engine, produce_pdf, st.session_state.get("agreement_record"),
+                        COMPACT_OPTIONS if compact else None, st.session_state.setdefault("previous_renders", {}),
+                    ),
+                    owner=session_id, description=f"Agreement for {field_values.get('lessee_name', '')}"
                 )
-                
+                st.session_state["agreement_job"] = job.id
+            except jobs.TooManyJobs as e:
+                st.error(str(e))
+                job = None
+        
+        if job is not None and job.active:
+            show_job_progress(job.id)
+        elif job is not None and job.state == jobs.DONE:
+            result = job.result
+            st.session_state["generation_ms"] = result["generation_ms"]
+            if result["warning"] is not None:
+                st.warning(result["warning"])
+            
+            # Provide download button
+            st.download_button(
+                label="Download Agreement",
+                data=result["docx"],
+                file_name="rent_agreement.docx",
+                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+            )
+            compaction = result["compaction"]
+            if compaction is not None:
+                st.caption(
+                    f"Compacted from {compaction['bytes_before'] / 1024:.0f} KB to "
+                    f"{compaction['bytes_after'] / 1024:.0f} KB: {compaction['styles_removed']} unused styles, "
+                    f"{len(compaction['parts_removed'])} parts removed, "
+                    f"{compaction['images_downsampled']} photos downsampled"
+                )
+            
+            if st.session_state.get("announced_job") != job.id:
+                st.session_state["announced_job"] = job.id
                 st.success("Agreement generated successfully!")
-            except Exception as e:
-                st.error(f"Error generating agreement: {str(e)}")
+            
+            if result["pdf"] is not None:
+                st.download_button(
+                    label="Download PDF",
+                    data=result["pdf"],
+                    file_name="rent_agreement.pdf",
+                    mime="application/pdf"
+                )
+                pdf_stats = get_pool().stats()
+                st.sidebar.caption(
+                    f"PDF ({pdf_stats['mode']} workers) p50 {pdf_stats['p50_ms']:.0f} ms · p90 {pdf_stats['p90_ms']:.0f} ms · "
+                    f"p99 {pdf_stats['p99_ms']:.0f} ms · conversion alone p50 {pdf_stats['convert_p50_ms']:.0f} ms · "
+                    f"queued {pdf_stats['queued']}"
+                )
+            elif result["pdf_error"] is not None:
+                st.error(f"Error converting agreement to PDF: {result['pdf_error']}")
+            if result["index_error"] is not None:
+                st.warning(f"The agreement was not saved to the agreement index: {result['index_error']}")
+        elif job is not None and job.state == jobs.FAILED:
+            st.error(f"Error generating agreement: {job.error}")
+        elif job is not None:
+            st.info("Generation cancelled. Submit the form to start it again.")
+    
+    show_agreement_index()
+    
+    # Earlier jobs of this session that are still running
+    for other in get_job_queue().jobs(owner=session_id):
+        if other.active and other.id != st.session_state.get("agreement_job"):
+            st.sidebar.caption(f"{other.description}: {other.message} ({other.progress:.0%})")
+            st.sidebar.button("Cancel", key=f"cancel_{other.id}", on_click=other.cancel)
+    
+    st.sidebar.caption(
+        f"Reruns: {st.session_state['rerun_count']} · "
+        f"script: {(time.perf_counter() - started) * 1000:.0f} ms · "
+        f"last generation: {st.session_state.get('generation_ms', 0):.1f} ms"
+    )
+    if registry is not None:
+        registry_stats = registry.stats()
+        st.sidebar.caption(
+            f"Templates: {registry_stats['templates']} loaded in {registry_stats['load_seconds']:.2f} s · "
+            f"{registry_stats['shared_parts']} shared parts · "
+            f"RSS {registry_stats['rss_bytes'] / 1024 / 1024:.0f} MB"
+        )
+        for path, error in registry_stats["errors"].items():
+            st.sidebar.warning(f"{os.path.basename(path)}: {error}")
+    disk_cache = render_cache.from_env()
+    if disk_cache is not None:
+        cache_stats = disk_cache.stats()
+        st.sidebar.caption(
+            f"Render cache: {cache_stats['hits']} hits · {cache_stats['misses']} misses · "
+            f"{cache_stats['bytes'] / 1024 / 1024:.1f} of {cache_stats['max_bytes'] / 1024 / 1024:.0f} MB"
+        )
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,259 @@
+"""Headless HTTP service that generates agreements from JSON lease records.
+
+POST a lease record (the same fields as a batch_generate JSONL line) to
+/agreements and the .docx comes back as the response body. Records are
+checked with the same rules as the Streamlit form; invalid ones get a 422
+with the reason. Rendering runs on a process pool of --workers processes.
+Requests beyond that wait in a queue of --max-queue; when the queue is full
+the service answers 503 with Retry-After instead of piling up work.
+
+GET /healthz reports the pool and queue occupancy.
+
+Usage:
+    python service.py --port 8080 --workers 4 --max-queue 32
+    curl -X POST --data @lease.json -o agreement.docx localhost:8080/agreements
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import metrics
+from batch_generate import RecordError, normalize_record, output_name, render_job
+from rent_agreement_generator import ENGINES, build_field_values
+
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 422: "Unprocessable Entity", 500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class HttpError(Exception):
+    """An error answered with its status code and a JSON body"""
+
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class AgreementService:
+    """Accepts lease records over HTTP and renders them on a process pool
+
+    At most `workers` documents render at once and at most `max_queue` more
+    requests wait for a worker; anything beyond that is refused with a 503.
+    """
+
+    def __init__(self, template_path=None, workers=None, max_queue=32, engine="python-docx",
+                 request_timeout=30, executor=None):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}")
+        self.template_path = template_path
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.engine = engine
+        self.request_timeout = request_timeout
+        self.executor = executor or ProcessPoolExecutor(
+            max_workers=self.workers, initializer=metrics.configure_from_env
+        )
+        self._slots = asyncio.Semaphore(self.workers)
+        self._admitted = 0
+        self._rendering = 0
+        self._served = 0
+        self._rejected = 0
+
+    def stats(self):
+        """Return the number of requests rendering, queued, served and rejected"""
+        return {
+            "workers": self.workers,
+            "rendering": self._rendering,
+            "queued": self._admitted - self._rendering,
+            "max_queue": self.max_queue,
+            "served": self._served,
+            "rejected": self._rejected,
+        }
+
+    async def start(self, host="127.0.0.1", port=8080):
+        """Start listening and return the asyncio server"""
+        return await asyncio.start_server(self.handle, host, port, limit=MAX_HEADER_BYTES)
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    async def handle(self, reader, writer):
+        """Serve one request per connection"""
+        try:
+            try:
+                method, target, headers = await asyncio.wait_for(
+                    self._read_head(reader), self.request_timeout
+                )
+                body = await asyncio.wait_for(self._read_body(reader, headers), self.request_timeout)
+                status, response_headers, payload = await self.dispatch(method, target, body)
+            except HttpError as e:
+                status, response_headers, payload = e.status, e.headers, _json_bytes({"error": str(e)})
+                response_headers.setdefault("Content-Type", "application/json")
+            except asyncio.TimeoutError:
+                status, response_headers, payload = 400, {"Content-Type": "application/json"}, \
+                    _json_bytes({"error": "Timed out reading the request"})
+            except (ConnectionError, asyncio.IncompleteReadError):
+                raise
+            except Exception as e:
+                status, response_headers, payload = 500, {"Content-Type": "application/json"}, \
+                    _json_bytes({"error": f"{type(e).__name__}: {e}"})
+            await self._respond(writer, status, response_headers, payload)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def dispatch(self, method, target, body):
+        """Return (status, headers, payload) for a parsed request"""
+        url = urlsplit(target)
+        if url.path == "/healthz":
+            if method != "GET":
+                raise HttpError(405, "Use GET", {"Allow": "GET"})
+            return 200, {"Content-Type": "application/json"}, _json_bytes(self.stats())
+        if url.path != "/agreements":
+            raise HttpError(404, f"No such endpoint: {url.path}")
+        if method != "POST":
+            raise HttpError(405, "Use POST", {"Allow": "POST"})
+
+        engine = parse_qs(url.query).get("engine", [self.engine])[0]
+        if engine not in ENGINES:
+            raise HttpError(400, f"Unknown engine {engine!r}, expected one of {ENGINES}")
+        try:
+            raw = json.loads(body)
+        except (UnicodeDecodeError, ValueError) as e:
+            raise HttpError(400, f"Body is not valid JSON: {e}")
+        if not isinstance(raw, dict):
+            raise HttpError(400, "Body must be a JSON object with the lease fields")
+        try:
+            record = normalize_record(raw)
+        except RecordError as e:
+            raise HttpError(422, str(e))
+
+        name = output_name(0, record).partition("-")[2] or "rent_agreement.docx"
+        job = (0, name, self.template_path, build_field_values(record), engine)
+        data = await self.render(job)
+        return 200, {
+            "Content-Type": DOCX_MIME,
+            "Content-Disposition": f'attachment; filename="{name}"',
+        }, data
+
+    async def render(self, job):
+        """Render a job on the pool, queueing for a worker or refusing with 503"""
+        if self._admitted >= self.workers + self.max_queue:
+            self._rejected += 1
+            metrics.count("service_rejected")
+            raise HttpError(503, "Too many agreements in progress, try again shortly", {"Retry-After": "1"})
+        self._admitted += 1
+        try:
+            async with self._slots:
+                self._rendering += 1
+                try:
+                    with metrics.stage("service_render"):
+                        loop = asyncio.get_running_loop()
+                        _, _, data, error = await loop.run_in_executor(self.executor, render_job, job)
+                finally:
+                    self._rendering -= 1
+        finally:
+            self._admitted -= 1
+        if error:
+            raise HttpError(500, error)
+        self._served += 1
+        return data
+
+    async def _read_head(self, reader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.LimitOverrunError:
+            raise HttpError(413, "Request headers too large")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "Malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                key, _, value = line.partition(":")
+                headers[key.strip().lower()] = value.strip()
+        return method.upper(), target, headers
+
+    async def _read_body(self, reader, headers):
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HttpError(400, "Chunked request bodies are not supported, send Content-Length")
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            raise HttpError(400, "Invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, f"Request body larger than {MAX_BODY_BYTES} bytes")
+        return await reader.readexactly(length) if length else b""
+
+    async def _respond(self, writer, status, headers, payload):
+        head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+        headers = dict(headers, **{"Content-Length": str(len(payload)), "Connection": "close"})
+        head.extend(f"{key}: {value}" for key, value in headers.items())
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+        # Stream the body in chunks, waiting for slow clients to drain
+        view = memoryview(payload)
+        for start in range(0, len(view), CHUNK_SIZE):
+            writer.write(view[start:start + CHUNK_SIZE])
+            await writer.drain()
+        await writer.drain()
+
+
+def _json_bytes(data):
+    return json.dumps(data, default=str).encode("utf-8")
+
+
+async def serve(args):
+    service = AgreementService(args.template, workers=args.workers, max_queue=args.max_queue,
+                               engine=args.engine)
+    server = await service.start(args.host, args.port)
+    print(f"Serving on http://{args.host}:{args.port} with {service.workers} workers", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve rent agreement generation over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--template", default="agreement_template.docx",
+                        help="template to fill; the draft format is used when it does not exist")
+    parser.add_argument("--engine", choices=ENGINES, default="python-docx",
+                        help="default render engine; a request can pick one with ?engine=")
+    parser.add_argument("--workers", type=int, default=None, help="render processes (default: CPU count)")
+    parser.add_argument("--max-queue", type=int, default=32,
+                        help="requests allowed to wait for a worker before answering 503")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.template):
+        print(f"Template {args.template} not found, using the draft format", file=sys.stderr)
+        args.template = None
+    metrics.configure_from_env()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Single-pass, run-preserving placeholder substitution.
+
+A paragraph's text is spread over the ``w:t`` elements of its runs, and Word
+is free to split a ``[[field]]`` placeholder across several of them. The
+paragraph is tokenized once with PLACEHOLDER_PATTERN, each value is written
+into the run where its placeholder starts, and the rest of the placeholder is
+removed from the runs it spilled into. Run properties (bold, underline, ...)
+are left untouched.
+"""
+import bisect
+import re
+
+from docx.oxml.ns import qn
+
+PLACEHOLDER_PATTERN = re.compile(r"\[\[(\w+)\]\]")
+
+_TEXT_XPATH = "./w:r/w:t | ./w:hyperlink/w:r/w:t"
+_SPECIAL_CHARS = re.compile(r"(\n|\t)")
+_XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+
+
+def substitute_paragraph(p, field_values):
+    """Replace the placeholders of a w:p element in place
+
+    Placeholders whose field is not in field_values are left as they are.
+    Returns the number of placeholders replaced.
+    """
+    nodes = p.xpath(_TEXT_XPATH)
+    if not nodes:
+        return 0
+
+    texts = [node.text or "" for node in nodes]
+    full_text = "".join(texts)
+    matches = [
+        m for m in PLACEHOLDER_PATTERN.finditer(full_text)
+        if m.group(1) in field_values
+    ]
+    if not matches:
+        return 0
+
+    # ends[i] is the offset just past the last character held by nodes[i]
+    ends = []
+    offset = 0
+    for text in texts:
+        offset += len(text)
+        ends.append(offset)
+
+    pieces = [[] for _ in nodes]
+
+    def copy_text(start, stop):
+        i = bisect.bisect_right(ends, start)
+        while start < stop:
+            node_stop = min(ends[i], stop)
+            pieces[i].append(full_text[start:node_stop])
+            start = node_stop
+            i += 1
+
+    cursor = 0
+    for m in matches:
+        copy_text(cursor, m.start())
+        pieces[bisect.bisect_right(ends, m.start())].append(str(field_values[m.group(1)]))
+        cursor = m.end()
+    copy_text(cursor, len(full_text))
+
+    for node, text, parts in zip(nodes, texts, pieces):
+        new_text = "".join(parts)
+        if new_text != text:
+            _set_text(node, new_text)
+    return len(matches)
+
+
+def _set_text(t, text):
+    """Set the text of a w:t, turning newlines and tabs into w:br and w:tab
+
+    Windows (\r\n) and old Mac (\r) line endings count as newlines.
+    """
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    if "\n" not in text and "\t" not in text:
+        t.text = text
+        _preserve_space(t)
+        return
+
+    tokens = _SPECIAL_CHARS.split(text)
+    t.text = tokens[0]
+    _preserve_space(t)
+    anchor = t
+    for token in tokens[1:]:
+        if not token:
+            continue
+        if token == "\n":
+            element = t.makeelement(qn("w:br"), {})
+        elif token == "\t":
+            element = t.makeelement(qn("w:tab"), {})
+        else:
+            element = t.makeelement(qn("w:t"), {})
+            element.text = token
+            _preserve_space(element)
+        anchor.addnext(element)
+        anchor = element
+
+
+def _preserve_space(t):
+    text = t.text or ""
+    if text != text.strip():
+        t.set(_XML_SPACE, "preserve")
@@ -0,0 +1,319 @@
+"""Compiled template cache used by generate_agreement.
+
+A template is parsed once per process. Every paragraph that holds a
+``[[field]]`` placeholder is recorded as its story part and its number among
+the part's w:p elements in document order, so a render only clones the parsed
+tree, lists its paragraphs and visits the indexed ones. Every story part is
+covered: the body, headers, footers, footnotes and endnotes, with the
+paragraphs of nested tables, content controls and text boxes, each once
+however its table cells are merged.
+
+Finding those paragraphs is most of the cost of loading a long template.
+template_compiler.py saves it ahead of time: a precompiled artifact next to
+the template (agreement_template.docx.compiled) holds the placeholder index
+and the template with every placeholder in a single run, and is loaded
+instead of indexing the template while its recorded hash still matches.
+"""
+import copy
+import hashlib
+import io
+import json
+import os
+import threading
+import zipfile
+
+import docx
+from docx.opc.part import PartFactory, XmlPart
+from docx.oxml.ns import qn
+
+import metrics
+from substitution import PLACEHOLDER_PATTERN, substitute_paragraph
+
+DOCUMENT_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"
+NOTES_CONTENT_TYPES = (
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.footnotes+xml",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.endnotes+xml",
+)
+
+# Content types of parts that a render writes into; every other part is
+# shared between the cached template and its clones.
+STORY_CONTENT_TYPES = {
+    DOCUMENT_CONTENT_TYPE,
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.header+xml",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.footer+xml",
+    *NOTES_CONTENT_TYPES,
+}
+
+# python-docx keeps footnotes and endnotes as opaque bytes; load them as XML
+# so their placeholders can be filled
+for _content_type in NOTES_CONTENT_TYPES:
+    PartFactory.part_type_for.setdefault(_content_type, XmlPart)
+
+# Precompiled artifacts: <template path> + ARTIFACT_SUFFIX, a zip of a
+# manifest and the normalized template
+ARTIFACT_SUFFIX = ".compiled"
+ARTIFACT_VERSION = 2
+
+_P, _R, _T, _HYPERLINK = qn("w:p"), qn("w:r"), qn("w:t"), qn("w:hyperlink")
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+class PlaceholderLocation:
+    """A paragraph in the template and the placeholders it contains
+
+    part is the name of its story part and paragraph the number of the w:p
+    among the part's paragraphs, nested ones included, in document order.
+    """
+
+    __slots__ = ("paragraph", "fields", "part")
+
+    def __init__(self, paragraph, fields, part="/word/document.xml"):
+        self.paragraph = paragraph
+        self.fields = fields
+        self.part = part
+
+
+class CompiledTemplate:
+    """Parsed template document with an index of its placeholders"""
+
+    def __init__(self, path, document, digest, mtime_ns, size, locations=None):
+        self.path = path
+        self.document = document
+        self.digest = digest
+        self.mtime_ns = mtime_ns
+        self.size = size
+        roots = story_roots(document)
+        self.paragraphs = _paragraphs(roots)
+        self.locations = _index_placeholders(roots, self.paragraphs) if locations is None else locations
+        self.fields = {}
+        self.by_paragraph = {}
+        for location in self.locations:
+            self.by_paragraph[location.part, location.paragraph] = location
+            for field_name in location.fields:
+                self.fields.setdefault(field_name, []).append(location)
+
+    def clone(self):
+        """Return a copy of the template that can be modified freely"""
+        return clone_document(self.document)
+
+    def render(self, field_values):
+        """Return a new document with the placeholders replaced"""
+        with metrics.stage("clone"):
+            doc = self.clone()
+        paragraphs = story_paragraphs(doc)
+        replaced = 0
+        with metrics.stage("substitute"):
+            for location in self.locations:
+                replaced += substitute_paragraph(paragraphs[location.part][location.paragraph], field_values)
+        metrics.count("placeholders_replaced", replaced)
+        # Fields without a value stay as [[field]]; template_compiler.py lists them
+        unreplaced = sum(len(locations) for name, locations in self.fields.items() if name not in field_values)
+        if unreplaced:
+            metrics.count("placeholders_unreplaced", unreplaced)
+        return doc
+
+    def save_compiled(self, extra=None):
+        """Write the precompiled artifact of this template next to it, where load_template() looks
+
+        extra is merged into the manifest.
+        """
+        package = io.BytesIO()
+        self.document.save(package)
+        manifest = dict(extra or {}, version=ARTIFACT_VERSION, source_digest=self.digest, locations=[
+            [location.paragraph, list(location.fields), location.part] for location in self.locations
+        ])
+        with zipfile.ZipFile(self.path + ARTIFACT_SUFFIX, "w", zipfile.ZIP_DEFLATED) as artifact:
+            artifact.writestr("manifest.json", json.dumps(manifest, separators=(",", ":")))
+            artifact.writestr("template.docx", package.getvalue())
+
+    def locations_for(self, fields):
+        """Return the locations holding a placeholder of any of fields, in document order"""
+        found = set()
+        for field_name in fields:
+            found.update(self.fields.get(field_name, ()))
+        return [location for location in self.locations if location in found]
+
+
+class RenderedTemplate:
+    """A render of a compiled template that can be updated in place
+
+    update() re-renders only the paragraphs holding a placeholder of a field
+    whose value changed, each from the template's own copy of the paragraph,
+    so the result is the same as a full render of the new values.
+    """
+
+    def __init__(self, template, field_values):
+        self.template = template
+        self.field_values = dict(field_values)
+        self.document = template.render(field_values)
+
+    def update(self, field_values):
+        """Re-render the paragraphs affected by the changed fields; return how many"""
+        locations = self.template.locations_for(changed_fields(self.field_values, field_values))
+        template = self.template
+        paragraphs = story_paragraphs(self.document)
+        with metrics.stage("patch"):
+            for location in locations:
+                part_paragraphs = paragraphs[location.part]
+                p = copy.deepcopy(template.paragraphs[location.part][location.paragraph])
+                substitute_paragraph(p, field_values)
+                stale = part_paragraphs[location.paragraph]
+                stale.getparent().replace(stale, p)
+                # Paragraphs of text boxes in p came back as in the template
+                for n, nested in enumerate(p.iter(_P)):
+                    number = location.paragraph + n
+                    part_paragraphs[number] = nested
+                    if n and (location.part, number) in template.by_paragraph:
+                        substitute_paragraph(nested, field_values)
+        metrics.count("paragraphs_patched", len(locations))
+        self.field_values = dict(field_values)
+        return len(locations)
+
+
+def load_template(template_path):
+    """Return the compiled template for template_path, compiling it if needed
+
+    The compiled template is reused until the file's mtime or size changes and
+    its content hash no longer matches.
+    """
+    key = os.path.abspath(template_path)
+    stat = os.stat(key)
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+            metrics.count("template_cache_hits")
+            return entry
+
+        with open(key, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        if entry and entry.digest == digest:
+            entry.mtime_ns = stat.st_mtime_ns
+            entry.size = stat.st_size
+            metrics.count("template_cache_hits")
+            return entry
+
+        metrics.count("template_cache_misses")
+        with metrics.stage("template_load"):
+            entry = _load_compiled(key, digest, stat)
+            if entry is None:
+                document = docx.Document(io.BytesIO(data))
+                entry = CompiledTemplate(key, document, digest, stat.st_mtime_ns, stat.st_size)
+        _cache[key] = entry
+        return entry
+
+
+def _load_compiled(path, digest, stat):
+    """Return the template from its precompiled artifact, or None if it has none that is current"""
+    try:
+        with zipfile.ZipFile(path + ARTIFACT_SUFFIX) as artifact:
+            manifest = json.loads(artifact.read("manifest.json"))
+            if manifest.get("version") != ARTIFACT_VERSION or manifest.get("source_digest") != digest:
+                metrics.count("compiled_template_stale")
+                return None
+            package = artifact.read("template.docx")
+    except FileNotFoundError:
+        return None
+    except (zipfile.BadZipFile, KeyError, ValueError):
+        metrics.count("compiled_template_errors")
+        return None
+    metrics.count("compiled_template_loads")
+    locations = [
+        PlaceholderLocation(paragraph, tuple(fields), part) for paragraph, fields, part in manifest["locations"]
+    ]
+    return CompiledTemplate(path, docx.Document(io.BytesIO(package)), digest, stat.st_mtime_ns, stat.st_size,
+                            locations)
+
+
+def changed_fields(old, new):
+    """Return the names of the fields added, removed or given a new value"""
+    changed = {name for name, value in new.items() if name not in old or old[name] != value}
+    changed.update(name for name in old if name not in new)
+    return changed
+
+
+def clear_cache():
+    """Drop every compiled template"""
+    with _cache_lock:
+        _cache.clear()
+
+
+def story_roots(document):
+    """Return the root element of each story part of document by part name, the main document first"""
+    roots = {str(document.part.partname): document.element}
+    for part in document.part.package.iter_parts():
+        if part.content_type in STORY_CONTENT_TYPES and isinstance(part, XmlPart):
+            roots.setdefault(str(part.partname), part.element)
+    return roots
+
+
+def story_paragraphs(document):
+    """Return the w:p elements of each story part of document by part name, in document order"""
+    return _paragraphs(story_roots(document))
+
+
+def _paragraphs(roots):
+    return {part: list(root.iter(_P)) for part, root in roots.items()}
+
+
+def _index_placeholders(roots, paragraphs):
+    """Find the paragraphs with placeholders of every story part
+
+    One iteration over the w:t elements of each part gathers the text of
+    each paragraph, the w:t its runs and hyperlinks hold as in
+    substitute_paragraph(), whatever tables, content controls or text boxes
+    it is nested in. Paragraphs without text are never looked at.
+    """
+    locations = []
+    for part, root in roots.items():
+        texts = {}
+        for t in root.iter(_T):
+            r = t.getparent()
+            if r.tag != _R:
+                continue
+            p = r.getparent()
+            if p.tag == _HYPERLINK:
+                p = p.getparent()
+            if p.tag != _P:
+                continue
+            pieces = texts.get(p)
+            if pieces is None:
+                texts[p] = [t.text or ""]
+            else:
+                pieces.append(t.text or "")
+        found = []
+        for p, pieces in texts.items():
+            text = "".join(pieces)
+            if "[[" not in text:
+                continue
+            fields = tuple(dict.fromkeys(PLACEHOLDER_PATTERN.findall(text)))
+            if fields:
+                found.append((p, fields))
+        if found:
+            numbers = {p: n for n, p in enumerate(paragraphs[part])}
+            located = [PlaceholderLocation(numbers[p], fields, part) for p, fields in found]
+            locations.extend(sorted(located, key=lambda location: location.paragraph))
+    return locations
+
+
+def clone_document(document):
+    """Copy the story parts of document and share everything else
+
+    lxml elements ignore the deepcopy memo, so each copied element is entered
+    into the memo up front to keep the part and the Document proxy pointing at
+    the same tree.
+    """
+    memo = {}
+    for part in document.part.package.iter_parts():
+        if part.content_type not in STORY_CONTENT_TYPES or not isinstance(part, XmlPart):
+            memo[id(part)] = part
+            continue
+        element = part.element
+        element_copy = copy.deepcopy(element)
+        memo[id(element)] = element_copy
+        body = element.find(qn("w:body"))
+        if body is not None:
+            memo[id(body)] = element_copy[element.index(body)]
+    return copy.deepcopy(document, memo)
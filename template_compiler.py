@@ -0,0 +1,207 @@
+"""Precompile agreement templates and lint their placeholders.
+
+A placeholder whose field the app never provides, such as [[rent_amount]]
+where the record gives rent_amount_numeric and rent_amount_words, is left in
+the agreement as it is. This command scans a template once and lists every
+[[field]] with where it is: the body, a table, a header or footer. It reports
+the fields the records do not provide, with the field probably meant, the
+placeholders renders do not reach and the record fields the template never
+uses.
+
+Unless --check is given, it then writes the template's precompiled artifact
+next to it, at the template path + template_cache.ARTIFACT_SUFFIX, the only
+place template_cache looks for one: the placeholder index and the template with each
+placeholder in a single run. template_cache.load_template() loads that
+instead of indexing the template, for as long as the template is unchanged.
+
+Usage:
+    python template_compiler.py agreement_template.docx
+    python template_compiler.py templates/*.docx --check
+"""
+import argparse
+import difflib
+import hashlib
+import io
+import os
+import sys
+import time
+from collections import namedtuple
+
+import docx
+from docx.oxml.ns import qn
+from lxml import etree
+
+import template_cache
+from lease_record import FIELD_DERIVATIONS, template_fields
+from substitution import PLACEHOLDER_PATTERN, substitute_paragraph
+
+# One [[field]] of a template, where it is and whether renders fill it in
+Placeholder = namedtuple("Placeholder", "field location filled")
+
+_TEXT_XPATH = "./w:r/w:t/text() | ./w:hyperlink/w:r/w:t/text()"
+_BLOCK_NAMES = {qn("w:p"): "paragraph", qn("w:tbl"): "table"}
+
+
+def _cell_label(block, p):
+    """Row and cell of p in the outermost table block, and what it is nested in"""
+    row = cell = None
+    tables = 0
+    text_box = False
+    element = p
+    while element is not block:
+        parent = element.getparent()
+        if element.tag == qn("w:tc"):
+            cell = list(parent.iterchildren(qn("w:tc"))).index(element) + 1
+        elif element.tag == qn("w:tr"):
+            row = list(parent.iterchildren(qn("w:tr"))).index(element) + 1
+        elif element.tag == qn("w:tbl"):
+            tables += 1
+        elif element.tag == qn("w:txbxContent"):
+            text_box = True
+        element = parent
+    label = ""
+    if block.tag == qn("w:tbl") and row is not None:
+        label = f", row {row}, cell {cell}"
+    if tables:
+        label += ", nested table"
+    if text_box:
+        label += ", text box"
+    return label
+
+
+def _story_paragraphs(name, root):
+    """Yield (paragraph, location) for every paragraph of a story part"""
+    container = root.find(qn("w:body")) if root.tag == qn("w:document") else root
+    if container is None:
+        return
+    counts = {}
+    for block in container:
+        kind = _BLOCK_NAMES.get(block.tag) or etree.QName(block).localname
+        counts[kind] = counts.get(kind, 0) + 1
+        for p in block.iter(qn("w:p")):
+            yield p, f"{name} {kind} {counts[kind]}{_cell_label(block, p)}"
+
+
+def scan_placeholders(template):
+    """Return a Placeholder for every [[field]] of a CompiledTemplate, in document order
+
+    Covers the body and the headers, footers, footnotes and endnotes, tables
+    and text boxes included. filled tells whether renders replace it, which
+    they do for the paragraphs of the template's placeholder index.
+    """
+    paragraphs = template.paragraphs
+    # The set keeps these element proxies alive, so iterating returns the same objects
+    indexed = {paragraphs[location.part][location.paragraph] for location in template.locations}
+    main_part = str(template.document.part.partname)
+    placeholders = []
+    for part, root in template_cache.story_roots(template.document).items():
+        name = "body" if part == main_part else os.path.splitext(os.path.basename(part))[0]
+        for p, location in _story_paragraphs(name, root):
+            text = "".join(p.xpath(_TEXT_XPATH))
+            for field in PLACEHOLDER_PATTERN.findall(text):
+                placeholders.append(Placeholder(field, location, p in indexed))
+    return placeholders
+
+
+def suggestion(field, known):
+    """Return a hint for a placeholder of a field the records do not provide"""
+    outputs = FIELD_DERIVATIONS.get(field)
+    if outputs:
+        return f"{field} is a record input, use " + " or ".join(f"[[{name}]]" for name in outputs)
+    matches = difflib.get_close_matches(field, known, n=1)
+    if matches:
+        return f"did you mean [[{matches[0]}]]?"
+    return "no record field of that name"
+
+
+def lint(placeholders, known=None):
+    """Return (unknown, unfilled, unused) for a template's placeholders
+
+    unknown and unfilled are lists of Placeholders, unused the record fields
+    no placeholder refers to.
+    """
+    known = template_fields() if known is None else known
+    known_set = set(known)
+    unknown = [placeholder for placeholder in placeholders if placeholder.field not in known_set]
+    unfilled = [placeholder for placeholder in placeholders if not placeholder.filled]
+    used = {placeholder.field for placeholder in placeholders}
+    return unknown, unfilled, [name for name in known if name not in used]
+
+
+def load_source(path):
+    """Parse and index the template at path, bypassing the cache and any artifact"""
+    with open(path, "rb") as f:
+        data = f.read()
+    stat = os.stat(path)
+    document = docx.Document(io.BytesIO(data))
+    return template_cache.CompiledTemplate(
+        os.path.abspath(path), document, hashlib.sha256(data).hexdigest(), stat.st_mtime_ns, stat.st_size,
+    )
+
+
+def normalize_placeholders(template):
+    """Move each placeholder of the indexed paragraphs into the run where it starts, in place
+
+    Word splits a placeholder over several runs when it was edited in
+    pieces; substituting every placeholder with itself joins it up, so
+    renders of the precompiled template find it in one w:t.
+    """
+    paragraphs = template.paragraphs
+    for location in template.locations:
+        substitute_paragraph(
+            paragraphs[location.part][location.paragraph], {name: f"[[{name}]]" for name in location.fields}
+        )
+
+
+def compile_template(path, check=False, file=sys.stdout):
+    """Lint the template at path and, unless check, write its artifact; return the problems found"""
+    template = load_source(path)
+    placeholders = scan_placeholders(template)
+    known = template_fields()
+    unknown, unfilled, unused = lint(placeholders, known)
+
+    print(f"{path}: {len(placeholders)} placeholders of {len({p.field for p in placeholders})} fields", file=file)
+    for placeholder in placeholders:
+        print(f"  [[{placeholder.field}]]  {placeholder.location}", file=file)
+    if unknown:
+        print("Unknown fields, left in the agreement as they are:", file=file)
+        for placeholder in unknown:
+            print(f"  [[{placeholder.field}]]  {placeholder.location}: {suggestion(placeholder.field, known)}",
+                  file=file)
+    if unfilled:
+        print("Placeholders renders do not fill in:", file=file)
+        for placeholder in unfilled:
+            print(f"  [[{placeholder.field}]]  {placeholder.location}", file=file)
+    if unused:
+        print(f"Record fields not used: {', '.join(unused)}", file=file)
+
+    if not check:
+        start = time.perf_counter()
+        normalize_placeholders(template)
+        output = path + template_cache.ARTIFACT_SUFFIX
+        template.save_compiled(extra={"source": os.path.basename(path)})
+        print(f"Compiled to {output} ({os.path.getsize(output) / 1024:.0f} KB) "
+              f"in {(time.perf_counter() - start) * 1000:.0f} ms", file=file)
+    return len(unknown) + len(unfilled)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lint and precompile agreement templates")
+    parser.add_argument("templates", nargs="+", help=".docx templates")
+    parser.add_argument("--check", action="store_true",
+                        help=f"only lint, without writing the {template_cache.ARTIFACT_SUFFIX} artifact "
+                             f"next to each template")
+    args = parser.parse_args(argv)
+
+    problems = 0
+    for path in args.templates:
+        try:
+            problems += compile_template(path, args.check)
+        except Exception as e:
+            print(f"{path}: {type(e).__name__}: {e}", file=sys.stderr)
+            problems += 1
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+"""Registry of the lease templates of every society and format.
+
+A TemplateRegistry watches a directory of .docx templates, preloads them into
+template_cache (optionally on a background thread) and picks the template
+for a lease by its society and property type.
+
+Templates are matched through an optional ``templates.json`` manifest in the
+directory::
+
+    [
+        {"file": "gupta_residency.docx", "society": "Gupta Residency"},
+        {"file": "gupta_residency_villa.docx", "society": "Gupta Residency", "property_type": "Villa"},
+        {"file": "standard.docx", "default": true}
+    ]
+
+and otherwise by file name: ``<society>__<property type>.docx``,
+``<society>.docx`` and ``default.docx``, with names compared in lower case
+with runs of other characters turned into ``_`` (``gupta_residency.docx``).
+A manifest that cannot be read is reported in stats()["errors"] and the
+templates keep being selected by the rules read before it broke.
+
+Styles, numbering, fonts, themes and the other parts a render never writes
+to are identical across most templates of a firm, so parts with the same
+content are shared between the loaded templates instead of being held once
+per template. The registry rescans the directory at most every
+reload_interval seconds when a template is selected, so new, changed and
+removed templates are picked up without restarting the app.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import weakref
+
+import metrics
+import template_cache
+
+MANIFEST = "templates.json"
+DEFAULT_STEM = "default"
+
+
+def slug(text):
+    return re.sub(r"[^a-z0-9]+", "_", str(text).lower()).strip("_")
+
+
+class TemplateRegistry:
+    """The templates in a directory, selectable by society and property type"""
+
+    def __init__(self, directory, reload_interval=5.0, share_parts=True):
+        self.directory = directory
+        self.reload_interval = reload_interval
+        self.share_parts = share_parts
+        self.load_seconds = 0.0
+        self.rss_before = 0
+        self.rss_after = 0
+        self._lock = threading.RLock()
+        self._rules = []
+        self._paths = ()
+        self._signature = None
+        self._checked = 0.0
+        self._shared = {}
+        self._shared_templates = weakref.WeakSet()
+        self._shared_parts = 0
+        self._errors = {}
+        self._ready = threading.Event()
+
+    def preload(self, background=False):
+        """Parse every template now, or on a daemon thread with background=True"""
+        if background:
+            thread = threading.Thread(target=self.preload, name="template-preload", daemon=True)
+            thread.start()
+            return thread
+        start = time.perf_counter()
+        self.rss_before = metrics.max_rss_bytes()
+        with metrics.stage("registry_preload"):
+            self.refresh(force=True)
+        self.load_seconds = time.perf_counter() - start
+        self.rss_after = metrics.max_rss_bytes()
+        self._ready.set()
+
+    def wait_ready(self, timeout=None):
+        """Wait for a background preload to finish; return False on timeout"""
+        return self._ready.wait(timeout)
+
+    def refresh(self, force=False):
+        """Rescan the directory and (re)load the templates that are new or changed"""
+        now = time.monotonic()
+        if not force and now - self._checked < self.reload_interval:
+            return
+        with self._lock:
+            self._checked = now
+            signature = self._scan_signature()
+            changed = signature != self._signature
+            if changed:
+                self._signature = signature
+                manifest_path = os.path.join(self.directory, MANIFEST)
+                try:
+                    rules = self._read_rules()
+                except (OSError, ValueError) as e:
+                    # Keep selecting with the previous rules until the manifest is fixed
+                    self._errors[manifest_path] = f"{type(e).__name__}: {e}"
+                else:
+                    self._errors.pop(manifest_path, None)
+                    self._rules = rules
+                    self._paths = tuple(sorted({rule[2] for rule in rules}))
+                    for path in list(self._errors):
+                        if path != manifest_path and path not in self._paths:
+                            del self._errors[path]
+            for path in self._paths:
+                self._load(path)
+            if changed and self.share_parts:
+                self._prune_shared()
+
+    def select(self, society=None, property_type=None):
+        """Return the template path for a lease, or None when nothing matches
+
+        The most specific match wins: society and property type, then
+        society, then property type, then the default template.
+        """
+        self.refresh()
+        society = slug(society) if society else None
+        property_type = slug(property_type) if property_type else None
+        with self._lock:
+            best = None
+            for rule_society, rule_type, path in self._rules:
+                if rule_society is not None and rule_society != society:
+                    continue
+                if rule_type is not None and rule_type != property_type:
+                    continue
+                score = (rule_society is not None) * 2 + (rule_type is not None)
+                if best is None or score > best[0]:
+                    best = (score, path)
+            return best[1] if best else None
+
+    def templates(self):
+        """Return the paths of the registered templates"""
+        with self._lock:
+            return list(self._paths)
+
+    def stats(self):
+        """Return the template count, preload time, shared parts and memory use"""
+        with self._lock:
+            return {
+                "templates": len(self._paths),
+                "errors": dict(self._errors),
+                "load_seconds": self.load_seconds,
+                "shared_parts": self._shared_parts,
+                "rss_bytes": self.rss_after or metrics.max_rss_bytes(),
+                "rss_growth_bytes": max(0, self.rss_after - self.rss_before),
+            }
+
+    def _scan_signature(self):
+        try:
+            entries = os.scandir(self.directory)
+        except FileNotFoundError:
+            return ()
+        with entries:
+            return tuple(sorted(
+                (entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+                for entry in entries
+                if entry.name.endswith(".docx") or entry.name == MANIFEST
+            ))
+
+    def _read_rules(self):
+        """Return (society slug, property type slug, path) for every template"""
+        manifest_path = os.path.join(self.directory, MANIFEST)
+        rules = []
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding="utf-8") as f:
+                entries = json.load(f)
+            if not isinstance(entries, list):
+                raise ValueError(f"{MANIFEST} must be a list of templates")
+            for entry in entries:
+                if not isinstance(entry, dict) or not isinstance(entry.get("file"), str):
+                    raise ValueError(f"{MANIFEST} entry without a \"file\": {entry!r}")
+                path = os.path.join(self.directory, entry["file"])
+                if entry.get("default"):
+                    rules.append((None, None, path))
+                else:
+                    society = entry.get("society")
+                    property_type = entry.get("property_type")
+                    rules.append((slug(society) if society else None,
+                                  slug(property_type) if property_type else None, path))
+            return rules
+
+        for name, _, _ in self._scan_signature():
+            if not name.endswith(".docx") or name.startswith("~$"):
+                continue
+            stem = slug(name[:-len(".docx")])
+            path = os.path.join(self.directory, name)
+            if stem == DEFAULT_STEM:
+                rules.append((None, None, path))
+            elif "__" in name:
+                society, _, property_type = name[:-len(".docx")].partition("__")
+                rules.append((slug(society), slug(property_type), path))
+            else:
+                rules.append((stem, None, path))
+        return rules
+
+    def _load(self, path):
+        try:
+            template = template_cache.load_template(path)
+        except Exception as e:
+            self._errors[path] = f"{type(e).__name__}: {e}"
+            return
+        self._errors.pop(path, None)
+        if self.share_parts and template not in self._shared_templates:
+            self._share_parts(template)
+            self._shared_templates.add(template)
+
+    def _prune_shared(self):
+        """Rebuild the shared parts and their count from the registered templates
+
+        Parts of removed or replaced templates are dropped, so those templates
+        can be freed; a part other templates share stays, held by one of them.
+        """
+        shared = {}
+        shared_parts = 0
+        for path in self._paths:
+            if path in self._errors:
+                continue
+            try:
+                template = template_cache.load_template(path)
+            except Exception:
+                continue
+            for part in template.document.part.package.iter_parts():
+                if part.content_type in template_cache.STORY_CONTENT_TYPES:
+                    continue
+                canonical = shared.setdefault((part.content_type, hashlib.sha256(part.blob).digest()), part)
+                if canonical is not part and _same_content_object(part, canonical):
+                    shared_parts += 1
+        self._shared = shared
+        self._shared_parts = shared_parts
+
+    def _share_parts(self, template):
+        """Point the template's read-only parts at identical parts of other templates"""
+        for part in template.document.part.package.iter_parts():
+            if part.content_type in template_cache.STORY_CONTENT_TYPES:
+                continue
+            blob = part.blob
+            key = (part.content_type, hashlib.sha256(blob).digest())
+            shared = self._shared.get(key)
+            if shared is None:
+                self._shared[key] = part
+                continue
+            if shared is part:
+                continue
+            if hasattr(part, "_element"):
+                part._element = shared._element
+            else:
+                part._blob = shared._blob
+            self._shared_parts += 1
+
+
+def _same_content_object(part, other):
+    """Return whether part holds the very element or blob of other, as _share_parts() leaves it"""
+    if hasattr(part, "_element"):
+        return part._element is getattr(other, "_element", None)
+    return part._blob is getattr(other, "_blob", None)
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(directory, background=True):
+    """Return the process-wide registry for directory, preloading it on first use"""
+    key = os.path.abspath(directory)
+    with _registries_lock:
+        registry = _registries.get(key)
+        if registry is None:
+            registry = _registries[key] = TemplateRegistry(directory)
+            registry.preload(background=background)
+        return registry
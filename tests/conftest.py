@@ -0,0 +1,41 @@
+from datetime import date
+
+import pytest
+
+RECORD = {
+    "execution_date": date(2025, 5, 1),
+    "lessor_name": "Amit Gupta",
+    "lessor_father_name": "R. K. Gupta",
+    "lessor_address": "B-12, Sector 62, Noida",
+    "lessee_name": "Rahul Sharma",
+    "lessee_father_name": "S. Sharma",
+    "lessee_address": "Flat 4, Karol Bagh, New Delhi 110005",
+    "rent_amount": 43000,
+    "security_deposit": 86000,
+    "payment_due_day": 5,
+    "rent_increase_percentage": 10,
+    "lease_start": date(2025, 5, 1),
+    "lease_end": date(2026, 3, 31),
+    "lease_period_months": 11,
+    "notice_period_months": "two",
+    "apartment_unit_no": "1204",
+    "tower_no": "T5",
+    "property_name": "Gupta Residency",
+    "property_sector": "62",
+    "property_location": "Noida, UP",
+    "property_type": "3 BHK + Study",
+    "car_parks": 2,
+}
+
+
+@pytest.fixture
+def record():
+    """A complete, valid lease record"""
+    return dict(RECORD)
+
+
+@pytest.fixture
+def field_values(record):
+    from lease_record import build_field_values
+
+    return build_field_values(record)
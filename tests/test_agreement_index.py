@@ -0,0 +1,36 @@
+import os
+
+import agreement_index
+from agreement_index import AgreementIndex
+
+
+def test_index_is_opt_in(monkeypatch, tmp_path):
+    monkeypatch.delenv(agreement_index.ENV_DIR, raising=False)
+    monkeypatch.chdir(tmp_path)
+    assert agreement_index.from_env() is None
+    assert os.listdir(tmp_path) == []
+
+    monkeypatch.setenv(agreement_index.ENV_DIR, str(tmp_path / "index"))
+    index = agreement_index.from_env()
+    assert index is agreement_index.from_env()
+    assert index.directory == str(tmp_path / "index")
+
+
+def test_read_returns_none_for_missing_or_damaged_documents(record, tmp_path):
+    index = AgreementIndex(str(tmp_path))
+    try:
+        kept, damaged, removed = (
+            index.add(f"key-{n}", dict(record, lessee_name=name), data, None, "draft", "test")
+            for n, (name, data) in enumerate((("Kept", b"kept"), ("Damaged", b"damaged"), ("Removed", b"removed")))
+        )
+        entries = {entry["id"]: entry for entry in index.search(limit=10)}
+        with open(os.path.join(index.directory, entries[damaged]["output"]), "wb") as f:
+            f.write(b"changed")
+        os.remove(os.path.join(index.directory, entries[removed]["output"]))
+
+        assert index.read(kept) == b"kept"
+        assert index.read(damaged) is None
+        assert index.read(removed) is None
+        assert index.read(max(entries) + 1) is None
+    finally:
+        index.close()
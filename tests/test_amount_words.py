@@ -0,0 +1,45 @@
+import pytest
+
+from amount_words import indian_number_words, rupees_in_words, rupees_in_words_batch
+
+
+@pytest.mark.parametrize("amount, words", [
+    (0, "Rupees Zero only"),
+    (7, "Rupees Seven only"),
+    (99_999, "Rupees Ninety Nine Thousand Nine Hundred And Ninety Nine only"),
+    (1_00_000, "Rupees One Lakh only"),
+    (4_30_000, "Rupees Four Lakh Thirty Thousand only"),
+    (99_99_999, "Rupees Ninety Nine Lakh Ninety Nine Thousand Nine Hundred And Ninety Nine only"),
+    (1_00_00_000, "Rupees One Crore only"),
+    (1_00_00_001, "Rupees One Crore And One only"),
+    (2_00_00_000, "Rupees Two Crore only"),
+    (1_23_45_678, "Rupees One Crore Twenty Three Lakh Forty Five Thousand Six Hundred And Seventy Eight only"),
+    (12_34_56_789, "Rupees Twelve Crore Thirty Four Lakh Fifty Six Thousand Seven Hundred And Eighty Nine only"),
+    (3_05_00_00_000, "Rupees Three Hundred And Five Crore only"),
+    (-500, "Rupees Minus Five Hundred only"),
+])
+def test_rupees_in_words(amount, words):
+    assert rupees_in_words(amount) == words
+
+
+def test_whole_float_amounts_are_accepted():
+    assert rupees_in_words(43000.0) == "Rupees Forty Three Thousand only"
+
+
+def test_fractional_amounts_are_rejected():
+    with pytest.raises(ValueError):
+        rupees_in_words(10.5)
+
+
+def test_matches_inflect_below_one_lakh():
+    inflect = pytest.importorskip("inflect")
+    engine = inflect.engine()
+    for number in (*range(1, 1200), 10_001, 43_000, 56_789, 99_000):
+        words = engine.number_to_words(number).replace(",", "").replace("-", " ")
+        assert indian_number_words(number) == " ".join(word.capitalize() for word in words.split())
+
+
+def test_batch_matches_single_amounts():
+    numpy = pytest.importorskip("numpy")
+    amounts = numpy.array([1_00_000, 0, 1_23_45_678, 1_00_000])
+    assert rupees_in_words_batch(amounts) == [rupees_in_words(int(amount)) for amount in amounts]
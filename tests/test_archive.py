@@ -0,0 +1,84 @@
+import io
+import os
+import tracemalloc
+import zipfile
+
+import pytest
+
+from archive_writer import ArchiveWriter, compress_entry
+from batch_generate import run_batch
+
+
+class Sink(io.RawIOBase):
+    """A write-only, unseekable stream that keeps only the bytes' count"""
+
+    def __init__(self):
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.size += len(data)
+        return len(data)
+
+
+def peak_traced_bytes(work):
+    tracemalloc.start()
+    try:
+        work()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.parametrize("threads", [0, 2])
+def test_archive_memory_does_not_grow_with_entries(threads):
+    def write(count):
+        with ArchiveWriter(Sink(), level=1, threads=threads) as archive:
+            for n in range(count):
+                archive.write(f"agreement-{n}.docx", os.urandom(64 * 1024))
+
+    small = peak_traced_bytes(lambda: write(10))
+    large = peak_traced_bytes(lambda: write(200))
+    # Holding the extra entries would take 12 MB
+    assert large - small < 1024 * 1024
+
+
+def test_precompressed_entries_keep_their_place_among_pending_ones():
+    buffer = io.BytesIO()
+    with ArchiveWriter(buffer, level=6, threads=2) as archive:
+        archive.write("first.txt", b"first" * 100)
+        data = "प्रथम".encode("utf-8") * 100
+        archive.write_compressed("दूसरा.txt", len(data), *compress_entry(data, 9))
+        archive.write("third.txt", b"third")
+    with zipfile.ZipFile(buffer) as package:
+        assert package.namelist() == ["first.txt", "दूसरा.txt", "third.txt"]
+        assert package.read("दूसरा.txt") == data
+        assert package.testzip() is None
+    assert archive.stats()["bytes_in"] == 505 + len(data)
+
+
+def test_batch_memory_does_not_grow_with_records(record):
+    def records(count):
+        for n in range(count):
+            yield dict(record, lessee_name=f"Lessee {n}", rent_amount=20000 + n)
+
+    def batch(count):
+        summary = run_batch(records(count), Sink(), workers=1, chunk_size=4, engine="ooxml")
+        assert summary["written"] == count and summary["failed"] == 0
+
+    small = peak_traced_bytes(lambda: batch(8))
+    large = peak_traced_bytes(lambda: batch(80))
+    # Holding the extra documents would take over 2 MB
+    assert large - small < 512 * 1024
+
+
+def test_batch_writes_a_valid_archive(record, tmp_path):
+    output = str(tmp_path / "agreements.zip")
+    records = [dict(record, lessee_name=f"Lessee {n}") for n in range(5)]
+    summary = run_batch(records, output, workers=1, engine="ooxml", compression_threads=2)
+    assert summary["written"] == 5
+    with zipfile.ZipFile(output) as archive:
+        assert len(archive.namelist()) == 5
+        assert archive.testzip() is None
@@ -0,0 +1,15 @@
+import pytest
+
+from batch_generate import normalize_record, with_payment_schedule
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, True), ("", True), (True, True), ("yes", True), (False, False), (0, False), ("0", False), ("no", False),
+])
+def test_default_payment_schedule_keeps_the_row_value(record, value, expected):
+    row = dict(record, payment_schedule=value)
+    assert bool(normalize_record(next(with_payment_schedule([row])))["payment_schedule"]) is expected
+
+
+def test_default_payment_schedule_for_rows_without_the_column(record):
+    assert normalize_record(next(with_payment_schedule([record])))["payment_schedule"] is True
@@ -0,0 +1,117 @@
+import io
+
+import docx
+import pytest
+from docx.oxml.ns import qn
+
+import compact_docx
+import template_cache
+from lease_record import build_field_values
+from rent_agreement_generator import create_document_from_draft, render_draft_bytes
+
+
+def saved(doc):
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def template_document(field_values):
+    """A small template with a header, a footer, a table, a list and a character style"""
+    doc = docx.Document()
+    doc.sections[0].header.paragraphs[0].text = "Lease of [[apartment_unit_no]], [[tower_no]]"
+    doc.sections[0].footer.paragraphs[0].text = "Page footer"
+    doc.add_heading("Rent Agreement", level=1)
+    paragraph = doc.add_paragraph("Between ", style="List Number")
+    paragraph.add_run("[[lessor_name]]", style="Strong")
+    doc.add_paragraph("and [[lessee_name]]", style="List Bullet")
+    table = doc.add_table(rows=2, cols=2, style="Table Grid")
+    table.cell(0, 0).text = "Rent"
+    table.cell(0, 1).text = "[[rent_amount_numeric]]"
+    table.cell(1, 0).text = "Deposit"
+    table.cell(1, 1).text = "[[security_deposit_numeric]]"
+    template = template_cache.CompiledTemplate("test", docx.Document(io.BytesIO(saved(doc))), "test", 0, 0)
+    return saved(template.render(field_values))
+
+
+def photo(width, height, seed):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    image = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    image.paste((seed * 40 % 256, 0, 0), (0, 0, width // 4, height // 4))
+    image.save(buffer, "JPEG", quality=92)
+    return buffer.getvalue()
+
+
+def story_contents(doc):
+    """The text, paragraph style and run styles of every paragraph of every story part, by part"""
+    styles = {style.style_id: style.name for style in doc.styles}
+    return {
+        part: [(
+            "".join(p.xpath(".//w:t/text()")),
+            styles.get(p.style, p.style) if p.style else None,
+            [styles.get(r.style, r.style) for r in p.iter(qn("w:r")) if r.style],
+        ) for p in root.iter(qn("w:p"))]
+        for part, root in template_cache.story_roots(doc).items()
+    }
+
+
+def missing_definitions(doc):
+    """The style ids and numIds story parts refer to that the document does not define"""
+    style_ids = {style.style_id for style in doc.styles}
+    try:
+        numbering = doc.part.numbering_part.element
+    except NotImplementedError:
+        numbering = None
+    num_ids = {num.get(qn("w:numId")) for num in numbering.iter(qn("w:num"))} if numbering is not None else set()
+    missing = set()
+    for root in template_cache.story_roots(doc).values():
+        for reference in root.iter(qn("w:pStyle"), qn("w:rStyle"), qn("w:tblStyle")):
+            if reference.get(qn("w:val")) not in style_ids:
+                missing.add(("style", reference.get(qn("w:val"))))
+        for reference in root.iter(qn("w:numId")):
+            if reference.get(qn("w:val")) not in num_ids | {"0"}:
+                missing.add(("num", reference.get(qn("w:val"))))
+    return missing
+
+
+DOCUMENTS = {
+    "draft, python-docx": lambda field_values: saved(create_document_from_draft(field_values)),
+    "draft, ooxml": render_draft_bytes,
+    "template": template_document,
+}
+
+
+@pytest.mark.parametrize("name", sorted(DOCUMENTS))
+def test_compacted_document_keeps_text_and_styles(record, name):
+    data = DOCUMENTS[name](build_field_values(dict(record, payment_schedule=True)))
+    compacted, report = compact_docx.compact(data)
+    original, doc = docx.Document(io.BytesIO(data)), docx.Document(io.BytesIO(compacted))
+
+    assert story_contents(doc) == story_contents(original)
+    assert missing_definitions(doc) == set()
+    assert report["bytes_before"] == len(data) and report["bytes_after"] == len(compacted)
+    assert len(compacted) < len(data)
+    assert report["styles_removed"] > 0
+
+
+def test_compact_is_stable(field_values):
+    compacted, _ = compact_docx.compact(render_draft_bytes(field_values))
+    again, report = compact_docx.compact(compacted)
+    assert story_contents(docx.Document(io.BytesIO(again))) == story_contents(docx.Document(io.BytesIO(compacted)))
+    assert report["styles_removed"] == 0 and report["parts_removed"] == []
+
+
+def test_photos_are_downsampled(record):
+    pytest.importorskip("PIL")
+    inventory = [{"item": f"Sofa {n}", "description": "3 seater", "notes": "", "photo": photo(1600, 1200, n)}
+                 for n in range(2)]
+    data = saved(create_document_from_draft(build_field_values(dict(record, inventory=inventory))))
+    compacted, report = compact_docx.compact(data, image_dpi=96)
+    original, doc = docx.Document(io.BytesIO(data)), docx.Document(io.BytesIO(compacted))
+
+    assert report["images_downsampled"] == 2
+    assert len(doc.inline_shapes) == len(original.inline_shapes) == 2
+    assert story_contents(doc) == story_contents(original)
+    assert len(compacted) < len(compact_docx.compact(data)[0])
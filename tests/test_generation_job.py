@@ -0,0 +1,49 @@
+import io
+import logging
+import time
+
+import docx
+
+import jobs
+from rent_agreement_generator import generation_job
+
+
+def finished(job, timeout=30):
+    deadline = time.monotonic() + timeout
+    while job.active and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return job
+
+
+def test_job_reports_a_missing_template_in_its_result(field_values, tmp_path, caplog):
+    queue = jobs.JobQueue(workers=1)
+    try:
+        with caplog.at_level(logging.WARNING):
+            job = finished(queue.submit(
+                "missing", generation_job(str(tmp_path / "missing.docx"), field_values, "python-docx", False,
+                                          previous_renders={}),
+            ))
+    finally:
+        queue.shutdown()
+    assert job.state == jobs.DONE, job.error
+    assert job.result["warning"].startswith("Template file not found")
+    assert "Rahul Sharma" in "\n".join(p.text for p in docx.Document(io.BytesIO(job.result["docx"])).paragraphs)
+    # Streamlit calls from the job thread would log a missing ScriptRunContext
+    assert "ScriptRunContext" not in caplog.text
+
+
+def test_job_with_a_template_has_no_warning(field_values, tmp_path):
+    template = str(tmp_path / "template.docx")
+    doc = docx.Document()
+    doc.add_paragraph("Between [[lessor_name]] and [[lessee_name]]")
+    doc.save(template)
+    queue = jobs.JobQueue(workers=1)
+    try:
+        job = finished(queue.submit("template", generation_job(template, field_values, "ooxml", False)))
+    finally:
+        queue.shutdown()
+    assert job.state == jobs.DONE, job.error
+    assert job.result["warning"] is None
+    assert [p.text for p in docx.Document(io.BytesIO(job.result["docx"])).paragraphs] == [
+        "Between Amit Gupta and Rahul Sharma"
+    ]
@@ -0,0 +1,24 @@
+import io
+
+import docx
+
+from lease_record import build_field_values
+from rent_agreement_generator import render_agreement_bytes
+
+
+def paragraphs(data):
+    return [paragraph.text for paragraph in docx.Document(io.BytesIO(data)).paragraphs]
+
+
+def test_sessions_patch_their_own_previous_render(record, tmp_path):
+    missing = str(tmp_path / "missing.docx")
+    first, second = {}, {}
+    render_agreement_bytes(missing, build_field_values(record), previous_renders=first)
+    render_agreement_bytes(
+        missing, build_field_values(dict(record, lessee_name="Priya Verma", rent_amount=51000)), previous_renders=second
+    )
+    edited = build_field_values(dict(record, tower_no="T9"))
+    patched = render_agreement_bytes(missing, edited, previous_renders=first)
+    assert paragraphs(patched) == paragraphs(render_agreement_bytes(missing, edited))
+    assert first[None].field_values == edited
+    assert second[None].field_values["lessee_name"] == "Priya Verma"
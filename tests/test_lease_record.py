@@ -0,0 +1,38 @@
+from datetime import date
+
+import pytest
+
+from lease_record import LeaseRecord, build_field_values
+
+INVENTORY = [
+    {"item": "Sofa", "description": "3 seater", "notes": "Left arm stained"},
+    {"item": "Bed", "description": "King size", "notes": ""},
+]
+
+
+@pytest.mark.parametrize("day, expected", [
+    (date(2025, 5, 1), "1st May 2025"), (date(2025, 5, 2), "2nd May 2025"), (date(2025, 5, 3), "3rd May 2025"),
+    (date(2025, 5, 11), "11th May 2025"), (date(2025, 5, 12), "12th May 2025"), (date(2025, 5, 13), "13th May 2025"),
+    (date(2025, 5, 22), "22nd May 2025"), (date(2025, 5, 31), "31st May 2025"),
+])
+def test_format_date_with_suffix(day, expected):
+    # Still importable from the app, where it used to live
+    from rent_agreement_generator import format_date_with_suffix
+
+    assert format_date_with_suffix(day) == expected
+
+
+def test_inventory_is_held_immutably(record):
+    inventory = [dict(entry) for entry in INVENTORY]
+    lease = LeaseRecord.from_dict(dict(record, inventory=inventory))
+    inventory[0]["notes"] = "changed"
+    inventory.append({"item": "Table"})
+
+    assert lease.inventory == (
+        (("item", "Sofa"), ("description", "3 seater"), ("notes", "Left arm stained")),
+        (("item", "Bed"), ("description", "King size"), ("notes", "")),
+    )
+    assert hash(lease) == hash(LeaseRecord.from_dict(dict(record, inventory=INVENTORY)))
+    assert lease.to_dict()["inventory"] == INVENTORY
+    assert lease.to_field_values()["inventory"] == INVENTORY
+    assert build_field_values(dict(record, inventory=INVENTORY))["inventory"] == INVENTORY
@@ -0,0 +1,77 @@
+import os
+import threading
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture(autouse=True)
+def disabled_afterwards():
+    yield
+    metrics.disable()
+    metrics.reset()
+
+
+def test_concurrent_prometheus_exports(tmp_path):
+    path = tmp_path / "metrics.prom"
+    sink = metrics.PrometheusFileSink(str(path))
+    metrics.enable(sink)
+    metrics.count("documents")
+    errors = []
+
+    def export():
+        try:
+            for _ in range(200):
+                sink.export(metrics.snapshot())
+                metrics.flush()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=export) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert "rent_agreement_documents_total 1" in path.read_text()
+    assert os.listdir(tmp_path) == ["metrics.prom"]
+    assert path.stat().st_mode & 0o777 == 0o644
+
+
+def test_flush_survives_a_failing_sink(tmp_path, caplog):
+    blocked = tmp_path / "file"
+    blocked.write_text("")
+    metrics.enable(metrics.PrometheusFileSink(str(blocked / "metrics.prom")))
+    metrics.flush()
+    assert "Could not export metrics" in caplog.text
+
+
+def test_stages_on_other_threads_do_not_nest():
+    metrics.enable(metrics.Sink(), trace_memory=True)
+    a_open, b_open, a_closed = threading.Event(), threading.Event(), threading.Event()
+
+    def a():
+        with metrics.stage("a"):
+            data = bytearray(2_000_000)
+            a_open.set()
+            b_open.wait()
+            del data
+        a_closed.set()
+
+    def b():
+        a_open.wait()
+        with metrics.stage("b"):
+            b_open.set()
+            a_closed.wait()
+
+    threads = [threading.Thread(target=a), threading.Thread(target=b)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stages = metrics.snapshot()["stages"]
+    # a closes while b is open on the other thread; it still measures its own allocation
+    assert stages["a"]["peak_bytes"] >= 2_000_000
+    assert stages["a"]["count"] == stages["b"]["count"] == 1
+    assert metrics._memory_stack() == []
@@ -0,0 +1,154 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import pdf_conversion
+from pdf_conversion import ConversionQueueFull, PdfConversionError, PdfConverterPool, SofficeWorker
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="the stub soffice is a POSIX script")
+
+# Stands in for `soffice --convert-to pdf --outdir DIR FILE`. The document's
+# bytes say what to do: "fail" exits with status 3, "slow" takes half a second
+# and "hang" starts a child that sleeps, records its pid and never returns.
+STUB_SOFFICE = f"""#!{sys.executable}
+import os, subprocess, sys, time
+outdir = sys.argv[sys.argv.index("--outdir") + 1]
+source = sys.argv[-1]
+data = open(source, "rb").read()
+if b"fail" in data:
+    sys.exit(3)
+if b"hang" in data:
+    child = subprocess.Popen(["sleep", "60"])
+    with open(os.path.join(os.path.dirname(outdir), "child.pid"), "w") as f:
+        f.write(str(child.pid))
+    time.sleep(60)
+if b"slow" in data:
+    time.sleep(0.5)
+name = os.path.splitext(os.path.basename(source))[0] + ".pdf"
+with open(os.path.join(outdir, name), "wb") as f:
+    f.write(b"%PDF-stub " + data)
+"""
+
+
+@pytest.fixture
+def soffice(tmp_path, monkeypatch):
+    # Convert with --convert-to, whether or not LibreOffice's uno is installed
+    monkeypatch.setattr(pdf_conversion, "uno", None)
+    path = tmp_path / "soffice"
+    path.write_text(STUB_SOFFICE)
+    path.chmod(0o755)
+    return str(path)
+
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    # A killed child the stub never reaped is a zombie until the stub's own exit
+    with open(f"/proc/{pid}/stat") as f:
+        return f.read().split(")")[-1].split()[0] != "Z"
+
+
+def test_converts_and_reports_conversion_time_apart_from_queue_wait(soffice):
+    pool = PdfConverterPool(workers=1, max_queue=4, timeout=10, soffice=soffice)
+    try:
+        futures = [pool.submit(b"slow document %d" % n) for n in range(3)]
+        assert [future.result(timeout=30) for future in futures] == [
+            b"%%PDF-stub slow document %d" % n for n in range(3)
+        ]
+        stats = pool.stats()
+    finally:
+        pool.shutdown()
+    assert stats["conversions"] == 3 and stats["failures"] == 0
+    # The last job waited for the two before it
+    assert stats["p99_ms"] >= 1000
+    assert 400 <= stats["convert_p50_ms"] < stats["p99_ms"]
+
+
+def test_failed_conversion_is_reported(soffice):
+    pool = PdfConverterPool(workers=1, timeout=10, soffice=soffice)
+    try:
+        with pytest.raises(PdfConversionError, match="status 3"):
+            pool.convert(b"fail")
+        assert pool.convert(b"fine") == b"%PDF-stub fine"
+        assert pool.stats()["failures"] == 1
+    finally:
+        pool.shutdown()
+
+
+def test_timeout_kills_the_conversion_and_its_children(soffice, tmp_path):
+    pool = PdfConverterPool(workers=1, timeout=1, soffice=soffice)
+    try:
+        started = time.monotonic()
+        with pytest.raises(PdfConversionError, match="timed out"):
+            pool.convert(b"hang")
+        assert time.monotonic() - started < 10
+        with open(os.path.join(pool._workdir, "child.pid")) as f:
+            child = int(f.read())
+        deadline = time.monotonic() + 5
+        while alive(child) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert not alive(child)
+        # The worker carries on with the next job
+        assert pool.convert(b"next") == b"%PDF-stub next"
+    finally:
+        pool.shutdown()
+
+
+def test_queue_full_is_refused(soffice):
+    pool = PdfConverterPool(workers=1, max_queue=1, timeout=10, soffice=soffice)
+    try:
+        running = pool.submit(b"slow")
+        deadline = time.monotonic() + 5
+        while pool.stats()["queued"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        queued = pool.submit(b"slow")
+        with pytest.raises(ConversionQueueFull):
+            pool.submit(b"one too many")
+        assert running.result(timeout=10) == b"%PDF-stub slow"
+        assert queued.result(timeout=10) == b"%PDF-stub slow"
+    finally:
+        pool.shutdown()
+
+
+class HangingDesktop:
+    """A UNO desktop whose document load blocks until its process is killed"""
+
+    def __init__(self, process):
+        self.process = process
+
+    def loadComponentFromURL(self, *args):
+        self.process.wait()
+        raise RuntimeError("Binary URP bridge disposed")
+
+
+def test_uno_watchdog_stops_a_stuck_process(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_conversion, "uno", object())
+    monkeypatch.setattr(pdf_conversion, "_uno_property", lambda name, value: (name, value))
+    worker = SofficeWorker("soffice", str(tmp_path), 0)
+    worker.process = subprocess.Popen(["sleep", "60"], start_new_session=True)
+    worker.desktop = HangingDesktop(worker.process)
+    started = time.monotonic()
+    with pytest.raises(PdfConversionError, match="timed out"):
+        worker.convert(str(tmp_path / "a.docx"), str(tmp_path / "a.pdf"), timeout=0.5)
+    assert time.monotonic() - started < 5
+    assert worker.process is None and worker.desktop is None
+
+
+def test_cold_pool_warns_once_and_reports_its_mode(soffice, monkeypatch, caplog):
+    monkeypatch.setattr(pdf_conversion, "_cold_warned", False)
+    pools = []
+    try:
+        with caplog.at_level("WARNING", logger="rent_agreement.pdf"):
+            pools = [PdfConverterPool(workers=1, soffice=soffice) for _ in range(2)]
+        assert [pool.stats()["mode"] for pool in pools] == [pdf_conversion.COLD] * 2
+        assert pools[0].convert(b"fine") == b"%PDF-stub fine"
+    finally:
+        for pool in pools:
+            pool.shutdown()
+    warnings = [r for r in caplog.records if r.name == "rent_agreement.pdf"]
+    assert len(warnings) == 1 and "python3-uno" in warnings[0].getMessage()
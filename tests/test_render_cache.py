@@ -0,0 +1,102 @@
+import io
+import os
+import zipfile
+
+import pytest
+
+import render_cache
+from render_cache import RenderCache, cache_key
+
+
+def package(text, size=0):
+    """A small zip package, padded with size stored bytes"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("word/document.xml", text + " " * size)
+    return buffer.getvalue()
+
+
+def test_key_depends_on_every_input(field_values):
+    key = cache_key(field_values, "digest", "engine/1")
+    assert key == cache_key(dict(reversed(list(field_values.items()))), "digest", "engine/1")
+    assert key != cache_key(dict(field_values, tower_no="T9"), "digest", "engine/1")
+    assert key != cache_key(field_values, "other", "engine/1")
+    assert key != cache_key(field_values, "digest", "engine/2")
+
+
+def test_hit_and_miss(tmp_path):
+    cache = RenderCache(str(tmp_path))
+    renders = []
+
+    def render():
+        renders.append(1)
+        return package("agreement")
+
+    assert cache.get("ab" * 32) is None
+    assert cache.get_or_render("ab" * 32, render) == package("agreement")
+    assert cache.get_or_render("ab" * 32, render) == package("agreement")
+    assert len(renders) == 1
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["writes"]) == (1, 2, 1)
+    assert stats["bytes"] == len(package("agreement"))
+    # Written through a temporary file renamed into place
+    assert [name for _, _, names in os.walk(tmp_path) for name in names] == ["ab" * 32 + ".docx"]
+
+
+def test_failed_write_leaves_no_entry(tmp_path, monkeypatch):
+    cache = RenderCache(str(tmp_path))
+
+    def fail(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(render_cache.os, "replace", fail)
+    with pytest.raises(OSError):
+        cache.put("cd" * 32, package("agreement"))
+    assert [name for _, _, names in os.walk(tmp_path) for name in names] == []
+
+
+def test_least_recently_used_entries_are_evicted_to_90_percent(tmp_path):
+    entry = package("agreement", 900)
+    cache = RenderCache(str(tmp_path), max_bytes=3 * len(entry) + len(entry) // 2)
+    keys = [f"{n:02d}" * 32 for n in range(4)]
+    for age, key in enumerate(keys[:3]):
+        cache.put(key, entry)
+        os.utime(cache.path(key), ns=(age * 10**9, age * 10**9))
+    assert cache.get(keys[0]) == entry  # now the most recently used
+
+    cache.put(keys[3], entry)
+    # 4 entries are over the cap; evicting the oldest, keys[1], gets under 90% of it
+    assert [key for key in keys if os.path.exists(cache.path(key))] == [keys[0], keys[2], keys[3]]
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["bytes"] == 3 * len(entry) <= 0.9 * cache.max_bytes
+
+
+@pytest.mark.parametrize("damage", [
+    lambda data: data[:len(data) // 2],
+    lambda data: b"",
+    lambda data: b"not a document",
+])
+def test_damaged_entry_is_a_miss_and_rendered_again(tmp_path, damage):
+    cache = RenderCache(str(tmp_path))
+    key = "ef" * 32
+    cache.put(key, package("agreement"))
+    with open(cache.path(key), "wb") as f:
+        f.write(damage(package("agreement")))
+
+    assert cache.get(key) is None
+    assert not os.path.exists(cache.path(key))
+    assert cache.get_or_render(key, lambda: package("again")) == package("again")
+    assert cache.get(key) == package("again")
+
+
+def test_from_env(tmp_path, monkeypatch):
+    monkeypatch.delenv(render_cache.ENV_DIR, raising=False)
+    assert render_cache.from_env() is None
+    monkeypatch.setenv(render_cache.ENV_DIR, str(tmp_path))
+    monkeypatch.setenv(render_cache.ENV_MAX_MB, "2")
+    cache = render_cache.from_env()
+    assert cache is render_cache.from_env()
+    assert (cache.directory, cache.max_bytes) == (str(tmp_path), 2 * 1024 * 1024)
+    monkeypatch.delenv(render_cache.ENV_MAX_MB)
+    assert render_cache.from_env().max_bytes == render_cache.DEFAULT_MAX_BYTES
@@ -0,0 +1,114 @@
+import io
+import zipfile
+from datetime import date
+
+import docx
+import pytest
+from docx.oxml.ns import qn
+from lxml import etree
+
+from lease_record import build_field_values
+from ooxml_renderer import run_xml, xml_text
+from rent_agreement_generator import RenderedDraft, create_document_from_draft, render_draft_bytes
+
+
+def python_docx_bytes(field_values):
+    buffer = io.BytesIO()
+    create_document_from_draft(field_values).save(buffer)
+    return buffer.getvalue()
+
+
+def python_docx_bytes_from_scratch(field_values):
+    buffer = io.BytesIO()
+    create_document_from_draft(field_values, use_skeleton=False).save(buffer)
+    return buffer.getvalue()
+
+
+def canonical_parts(data):
+    """Every part of a package, its XML in canonical form"""
+    with zipfile.ZipFile(io.BytesIO(data)) as package:
+        parts = {}
+        for name in package.namelist():
+            blob = package.read(name)
+            if name.endswith(".xml") or name.endswith(".rels"):
+                blob = etree.tostring(etree.fromstring(blob), method="c14n")
+            parts[name] = blob
+        return parts
+
+
+@pytest.mark.parametrize("overrides", [
+    {},
+    {"lessor_address": "Line 1\nLine 2\t<&> ", "lessee_name": "  Rahul  Sharma "},
+    {"payment_schedule": True, "lease_end": date(2027, 4, 30), "lease_period_months": 24},
+    {"inventory": [{"item": "Sofa", "description": "3 seater", "notes": "Left arm stained"}]},
+])
+def test_engines_write_the_same_package(record, overrides):
+    field_values = build_field_values(dict(record, **overrides))
+    assert canonical_parts(render_draft_bytes(field_values)) == canonical_parts(python_docx_bytes(field_values))
+
+
+def test_engines_agree_without_field_values():
+    assert canonical_parts(render_draft_bytes({})) == canonical_parts(python_docx_bytes({}))
+
+
+def body_tags(data):
+    body = docx.Document(io.BytesIO(data)).element.body
+    return [etree.QName(child).localname for child in body]
+
+
+@pytest.mark.parametrize("render", [
+    render_draft_bytes,
+    python_docx_bytes,
+    python_docx_bytes_from_scratch,
+])
+def test_draft_without_schedule_ends_with_the_signatures(record, render):
+    assert body_tags(render(build_field_values(record)))[-2:] == ["tbl", "sectPr"]
+    with_schedule = build_field_values(dict(record, payment_schedule=True))
+    assert body_tags(render(with_schedule))[-2:] == ["sdt", "sectPr"]
+
+
+@pytest.mark.parametrize("render", [render_draft_bytes, python_docx_bytes])
+def test_draft_leaves_no_placeholder_unfilled(record, render):
+    body = docx.Document(io.BytesIO(render(build_field_values(dict(record, payment_schedule=True))))).element.body
+    texts = ["".join(p.xpath(".//w:t/text()")) for p in body.iter(qn("w:p"))]
+    assert [text for text in texts if "[[" in text] == []
+    assert any("Rs. 43,000/-" in text for text in texts)
+
+
+def test_incremental_render_adds_and_removes_the_schedule(record):
+    without = build_field_values(record)
+    with_schedule = build_field_values(dict(record, payment_schedule=True))
+    rendered = RenderedDraft(without)
+    for field_values in (with_schedule, without, without, with_schedule):
+        rendered.update(field_values)
+        buffer = io.BytesIO()
+        rendered.document.save(buffer)
+        assert canonical_parts(buffer.getvalue()) == canonical_parts(python_docx_bytes(field_values))
+
+
+def test_control_characters_are_dropped(field_values):
+    field_values = dict(field_values, lessor_address="B-12\x0bSector 62\x00, Noida\x1f", lessee_name="Rahul\x08 Sharma")
+    data = render_draft_bytes(field_values)
+    # Parsing document.xml fails on any character XML does not allow
+    document = docx.Document(io.BytesIO(data))
+    text = "\n".join(paragraph.text for paragraph in document.paragraphs)
+    assert "B-12Sector 62, Noida" in text
+    assert "Rahul Sharma" in text
+    assert canonical_parts(data) == canonical_parts(python_docx_bytes(field_values))
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("plain", "plain"),
+    ("tab\tand\nnewline", "tab\tand\nnewline"),
+    ("bell\x07 nul\x00 vt\x0b ff\x0c", "bell nul vt ff"),
+    ("noncharacter￾￿", "noncharacter"),
+    ("Hindi किराया", "Hindi किराया"),
+])
+def test_xml_text(text, expected):
+    assert xml_text(text) == expected
+
+
+def test_run_xml_is_well_formed():
+    run = run_xml("a\x01b <c> & d\x0b", bold=True)
+    element = etree.fromstring(f'<w:p xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">{run}</w:p>')
+    assert "".join(element.itertext()) == "ab <c> & d"
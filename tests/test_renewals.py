@@ -0,0 +1,32 @@
+from datetime import date
+
+import pytest
+
+from lease_record import LeaseRecord
+from renewals import compute_renewals
+
+
+@pytest.mark.parametrize("start, end, months, new_start, new_end", [
+    (date(2025, 3, 1), date(2026, 1, 31), 11, date(2026, 2, 1), date(2026, 12, 31)),
+    (date(2024, 1, 1), date(2024, 12, 31), 12, date(2025, 1, 1), date(2025, 12, 31)),
+    (date(2023, 3, 1), date(2024, 2, 29), 12, date(2024, 3, 1), date(2025, 2, 28)),
+    (date(2023, 2, 1), date(2023, 12, 31), 11, date(2024, 1, 1), date(2024, 11, 30)),
+    (date(2025, 5, 15), date(2026, 4, 14), 11, date(2026, 4, 15), date(2027, 3, 14)),
+    (date(2023, 12, 31), date(2024, 1, 30), 1, date(2024, 1, 31), date(2024, 2, 28)),
+    (date(2025, 3, 1), date(2026, 1, 31), None, date(2026, 2, 1), date(2026, 12, 31)),
+])
+def test_renewal_term_runs_whole_calendar_months(record, start, end, months, new_start, new_end):
+    lease = LeaseRecord.from_dict(dict(record, lease_start=start, lease_end=end, lease_period_months=months))
+    renewals = compute_renewals([lease])
+    assert renewals["lease_start"].tolist() == [new_start]
+    assert renewals["lease_end"].tolist() == [new_end]
+    assert renewals["execution_date"].tolist() == [new_start]
+    assert renewals["execution_year"].tolist() == [new_start.year]
+
+
+def test_renewal_amounts(record):
+    renewals = compute_renewals([LeaseRecord.from_dict(dict(record, rent_amount=43333, security_deposit=86666))],
+                                execution_date=date(2026, 3, 25), round_to=100)
+    assert renewals["rent_amount"].tolist() == [47700]
+    assert renewals["security_deposit"].tolist() == [95400]
+    assert renewals["execution_date"].tolist() == [date(2026, 3, 25)]
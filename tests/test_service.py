@@ -0,0 +1,100 @@
+import asyncio
+import io
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import docx
+import pytest
+
+import service
+from rent_agreement_generator import render_draft_bytes
+from service import AgreementService, HttpError
+
+
+def paragraphs(data):
+    return [paragraph.text for paragraph in docx.Document(io.BytesIO(data)).paragraphs]
+
+
+def payload(record):
+    return json.dumps(record, default=str).encode("utf-8")
+
+
+@pytest.fixture
+def blocked_renders(monkeypatch):
+    """Renders that hold their worker until the returned event is set"""
+    release = threading.Event()
+
+    def render_job(job):
+        release.wait(10)
+        return job[0], job[1], b"docx", None
+
+    monkeypatch.setattr(service, "render_job", render_job)
+    yield release
+    release.set()
+
+
+def run_with_service(coroutine_function, **options):
+    async def main():
+        agreements = AgreementService(executor=ThreadPoolExecutor(max_workers=2), **options)
+        try:
+            return await coroutine_function(agreements)
+        finally:
+            agreements.close()
+
+    return asyncio.run(main())
+
+
+def test_valid_record_returns_the_agreement(record, field_values):
+    async def post(agreements):
+        return await agreements.dispatch("POST", "/agreements?engine=ooxml", payload(record))
+
+    status, headers, data = run_with_service(post, workers=1, max_queue=1)
+    assert status == 200
+    assert headers["Content-Type"] == service.DOCX_MIME
+    assert paragraphs(data) == paragraphs(render_draft_bytes(field_values))
+
+
+def test_invalid_record_is_unprocessable(record):
+    async def post(agreements):
+        with pytest.raises(HttpError) as error:
+            await agreements.dispatch("POST", "/agreements", payload(dict(record, lessor_name="")))
+        return error.value
+
+    error = run_with_service(post, workers=1, max_queue=1)
+    assert error.status == 422
+    assert "Lessor name" in str(error)
+
+
+@pytest.mark.parametrize("body", [b"{not json", b"[1, 2]"])
+def test_malformed_body_is_a_bad_request(body):
+    async def post(agreements):
+        with pytest.raises(HttpError) as error:
+            await agreements.dispatch("POST", "/agreements", body)
+        return error.value
+
+    assert run_with_service(post, workers=1, max_queue=1).status == 400
+
+
+def test_requests_beyond_the_queue_are_refused(record, blocked_renders):
+    async def burst(agreements):
+        requests = [
+            asyncio.ensure_future(agreements.dispatch("POST", "/agreements", payload(record))) for _ in range(4)
+        ]
+        # Two requests fill the worker and the queue, the other two are refused at once
+        done, pending = await asyncio.wait(requests, timeout=5, return_when=asyncio.FIRST_EXCEPTION)
+        while len(done) < 2:
+            more, pending = await asyncio.wait(pending, timeout=5, return_when=asyncio.FIRST_EXCEPTION)
+            done |= more
+        refused = [task.exception() for task in done]
+        stats = agreements.stats()
+        blocked_renders.set()
+        served = await asyncio.gather(*pending)
+        return refused, stats, served, agreements.stats()
+
+    refused, stats, served, after = run_with_service(burst, workers=1, max_queue=1)
+    assert [error.status for error in refused] == [503, 503]
+    assert all(error.headers["Retry-After"] == "1" for error in refused)
+    assert stats["rendering"] == 1 and stats["queued"] == 1 and stats["rejected"] == 2
+    assert [status for status, _, _ in served] == [200, 200]
+    assert after["served"] == 2 and after["queued"] == 0
@@ -0,0 +1,60 @@
+import pytest
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls, qn
+from lxml import etree
+
+from substitution import substitute_paragraph
+
+
+def paragraph(*runs):
+    """A w:p of runs given as text, or (text, bold)"""
+    xml = []
+    for run in runs:
+        text, bold = (run, False) if isinstance(run, str) else run
+        properties = "<w:rPr><w:b/></w:rPr>" if bold else ""
+        xml.append(f'<w:r>{properties}<w:t xml:space="preserve">{text}</w:t></w:r>')
+    return parse_xml(f"<w:p {nsdecls('w')}>{''.join(xml)}</w:p>")
+
+
+def contents(p):
+    """Each run's content as (bold, [text, "<br>" or "<tab>", ...])"""
+    names = {qn("w:br"): "<br>", qn("w:tab"): "<tab>"}
+    return [
+        (r.find(qn("w:rPr")) is not None,
+         [child.text if child.tag == qn("w:t") else names[child.tag] for child in r if child.tag != qn("w:rPr")])
+        for r in p.iter(qn("w:r"))
+    ]
+
+
+def test_placeholder_split_across_runs():
+    p = paragraph("Between [[less", ("or_na", True), "me]] and [[lessee_name]].")
+    assert substitute_paragraph(p, {"lessor_name": "Amit Gupta", "lessee_name": "Rahul Sharma"}) == 2
+    assert contents(p) == [
+        (False, ["Between Amit Gupta"]), (True, [""]), (False, [" and Rahul Sharma."]),
+    ]
+
+
+def test_unknown_placeholders_are_kept():
+    p = paragraph("[[lessor_name]] and [[unknown]]")
+    assert substitute_paragraph(p, {"lessor_name": "Amit"}) == 1
+    assert contents(p) == [(False, ["Amit and [[unknown]]"])]
+
+
+@pytest.mark.parametrize("value", [
+    "Flat 4\nKarol Bagh\tNew Delhi",
+    "Flat 4\r\nKarol Bagh\tNew Delhi",
+    "Flat 4\rKarol Bagh\tNew Delhi",
+])
+def test_multi_line_values(value):
+    p = paragraph("Address: [[lessee_address]]")
+    substitute_paragraph(p, {"lessee_address": value})
+    assert contents(p) == [(False, ["Address: Flat 4", "<br>", "Karol Bagh", "<tab>", "New Delhi"])]
+    assert "\r" not in etree.tostring(p, encoding="unicode")
+
+
+def test_leading_and_trailing_spaces_are_preserved():
+    p = parse_xml(f"<w:p {nsdecls('w')}><w:r><w:t>[[name]]</w:t></w:r></w:p>")
+    substitute_paragraph(p, {"name": " Amit "})
+    t = p.find(".//" + qn("w:t"))
+    assert t.text == " Amit "
+    assert t.get("{http://www.w3.org/XML/1998/namespace}space") == "preserve"
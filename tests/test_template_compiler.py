@@ -0,0 +1,85 @@
+import io
+import os
+
+import docx
+import pytest
+
+import template_cache
+from clauses import DERIVED_FIELDS
+from lease_record import template_fields
+from rent_agreement_generator import DRAFT_CLAUSES
+from substitution import PLACEHOLDER_PATTERN
+from template_compiler import (
+    Placeholder, compile_template, lint, load_source, main, normalize_placeholders, scan_placeholders, suggestion,
+)
+
+
+def write_template(directory, name, *paragraphs):
+    """Save a template with one paragraph per tuple of run texts"""
+    doc = docx.Document()
+    for runs in paragraphs:
+        p = doc.add_paragraph()
+        for text in runs:
+            p.add_run(text)
+    path = os.path.join(directory, name)
+    doc.save(path)
+    return path
+
+
+@pytest.fixture
+def split_template(tmp_path):
+    return write_template(str(tmp_path), "split.docx", ("Rent of [[rent_", "amount_numeric]] a month",))
+
+
+@pytest.fixture
+def unknown_template(tmp_path):
+    return write_template(str(tmp_path), "unknown.docx", ("Rent of [[rent_amount]] a month",))
+
+
+def test_placeholder_split_across_runs_is_found_and_joined(split_template):
+    template = load_source(split_template)
+    assert scan_placeholders(template) == [Placeholder("rent_amount_numeric", "body paragraph 1", True)]
+
+    normalize_placeholders(template)
+    runs = [run.text for run in template.document.paragraphs[0].runs]
+    assert "Rent of [[rent_amount_numeric]]" in runs
+
+
+def test_unknown_field_points_at_the_fields_meant(unknown_template):
+    known = template_fields()
+    unknown, unfilled, unused = lint(scan_placeholders(load_source(unknown_template)), known)
+    assert [placeholder.field for placeholder in unknown] == ["rent_amount"]
+    assert unfilled == []
+    assert "rent_amount_numeric" in unused
+    assert suggestion("rent_amount", known) == (
+        "rent_amount is a record input, use [[rent_amount_numeric]] or [[rent_amount_words]]"
+    )
+    assert suggestion("lessee_nam", known) == "did you mean [[lessee_name]]?"
+
+
+def test_draft_clauses_use_only_known_fields():
+    placeholders = [
+        Placeholder(field, f"clause {n}", True)
+        for n, text in enumerate(DRAFT_CLAUSES, 1)
+        for field in PLACEHOLDER_PATTERN.findall(text)
+    ]
+    unknown, _, _ = lint(placeholders, template_fields() + list(DERIVED_FIELDS))
+    assert unknown == []
+
+
+def test_check_exit_status_and_no_artifact(split_template, unknown_template):
+    assert main([split_template, "--check"]) == 0
+    assert main([split_template, unknown_template, "--check"]) == 1
+    assert main([os.path.join(os.path.dirname(split_template), "missing.docx"), "--check"]) == 1
+    assert not os.path.exists(split_template + template_cache.ARTIFACT_SUFFIX)
+
+
+def test_compiled_artifact_is_what_load_template_uses(split_template):
+    assert compile_template(split_template, file=io.StringIO()) == 0
+    template_cache.clear_cache()
+    try:
+        template = template_cache.load_template(split_template)
+        # Only the normalized artifact has the placeholder in a single run
+        assert "Rent of [[rent_amount_numeric]]" in [run.text for run in template.document.paragraphs[0].runs]
+    finally:
+        template_cache.clear_cache()
@@ -0,0 +1,87 @@
+import json
+import os
+
+import docx
+
+import template_cache
+from template_registry import MANIFEST, TemplateRegistry
+
+
+def write_template(directory, name, text):
+    doc = docx.Document()
+    doc.add_paragraph(text)
+    path = os.path.join(directory, name)
+    doc.save(path)
+    return path
+
+
+def write_manifest(directory, content):
+    path = os.path.join(directory, MANIFEST)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content if isinstance(content, str) else json.dumps(content))
+    # Force a new scan signature even within the file system's mtime resolution
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_broken_manifest_keeps_the_previous_rules(tmp_path):
+    directory = str(tmp_path)
+    gupta = write_template(directory, "gupta.docx", "Gupta Residency")
+    standard = write_template(directory, "standard.docx", "Standard")
+    write_manifest(directory, [{"file": "gupta.docx", "society": "Gupta Residency"},
+                               {"file": "standard.docx", "default": True}])
+    registry = TemplateRegistry(directory)
+    registry.preload()
+    assert registry.select("Gupta Residency") == gupta
+
+    for broken in ("[{\"file\": ", [{"society": "Gupta Residency"}], {"file": "gupta.docx"}):
+        write_manifest(directory, broken)
+        registry.refresh(force=True)
+        assert registry.select("Gupta Residency") == gupta
+        assert registry.select("Elsewhere") == standard
+        assert list(registry.stats()["errors"]) == [os.path.join(directory, MANIFEST)]
+
+    write_manifest(directory, [{"file": "standard.docx", "default": True}])
+    registry.refresh(force=True)
+    assert registry.select("Gupta Residency") == standard
+    assert registry.stats()["errors"] == {}
+
+
+def test_shared_parts_of_removed_templates_are_dropped(tmp_path):
+    directory = str(tmp_path)
+    write_template(directory, "gupta.docx", "Gupta Residency")
+    removed = write_template(directory, "default.docx", "Standard")
+    registry = TemplateRegistry(directory)
+    registry.preload()
+    assert registry.stats()["shared_parts"] > 0
+    removed_package = template_cache.load_template(removed).document.part.package
+
+    os.remove(removed)
+    registry.refresh(force=True)
+    live_package = template_cache.load_template(registry.templates()[0]).document.part.package
+    assert registry._shared
+    assert {part.package for part in registry._shared.values()} == {live_package}
+    assert removed_package not in {part.package for part in registry._shared.values()}
+
+
+def test_shared_parts_count_is_stable_across_reloads(tmp_path):
+    directory = str(tmp_path)
+    write_template(directory, "gupta.docx", "Gupta Residency")
+    write_template(directory, "default.docx", "Standard")
+    write_template(directory, "sharma.docx", "Sharma Heights")
+    registry = TemplateRegistry(directory)
+    registry.preload()
+    shared = registry.stats()["shared_parts"]
+    assert shared > 0
+
+    for n in range(3):
+        path = write_template(directory, "gupta.docx", f"Gupta Residency, edition {n}")
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + (n + 1) * 1_000_000_000))
+        registry.refresh(force=True)
+        assert template_cache.load_template(path).document.paragraphs[0].text.endswith(f"edition {n}")
+        assert registry.stats()["shared_parts"] == shared
+
+    os.remove(os.path.join(directory, "sharma.docx"))
+    registry.refresh(force=True)
+    assert registry.stats()["shared_parts"] == shared // 2